@@ -0,0 +1,92 @@
+"""Module that provides the algorithms networks are trained with and loads saved models and policies
+
+Playing only needs this module, the training (src/train_model.py) with its env pool and worker
+processes is not imported for it.
+"""
+# third party imports
+import os
+import json
+import zipfile
+from sb3_contrib import QRDQN, MaskablePPO
+
+# algorithms a network can be trained with, the maskable ones only choose valid actions (see Game_Controller.action_masks)
+ALGORITHMS = {
+    "QRDQN": QRDQN,
+    "MaskablePPO": MaskablePPO,
+}
+
+
+def get_algorithm(path: str) -> type:
+    """
+    Returns the algorithm a model was saved with, read from the module of its policy class.
+
+    Args:
+        path (str): saved model (.zip may be left out)
+
+    Returns:
+        type: class of ALGORITHMS
+    """
+    if not os.path.isfile(path):
+        path += ".zip"
+    with zipfile.ZipFile(path) as archive:
+        data = json.loads(archive.read("data"))
+    if data["policy_class"].get("__module__", "").startswith("sb3_contrib.common.maskable"):
+        return MaskablePPO
+    return QRDQN
+
+def load_model(path: str, env=None, **kwargs):
+    """Loads a saved model with the algorithm it was trained with, kwargs are passed to load"""
+    return get_algorithm(path).load(path, env=env, **kwargs)
+
+def load_saved_policy(path: str, device: str = "auto"):
+    """
+    Loads a policy saved by policy.save (without its model) with the policy class of its algorithm.
+    The file only holds the arguments of the policy, actor critic policies (MaskablePPO) are
+    recognized by their ortho_init argument, every other policy is a QRDQN one.
+
+    Args:
+        path (str): saved policy
+        device (str, optional): device the policy is loaded on
+
+    Returns:
+        the policy
+    """
+    import torch as th
+    from stable_baselines3.common.utils import get_device
+    from sb3_contrib.qrdqn.policies import QRDQNPolicy
+    from sb3_contrib.common.maskable.policies import MaskableActorCriticPolicy
+
+    device = get_device(device)
+    # same as BasePolicy.load, but the class is only known after reading the file
+    saved_variables = th.load(path, map_location=device, weights_only=False)
+    policy_class = MaskableActorCriticPolicy if "ortho_init" in saved_variables["data"] else QRDQNPolicy
+    policy = policy_class(**saved_variables["data"])
+    policy.load_state_dict(saved_variables["state_dict"])
+    policy.to(device)
+    return policy
+
+
+# Example usage
+if __name__ == '__main__':
+    import sys
+    # guard: loading does not import the training (the play branch of the menu only needs this module)
+    for module in ("src.env_pool", "src.env_worker", "stable_baselines3.common.env_checker"):
+        assert module not in sys.modules, module
+
+    import tempfile
+    import numpy as np
+    from src.game_controller import Game_Controller
+    from src.train_model import create_model
+
+    # guard: a policy saved without its model is loaded with the policy class of its algorithm
+    observations = np.random.default_rng(0).integers(0, 6, (16, 465), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as directory:
+        for algorithm in ALGORITHMS:
+            model = create_model(algorithm, Game_Controller(True), 0.005, device="cpu")
+            path = os.path.join(directory, algorithm + "_Policy")
+            model.policy.save(path)
+            policy = load_saved_policy(path, device="cpu")
+            assert type(policy) is type(model.policy), algorithm
+            expected, _ = model.policy.predict(observations, deterministic=True)
+            actions, _ = policy.predict(observations, deterministic=True)
+            assert (actions == expected).all(), algorithm
@@ -0,0 +1,697 @@
+"""Module that provides the ArrayBoard class, an array backed alternative to the Board class"""
+import numpy as np
+# local imports
+from src.row import Row
+from src.cards import Card, EffectCard, get_card, get_card_id
+from src.zobrist import ZobristHash
+
+# maximum number of cards a player can hold in his deck, hand, a row or the graveyard
+CARD_CAPACITY = 40
+# rows in the order of the half board of the Board class, the position is the row index
+ROWS = (Row.FRONT, Row.WISE, Row.SUPPORT, Row.EFFECTS)
+ROW_INDEX = {row: index for index, row in enumerate(ROWS)}
+# rows that are scored (all except the effect row)
+FIELD_ROWS = ROWS[:3]
+# player indices, bottom_player can be used directly as index via int(bottom_player)
+TOP_PLAYER = 0
+BOTTOM_PLAYER = 1
+# arrays that hold the state, copied by clone and push
+STATE_ARRAYS = ("deck", "deck_top", "deck_end", "hand", "hand_size", "rows", "row_size", "row_score",
+                "graveyard", "graveyard_size", "passed", "current_rows_won", "rounds_won")
+# kinds of entries of the undo log
+_UNDO_ARRAYS = 0
+_UNDO_DECK = 1
+_UNDO_HAND = 2
+_UNDO_DRAW = 3
+_UNDO_PLAY = 4
+_UNDO_PASS = 5
+
+
+class ArrayBoard:
+    """Represents the game board environment (state) for a card game.
+
+    Has the same public interface as the Board class, but stores all cards as ids in
+    fixed size integer arrays (one row per player) and keeps counters for the scores
+    and flags, instead of nested dicts of lists.
+    Cards are returned as the Card objects registered for their id.
+
+    Every read or write of a single array element costs more than one of a list, so a step of
+    a Game_Controller is slower than with the Board (about 36 instead of 26 us, see
+    python -m src.benchmark env). The arrays are meant for copying and batching the state.
+    Use get_hand_size and get_hand_card instead of get_hand where the whole hand is not needed,
+    get_hand creates a new list of cards.
+    """
+    def __init__(self, top_player_name: str, bottom_player_name: str, rng: np.random.Generator | None = None,
+                 capacity: int = CARD_CAPACITY):
+        """Initializes the game board.
+
+        Args:
+            top_player_name (str): name of the top player
+            bottom_player_name (str): name of the bottom player
+            rng (np.random.Generator, optional): generator for shuffling, a new unseeded one if not given
+            capacity (int, optional): maximum number of cards in a deck, hand, row or graveyard
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.names = [top_player_name, bottom_player_name]
+        # observers that are notified about every change, see BoardObserver
+        self.observers = []
+        # hash of the position, created by the first call of get_hash
+        self._zobrist = None
+        # how to undo the changes since the first open push, and where each push started in it
+        self._undo = []
+        self._frames = []
+        self.capacity = capacity
+        # the deck is stored as slice deck[player, deck_top:deck_end], drawing moves deck_top
+        self.deck = np.zeros((2, capacity), dtype=np.int16)
+        self.deck_top = np.zeros(2, dtype=np.int16)
+        self.deck_end = np.zeros(2, dtype=np.int16)
+        self.hand = np.zeros((2, capacity), dtype=np.int16)
+        self.hand_size = np.zeros(2, dtype=np.int16)
+        self.rows = np.zeros((2, len(ROWS), capacity), dtype=np.int16)
+        self.row_size = np.zeros((2, len(ROWS)), dtype=np.int16)
+        self.row_score = np.zeros((2, len(ROWS)), dtype=np.int32)
+        self.graveyard = np.zeros((2, capacity), dtype=np.int16)
+        self.graveyard_size = np.zeros(2, dtype=np.int16)
+        self.passed = np.zeros(2, dtype=bool)
+        self.current_rows_won = np.zeros(2, dtype=np.int8)
+        self.rounds_won = np.zeros(2, dtype=np.int8)
+        self.reset()
+
+    def reset(self) -> None:
+        """Resets all cards, scores and flags. The player names are kept."""
+        if self._frames:
+            self._log_arrays()
+        for array in (self.deck_top, self.deck_end, self.hand_size, self.row_size, self.row_score,
+                      self.graveyard_size, self.passed, self.current_rows_won, self.rounds_won):
+            array.fill(0)
+        # start with round 1
+        self.round_number = 1
+        self.done = False
+        # indicates which players turn it is
+        self.turn_player = ""
+        for observer in self.observers:
+            observer.board_reset()
+
+    def add_observer(self, observer) -> None:
+        """
+        Method to register an observer, it is notified about every change of the board.
+
+        Args:
+            observer (BoardObserver): observer to notify
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer) -> None:
+        """
+        Method to unregister an observer.
+
+        Args:
+            observer (BoardObserver): observer that should no longer be notified
+        """
+        self.observers.remove(observer)
+
+    def get_hash(self) -> int:
+        """
+        Method to get the 64-bit Zobrist hash of the position: hands, decks and rows (as multisets),
+        passed flags, round number and rounds won, see src/zobrist.py. It is created by the first
+        call and then kept up to date with every change, so boards that are never hashed pay nothing.
+
+        Returns:
+            int: hash of the position
+        """
+        if self._zobrist is None:
+            self._zobrist = ZobristHash(self)
+        return self._zobrist.value
+
+    def clone(self) -> "ArrayBoard":
+        """
+        Method to copy the board for a lookahead. The copy has no observers, no saved
+        states and its own rng, spawned from the rng of the board.
+
+        Returns:
+            ArrayBoard: independent copy of the board
+        """
+        board = ArrayBoard.__new__(ArrayBoard)
+        board.__dict__.update(self.__dict__)
+        board.rng = self.rng.spawn(1)[0]
+        board.observers = []
+        board._zobrist = None
+        board._undo = []
+        board._frames = []
+        board.names = self.names[:]
+        for name in STATE_ARRAYS:
+            setattr(board, name, getattr(self, name).copy())
+        return board
+
+    def push(self) -> None:
+        """
+        Method to remember the current state, pop goes back to it. Pushes can be nested.
+        While a push is open every change logs how it is undone: drawing, playing and passing
+        cost O(1), setting a deck or hand copies it, the end of a round copies all arrays.
+        """
+        self._frames.append((len(self._undo), self.done, self.turn_player))
+
+    def pop(self) -> None:
+        """
+        Method to undo every change since the last push. Observers that follow the undo
+        are told every undone change (see BoardObserver), the others are notified with board_restored.
+
+        Raises:
+            IndexError: if there was no push
+        """
+        start, self.done, self.turn_player = self._frames.pop()
+        undo = self._undo
+        followers = self._get_undo_followers(start)
+        while len(undo) > start:
+            entry = undo.pop()
+            kind = entry[0]
+            if kind == _UNDO_DRAW:
+                _, player, num_cards = entry
+                hand_size = int(self.hand_size[player]) - num_cards
+                self.hand_size[player] = hand_size
+                self.deck_top[player] -= num_cards
+                if followers:
+                    cards = self._to_cards(self.hand[player, hand_size:hand_size + num_cards])
+                    for observer in followers:
+                        observer.cards_undrawn(bool(player), cards)
+            elif kind == _UNDO_PLAY:
+                _, player, card_index, card_id, row_index, row_score, rows_won = entry
+                # insert the card into the hand again, the following cards move one position back
+                hand_size = int(self.hand_size[player])
+                self.hand[player, card_index + 1:hand_size + 1] = self.hand[player, card_index:hand_size]
+                self.hand[player, card_index] = card_id
+                self.hand_size[player] = hand_size + 1
+                row = None
+                if row_index is not None:
+                    self.row_size[player, row_index] -= 1
+                    self.row_score[player, row_index] = row_score
+                    self.current_rows_won[:] = rows_won
+                    row = ROWS[row_index]
+                for observer in followers:
+                    observer.card_unplayed(bool(player), card_index, get_card(card_id), row)
+            elif kind == _UNDO_PASS:
+                _, player, passed = entry
+                unpassed = self.passed[player] and not passed
+                self.passed[player] = passed
+                if unpassed:
+                    for observer in followers:
+                        observer.round_unpassed(bool(player))
+            elif kind == _UNDO_DECK:
+                _, player, deck, deck_top, deck_end = entry
+                self.deck[player] = deck
+                self.deck_top[player] = deck_top
+                self.deck_end[player] = deck_end
+                for observer in followers:
+                    observer.deck_set(bool(player))
+            elif kind == _UNDO_HAND:
+                _, player, hand = entry
+                self.hand[player, :len(hand)] = hand
+                self.hand_size[player] = len(hand)
+                for observer in followers:
+                    observer.hand_set(bool(player))
+            else:
+                _, arrays, self.round_number = entry
+                for name, array in zip(STATE_ARRAYS, arrays):
+                    # copy into the arrays, views of them stay valid
+                    np.copyto(getattr(self, name), array)
+        for observer in self.observers:
+            if observer not in followers:
+                observer.board_restored()
+
+    def _get_undo_followers(self, start: int) -> list:
+        """Returns the observers that are told the undone changes since start one by one"""
+        if not self.observers:
+            return []
+        for index in range(start, len(self._undo)):
+            # the end of a round and a reset replace everything, only a restore can follow them
+            if self._undo[index][0] == _UNDO_ARRAYS:
+                return []
+        return [observer for observer in self.observers if observer.follows_undo]
+
+    def _log_arrays(self) -> None:
+        """Logs a copy of all arrays before a change of the whole board"""
+        self._undo.append((_UNDO_ARRAYS, [getattr(self, name).copy() for name in STATE_ARRAYS], self.round_number))
+
+    def _log_deck(self, player: int) -> None:
+        """Logs the deck of a player before it is replaced or shuffled, if a push is open"""
+        if self._frames:
+            self._undo.append((_UNDO_DECK, player, self.deck[player].copy(),
+                               int(self.deck_top[player]), int(self.deck_end[player])))
+
+    def _log_hand(self, player: int) -> None:
+        """Logs the hand of a player before it is replaced, if a push is open"""
+        if self._frames:
+            self._undo.append((_UNDO_HAND, player, self.hand[player, :self.hand_size[player]].copy()))
+
+    def _to_card_ids(self, cards: list[Card]) -> list[int]:
+        """Converts cards to their ids and checks that they fit into the arrays"""
+        if len(cards) > self.capacity:
+            raise ValueError(f"Can not store {len(cards)} cards, the capacity is {self.capacity}")
+        return [get_card_id(card) for card in cards]
+
+    @staticmethod
+    def _to_cards(card_ids: np.ndarray) -> list[Card]:
+        """Converts an array of card ids to the cards"""
+        return [get_card(card_id) for card_id in card_ids.tolist()]
+
+    def clear_deck(self) -> None:
+        """Clears the game board"""
+        self._log_deck(TOP_PLAYER)
+        self._log_deck(BOTTOM_PLAYER)
+        self.deck_top.fill(0)
+        self.deck_end.fill(0)
+        for observer in self.observers:
+            observer.deck_set(False)
+            observer.deck_set(True)
+
+    def clear_hands(self) -> None:
+        """Clears the hands"""
+        self._log_hand(TOP_PLAYER)
+        self._log_hand(BOTTOM_PLAYER)
+        self.hand_size.fill(0)
+        for observer in self.observers:
+            observer.hand_set(False)
+            observer.hand_set(True)
+
+    def set_deck(self, bottom_player: bool, deck: list[Card]) -> None:
+        """
+        Method to set the deck of a player. If bottom player is true,
+        the deck of the bottom player will be set, otherwise the deck
+        of the top player will be set
+
+        Args:
+            bottom_player (bool): Indicate which players deck to set. True for bottom players deck
+            deck (list[Card]): cards of the deck, the first card is drawn first
+        """
+        player = int(bottom_player)
+        card_ids = self._to_card_ids(deck)
+        self._log_deck(player)
+        self.deck[player, :len(card_ids)] = card_ids
+        self.deck_top[player] = 0
+        self.deck_end[player] = len(card_ids)
+        for observer in self.observers:
+            observer.deck_set(bottom_player)
+
+    def set_deck_ids(self, bottom_player: bool, card_ids: np.ndarray) -> None:
+        """
+        Method to set the deck of a player from card ids, e.g. decks of a DeckBank.
+
+        Args:
+            bottom_player (bool): Indicate which players deck to set. True for bottom players deck
+            card_ids (np.ndarray): ids of the cards of the deck, the first card is drawn first
+        """
+        if len(card_ids) > self.capacity:
+            raise ValueError(f"Can not store {len(card_ids)} cards, the capacity is {self.capacity}")
+        player = int(bottom_player)
+        self._log_deck(player)
+        self.deck[player, :len(card_ids)] = card_ids
+        self.deck_top[player] = 0
+        self.deck_end[player] = len(card_ids)
+        for observer in self.observers:
+            observer.deck_set(bottom_player)
+
+    def get_deck(self, bottom_player: bool) -> list[Card]:
+        """
+        Method to get the deck of a player. The returned list is a copy,
+        changing it does not change the board.
+
+        Args:
+            bottom_player (bool): Indicate which players deck to get. True for bottom players deck
+        """
+        player = int(bottom_player)
+        return self._to_cards(self.deck[player, self.deck_top[player]:self.deck_end[player]])
+
+    def get_graveyard(self, bottom_player: bool) -> list[Card]:
+        """
+        Method to get the graveyard of a player. The returned list is a copy.
+
+        Args:
+            bottom_player (bool): Indicate which players graveyard to get. True for bottom players deck
+        """
+        player = int(bottom_player)
+        return self._to_cards(self.graveyard[player, :self.graveyard_size[player]])
+
+    def get_rounds_won(self, bottom_player: bool) -> int:
+        """
+        Method to get the rounds won of a player.
+
+        Args:
+            bottom_player (bool): Indicate which players score to get. True for bottom players deck
+        """
+        return int(self.rounds_won[int(bottom_player)])
+
+    def get_player_name(self, bottom_player: bool) -> str:
+        """
+        Method to get the name of a player
+
+        Args:
+            bottom_player (bool): Indicates if name of bottom or top player is returned
+
+        Returns:
+            str: name of the player
+        """
+        return self.names[int(bottom_player)]
+
+    def get_hand(self, bottom_player: bool) -> list[Card]:
+        """
+        Method to get the hand of a player. The returned list is a copy.
+
+        Args:
+            bottom_player (bool): Indicates if hand of bottom or top player is returned
+
+        Returns:
+            list[Card]: Hand of the player
+        """
+        player = int(bottom_player)
+        return self._to_cards(self.hand[player, :self.hand_size[player]])
+
+    def get_hand_size(self, bottom_player: bool) -> int:
+        """
+        Method to get the number of cards in the hand of a player, without creating the list of the hand
+
+        Args:
+            bottom_player (bool): Indicates if hand of bottom or top player is counted
+
+        Returns:
+            int: number of cards in the hand
+        """
+        return int(self.hand_size[int(bottom_player)])
+
+    def get_hand_card(self, bottom_player: bool, card_index: int) -> Card:
+        """
+        Method to get one card of the hand of a player, without creating the list of the hand
+
+        Args:
+            bottom_player (bool): Indicates if the card of the bottom or top player is returned
+            card_index (int): index of the card in the hand
+
+        Returns:
+            Card: card at the index
+        """
+        player = int(bottom_player)
+        if not 0 <= card_index < self.hand_size[player]:
+            raise IndexError(f"Card index {card_index} is out of the hand")
+        return get_card(int(self.hand[player, card_index]))
+
+    def set_hand(self, bottom_player: bool, hand: list[Card]) -> None:
+        """
+        Method to set the hand of a player
+
+        Args:
+            bottom_player (bool): Indicates if hand of bottom or top player is set
+            hand (list[Card]): new hand of the player
+        """
+        player = int(bottom_player)
+        card_ids = self._to_card_ids(hand)
+        self._log_hand(player)
+        self.hand[player, :len(card_ids)] = card_ids
+        self.hand_size[player] = len(card_ids)
+        for observer in self.observers:
+            observer.hand_set(bottom_player)
+
+    def get_half_board(self, bottom_player: bool) -> dict[Row, list]:
+        """
+        Method to get the board of a player. The returned dict is a copy.
+
+        Args:
+            bottom_player (bool):
+
+        Returns:
+            dict[Row, list]: Row: [Cards] dict
+        """
+        player = int(bottom_player)
+        return {
+            row: self._to_cards(self.rows[player, index, :self.row_size[player, index]])
+            for index, row in enumerate(ROWS)
+        }
+
+    def get_valid_choices(self, bottom_player: bool) -> list[int]:
+        """
+        Returns the possible **cards indices** for the cards the player can play.
+
+        Args:
+            bottom_player (bool): If true bottom player choice will be returned,
+            otherwise top players
+
+        Returns:
+            list[int]: indices of the playable cards in the hand
+        """
+        return list(range(self.hand_size[int(bottom_player)]))
+
+    def draw_cards_to_hand(self, bottom_player: bool, num_cards=2, shuffle=False) -> None:
+        """Allows a player to draw a specified number of cards into their hand.
+        Args:
+            bottom_player: The player who will draw cards.
+            num_cards (int, optional): The number of cards to draw. Defaults to 2.
+            shuffle (boolean, optional)
+        """
+        player = int(bottom_player)
+        deck_top = int(self.deck_top[player])
+        deck_end = int(self.deck_end[player])
+        actually_drawn = min(deck_end - deck_top, num_cards)
+        hand_size = int(self.hand_size[player])
+        if hand_size + actually_drawn > self.capacity:
+            raise ValueError(f"Can not draw {actually_drawn} cards, the hand capacity is {self.capacity}")
+        if shuffle:
+            self._log_deck(player)
+            self.rng.shuffle(self.deck[player, deck_top:deck_end])
+        if self._frames and actually_drawn:
+            self._undo.append((_UNDO_DRAW, player, actually_drawn))
+        # move the cards from the top of the deck to the end of the hand
+        self.hand[player, hand_size:hand_size + actually_drawn] = self.deck[player, deck_top:deck_top + actually_drawn]
+        self.hand_size[player] = hand_size + actually_drawn
+        self.deck_top[player] = deck_top + actually_drawn
+        if self.observers and actually_drawn:
+            drawn_cards = self._to_cards(self.hand[player, hand_size:hand_size + actually_drawn])
+            for observer in self.observers:
+                observer.cards_drawn(bottom_player, drawn_cards)
+
+    def play_card(self, bottom_player, card_index, row) -> None:
+        """
+        Method to play a card. Updates player states accordingly.
+
+        Args:
+            bottom_player (bool): True if the bottom player plays the card
+            card_index (int): index of the card that is played (index in hand)
+            row (Row): row in which the card is played
+        """
+        player = int(bottom_player)
+        card_id = int(self.hand[player, card_index])
+        played_card = get_card(card_id)
+        if self._frames:
+            # cards drawn by an effect are logged (and undone) on their own
+            if isinstance(played_card, EffectCard):
+                self._undo.append((_UNDO_PLAY, player, card_index, card_id, None, 0, None))
+            else:
+                row_index = ROW_INDEX[row]
+                self._undo.append((_UNDO_PLAY, player, card_index, card_id, row_index,
+                                   int(self.row_score[player, row_index]), self.current_rows_won.copy()))
+        # special case if effect card
+        if isinstance(played_card, EffectCard):
+            played_card.execute_effect(self, bottom_player)
+            row = None
+        else:
+            row_index = ROW_INDEX[row]
+            row_size = self.row_size[player, row_index]
+            self.rows[player, row_index, row_size] = card_id
+            self.row_size[player, row_index] = row_size + 1
+            self._add_row_score(player, row_index, played_card.strength)
+        # remove card from hand by moving the following cards one position to the front
+        hand_size = int(self.hand_size[player])
+        self.hand[player, card_index:hand_size - 1] = self.hand[player, card_index + 1:hand_size]
+        self.hand_size[player] = hand_size - 1
+        for observer in self.observers:
+            observer.card_played(bottom_player, card_index, played_card, row)
+
+    def _get_row_outcome(self, row_index: int) -> tuple[int, int]:
+        """
+        Method to get which player wins a row, based on the row scores.
+
+        Args:
+            row_index (int): index of the row in ROWS
+
+        Returns:
+            tuple[int, int]: 1 if the row is won, 0 otherwise (top_player, bottom_player)
+        """
+        top_score, bottom_score = self.row_score[:, row_index].tolist()
+        # rows without any score are not won by anyone
+        if top_score == bottom_score == 0:
+            return 0, 0
+        return int(top_score >= bottom_score), int(top_score <= bottom_score)
+
+    def _add_row_score(self, player: int, row_index: int, strength: int) -> None:
+        """
+        Method to add strength to a row of a player. Updates the row score and
+        the won rows of both players, only the given row is compared again.
+
+        Args:
+            player (int): index of the player whose row gets the strength
+            row_index (int): index of the row in ROWS
+            strength (int): strength to add
+        """
+        if ROWS[row_index] not in FIELD_ROWS:
+            self.row_score[player, row_index] += strength
+            return
+        top_won_before, bottom_won_before = self._get_row_outcome(row_index)
+        self.row_score[player, row_index] += strength
+        top_won_after, bottom_won_after = self._get_row_outcome(row_index)
+        self.current_rows_won[TOP_PLAYER] += top_won_after - top_won_before
+        self.current_rows_won[BOTTOM_PLAYER] += bottom_won_after - bottom_won_before
+
+    def pass_round(self, bottom_player: bool) -> None:
+        """
+        Method to pass a round. Players passing state will be set to true.
+
+        Args:
+            bottom_player (bool): Set for bottom or top player
+        """
+        if self._frames:
+            self._undo.append((_UNDO_PASS, int(bottom_player), bool(self.passed[int(bottom_player)])))
+        self.passed[int(bottom_player)] = True
+        for observer in self.observers:
+            observer.round_passed(bottom_player)
+
+    def end_round(self):
+        """
+        Method to handle the end of a round. Updates the round won scores,
+        moves cards from the board into the graveyard and updates the round number
+        and resets the passing states of the players.
+        Drawing cards for the next round has to be handled outside of this class.
+        """
+        if self._frames:
+            self._log_arrays()
+        top_rows_won, bottom_rows_won = self.current_rows_won.tolist()
+        # update round scores
+        if bottom_rows_won >= top_rows_won:
+            self.rounds_won[BOTTOM_PLAYER] += 1
+        if top_rows_won >= bottom_rows_won:
+            self.rounds_won[TOP_PLAYER] += 1
+
+        for player in (TOP_PLAYER, BOTTOM_PLAYER):
+            # update graveyard with the cards of all rows
+            graveyard_size = 0
+            for row_index, row_size in enumerate(self.row_size[player].tolist()):
+                self.graveyard[player, graveyard_size:graveyard_size + row_size] = self.rows[player, row_index, :row_size]
+                graveyard_size += row_size
+            self.graveyard_size[player] = graveyard_size
+        # reset board, rows won and passed states
+        self.row_size.fill(0)
+        self.row_score.fill(0)
+        self.current_rows_won.fill(0)
+        self.passed.fill(False)
+        # update round ticker
+        self.round_number += 1
+        for observer in self.observers:
+            observer.round_ended()
+
+    def set_round_state(self, round_number: int, rounds_won: tuple[int, int], graveyards: tuple[list[int], list[int]]) -> None:
+        """
+        Method to set what the past rounds left behind, e.g. to load a snapshot of another board.
+        Everything else of a state can be set with the other methods (decks, hands, played cards, passing).
+
+        Args:
+            round_number (int): current round
+            rounds_won (tuple[int, int]): rounds won (top_player, bottom_player)
+            graveyards (tuple[list[int], list[int]]): card ids of the graveyards (top_player, bottom_player)
+        """
+        if self._frames:
+            self._log_arrays()
+        for player, graveyard in enumerate(graveyards):
+            self.graveyard[player, :len(graveyard)] = graveyard
+            self.graveyard_size[player] = len(graveyard)
+        self.rounds_won[:] = rounds_won
+        self.round_number = round_number
+        for observer in self.observers:
+            observer.board_restored()
+
+    def game_ended(self) -> bool:
+        """
+        Method to check if the game is finished
+
+        Returns:
+            bool: True is game is finished
+        """
+        return self.round_number >= 4 or bool(self.rounds_won.max() >= 2)
+
+    def get_row_score(self, bottom_player: bool, row: Row) -> int:
+        """
+        Method to get the score for one row of a player. The return will be a single int
+
+        Args:
+            bottom_player (bool): Indicates if scores for bottom (otherwise top) player should be
+            returned
+            row (Row): Row for which the score is requested
+
+        Returns:
+            int: score of the row
+        """
+        return int(self.row_score[int(bottom_player), ROW_INDEX[row]])
+
+    def get_row_scores(self, bottom_player: bool) -> dict[Row, int]:
+        """
+        Gets the score for each row based on the current cards in play.
+
+        Args:
+            bottom_player(bool): If true returns scores of bottom player, top players otherwise
+
+        Returns:
+            dict[Row, int]: dict that contains rows as keys and int scores as values,
+            indicating the row score
+        """
+        return dict(zip(FIELD_ROWS, self.row_score[int(bottom_player), :len(FIELD_ROWS)].tolist()))
+
+    def get_won_rows(self) -> tuple[int, int]:
+        """
+        Method to get the number of won rows for each player.
+        The first value in the return is the top player, the second is the
+        score for the bottom player
+
+        Returns:
+            tuple[int, int]: Number of won rows for each player. (top_player, bottom_player)
+        """
+        top_score, bottom_score = self.current_rows_won.tolist()
+        return top_score, bottom_score
+
+    def get_winner(self) -> list[str]:
+        """
+        Determines and the winner of the game based on the final scores.
+
+        Returns:
+            List[str]: list of winning players names (could be one or two, if draw)
+        """
+        winner = []
+        rounds_top_player_won, rounds_bottom_player_won = self.rounds_won.tolist()
+
+        if rounds_top_player_won >= rounds_bottom_player_won:
+            winner += [self.names[TOP_PLAYER]]
+        if rounds_top_player_won <= rounds_bottom_player_won:
+            winner += [self.names[BOTTOM_PLAYER]]
+        return winner
+
+    def get_round_winner(self) -> list[str]:
+        """
+        Determines and the winner of the game based on the scores after one round.
+
+        Returns:
+            List[str]: list of winning players names (could be one or two, if draw)
+        """
+        winner = []
+        rows_top_player_won, rows_bottom_player_won = self.get_won_rows()
+
+        if rows_top_player_won >= rows_bottom_player_won:
+            winner += [self.names[TOP_PLAYER]]
+        if rows_top_player_won <= rows_bottom_player_won:
+            winner += [self.names[BOTTOM_PLAYER]]
+        return winner
+
+    def has_passed(self, bottom_player: bool) -> bool:
+        """
+        Method to check if a player has passed.
+
+        Args:
+            bottom_player (bool): If True, checks the bottom player, top player otherwise
+
+        Returns:
+            bool: True if the given player has passed the round
+        """
+        return bool(self.passed[int(bottom_player)])
@@ -0,0 +1,308 @@
+"""Module with benchmarks of the game and the entry point
+
+Run with python -m src.benchmark <benchmark>
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import statistics
+import subprocess
+
+# root of the repository, benchmarks are run from there like run_rote_lilie.cmd does
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imports done by the branches of src.main.main(), keep in sync with play(), simulate() and train()
+BRANCH_IMPORTS = {
+    "play": [
+        "from sb3_contrib import MaskablePPO",
+        "from src.game_controller import Game_Controller",
+        "from src.algorithms import load_model",
+    ],
+    "simulate": [
+        "from src.simulate import simulate",
+    ],
+    "train": [
+        "from stable_baselines3.common.vec_env import VecMonitor",
+        "from stable_baselines3.common.logger import configure",
+        "from src.train_model import evolve, ALGORITHMS, create_model, load_model, evaluate_model",
+    ],
+    "train (worker processes)": [
+        "from src.env_pool import SharedMemoryVecEnv",
+    ],
+    "train (lockstep)": [
+        "from src.vec_game_controller import VecGameController",
+    ],
+    "train (single game)": [
+        "from stable_baselines3.common.env_checker import check_env",
+        "from src.game_controller import Game_Controller",
+    ],
+}
+
+# child process that reports how long the menu and the branch imports took
+_STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import src.main
+menu = time.perf_counter()
+{preloaded_imports}
+branch = time.perf_counter()
+{branch_imports}
+print(menu - start, time.perf_counter() - branch)
+"""
+
+
+def _run_startup(branch_imports: list[str], preloaded_imports: list[str] = ()) -> tuple[float, float, float]:
+    """
+    Starts a fresh interpreter which imports src.main and then the given branch imports.
+
+    Args:
+        branch_imports (list[str]): import statements executed after src.main
+        preloaded_imports (list[str], optional): import statements executed before the branch, not timed
+
+    Returns:
+        tuple[float, float, float]: wall time of the whole process (interpreter start included),
+        import time of src.main, import time of the branch
+    """
+    script = _STARTUP_SCRIPT.format(branch_imports="\n".join(branch_imports),
+                                    preloaded_imports="\n".join(preloaded_imports))
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    wall_time = time.perf_counter() - start
+    menu_time, branch_time = (float(value) for value in output.split()[-2:])
+    # the process ran the branch imports too, they are not part of the time to the first prompt
+    return wall_time - branch_time, menu_time, branch_time
+
+
+def benchmark_startup(repeat: int = 5) -> dict:
+    """
+    Measures the time to the first prompt of src.main and the import cost of every branch.
+    Every measurement runs in a new interpreter, so nothing is cached in sys.modules.
+
+    Args:
+        repeat (int, optional): number of runs per measurement, the median is reported
+
+    Returns:
+        dict: seconds for "time_to_first_prompt", "menu_import" and every branch in "branches"
+    """
+    # without branch imports the process ends right where main() would show the menu
+    first_prompt, menu_import = zip(*[_run_startup([])[:2] for _ in range(repeat)])
+    results = {
+        "time_to_first_prompt": statistics.median(first_prompt),
+        "menu_import": statistics.median(menu_import),
+        "branches": {}
+    }
+    for branch, branch_imports in BRANCH_IMPORTS.items():
+        # the sub branches of train only count what they add to the train imports
+        preloaded_imports = BRANCH_IMPORTS["train"] if branch.startswith("train (") else []
+        results["branches"][branch] = statistics.median(
+            _run_startup(branch_imports, preloaded_imports)[2] for _ in range(repeat)
+        )
+    return results
+
+
+def print_startup(results: dict) -> None:
+    print(f"time to first prompt: {results['time_to_first_prompt']*1000:8.1f} ms")
+    print(f"  import of src.main: {results['menu_import']*1000:8.1f} ms")
+    print("import cost per branch:")
+    for branch, seconds in results["branches"].items():
+        print(f"  {branch:<24}{seconds*1000:8.1f} ms")
+
+
+# metrics of benchmark_env, True if a higher value is better
+ENV_METRICS = {
+    "games_per_sec": True,
+    "steps_per_sec": True,
+    "step_p50_us": False,
+    "step_p99_us": False,
+    "reset_us": False,
+    "get_state_us": False,
+    "get_reward_us": False,
+    "play_card_us": False,
+    "end_round_us": False,
+}
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Returns the value below which percent of the (sorted) values are"""
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def benchmark_env(board_backend: str = "dict", games: int = 200, seed: int = 0) -> dict:
+    """
+    Measures a Game_Controller in training mode where two random bots play against each other.
+    The env and the actions are seeded, so every run plays the same games.
+
+    Args:
+        board_backend (str, optional): board implementation, see BOARD_BACKENDS
+        games (int, optional): number of games that are played for the throughput and latencies
+        seed (int, optional): seed of the env and the actions
+
+    Returns:
+        dict: value of every metric in ENV_METRICS
+    """
+    from src.game_controller import Game_Controller
+    from src.row import Row
+    import numpy as np
+
+    env = Game_Controller(True, board_backend=board_backend)
+    actions = np.random.default_rng(seed + 1)
+    step_times = []
+    reset_times = []
+    start = time.perf_counter()
+    env.reset(seed=seed)
+    for _ in range(games):
+        done = truncated = False
+        while not (done or truncated):
+            action = int(actions.integers(0, 12))
+            step_start = time.perf_counter_ns()
+            _, _, done, truncated, _ = env.step(action)
+            step_times.append(time.perf_counter_ns() - step_start)
+        reset_start = time.perf_counter_ns()
+        env.reset()
+        reset_times.append(time.perf_counter_ns() - reset_start)
+    duration = time.perf_counter() - start
+    step_times.sort()
+
+    # costs of single methods, measured in the middle of a game
+    env.reset(seed=seed)
+    for _ in range(4):
+        env.step(1)
+    number = 20000
+    get_state_time = timeit.timeit(env.get_state, number=number) / number
+    get_reward_time = timeit.timeit(env.get_reward, number=number) / number
+
+    # play_card and end_round change the board, every round starts from new decks
+    board = env.board
+    play_card_times = []
+    end_round_times = []
+    for _ in range(games):
+        board.reset()
+        for bottom_player in (True, False):
+            board.set_deck_ids(bottom_player, env.deck_bank.next_deck())
+            board.draw_cards_to_hand(bottom_player, 10)
+        for _ in range(5):
+            for bottom_player in (True, False):
+                card = board.get_hand(bottom_player)[0]
+                row = Row.FRONT if card.type == Row.ANY else card.type
+                play_start = time.perf_counter_ns()
+                board.play_card(bottom_player, 0, row)
+                play_card_times.append(time.perf_counter_ns() - play_start)
+        end_start = time.perf_counter_ns()
+        board.end_round()
+        end_round_times.append(time.perf_counter_ns() - end_start)
+    env.close()
+
+    return {
+        "games_per_sec": games / duration,
+        "steps_per_sec": len(step_times) / duration,
+        "step_p50_us": _percentile(step_times, 50) / 1000,
+        "step_p99_us": _percentile(step_times, 99) / 1000,
+        "reset_us": statistics.median(reset_times) / 1000,
+        "get_state_us": get_state_time * 1e6,
+        "get_reward_us": get_reward_time * 1e6,
+        "play_card_us": statistics.median(play_card_times) / 1000,
+        "end_round_us": statistics.median(end_round_times) / 1000,
+    }
+
+
+def run_env_benchmarks(board_backends: list[str], games: int = 200, seed: int = 0) -> dict:
+    """
+    Runs benchmark_env for every board backend.
+
+    Returns:
+        dict: "meta" with the settings and the machine, "results" with the metrics per backend
+    """
+    import numpy as np
+    return {
+        "meta": {
+            "games": games,
+            "seed": seed,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": {backend: benchmark_env(backend, games, seed) for backend in board_backends}
+    }
+
+
+def compare_env_results(baseline: dict, current: dict, threshold: float = 0.1) -> list[str]:
+    """
+    Compares the results of run_env_benchmarks with a baseline.
+
+    Args:
+        baseline (dict): results of an earlier run (e.g. loaded from the JSON baseline)
+        current (dict): results of this run
+        threshold (float, optional): relative change that counts as regression, 0.1 = 10%
+
+    Returns:
+        list[str]: one message per metric that got worse by more than the threshold
+    """
+    regressions = []
+    for backend, metrics in current["results"].items():
+        baseline_metrics = baseline["results"].get(backend, {})
+        for metric, value in metrics.items():
+            if metric not in baseline_metrics or not baseline_metrics[metric]:
+                continue
+            change = (value - baseline_metrics[metric]) / baseline_metrics[metric]
+            worse = -change if ENV_METRICS[metric] else change
+            if worse > threshold:
+                regressions.append(f"{backend} {metric}: {baseline_metrics[metric]:.2f} -> {value:.2f} "
+                                   f"({change:+.1%})")
+    return regressions
+
+
+def print_env(results: dict, baseline: dict | None = None) -> None:
+    for backend, metrics in results["results"].items():
+        print(f"board backend: {backend}")
+        baseline_metrics = baseline["results"].get(backend, {}) if baseline else {}
+        for metric, value in metrics.items():
+            line = f"  {metric:<16}{value:12.2f}"
+            if baseline_metrics.get(metric):
+                change = (value - baseline_metrics[metric]) / baseline_metrics[metric]
+                line += f"  (baseline {baseline_metrics[metric]:.2f}, {change:+.1%})"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of Orden der roten Lilie")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    startup = subparsers.add_parser("startup", help="time to the first prompt and import cost per menu branch")
+    startup.add_argument("--repeat", type=int, default=5, help="runs per measurement, the median is reported")
+    env = subparsers.add_parser("env", help="throughput, step latency and cost of the game methods")
+    env.add_argument("--backend", nargs="+", default=["dict", "array"], help="board backends to measure")
+    env.add_argument("--games", type=int, default=200, help="games played per backend")
+    env.add_argument("--seed", type=int, default=0, help="seed of the games")
+    env.add_argument("--save", metavar="FILE", help="write the results as JSON baseline")
+    env.add_argument("--compare", metavar="FILE", help="JSON baseline to compare with")
+    env.add_argument("--threshold", type=float, default=0.1,
+                     help="relative change that counts as regression (default 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    if args.benchmark == "startup":
+        print_startup(benchmark_startup(args.repeat))
+    elif args.benchmark == "env":
+        results = run_env_benchmarks(args.backend, args.games, args.seed)
+        baseline = None
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+        print_env(results, baseline)
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+        if baseline:
+            regressions = compare_env_results(baseline, results, args.threshold)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
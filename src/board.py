@@ -1,9 +1,21 @@
 """Module that provides the Board class for the state and interaction with the environment"""
-import random
+from collections import deque
+import numpy as np
 from itertools import chain
 # local imports
 from src.row import Row
-from src.cards import Card, EffectCard, Booster
+from src.cards import Card, EffectCard, Booster, get_card
+from src.zobrist import ZobristHash
+
+# kinds of entries of the undo log
+_UNDO_STATE = 0
+_UNDO_DRAW = 1
+_UNDO_DECK_ORDER = 2
+_UNDO_PLAY = 3
+_UNDO_ROUND = 4
+_UNDO_RESET = 5
+# player states whose undo can be followed by observers (see BoardObserver.follows_undo)
+_FOLLOWED_KEYS = ("deck", "hand", "passed")
 
 
 class Board:
@@ -14,8 +26,15 @@ class Board:
     2. Provide functions to interact with the Board,
     i.e. playing a card, etc.
     """
-    def __init__(self, top_player_name: str, bottom_player_name):
-        """Initializes the game board with optional network play."""
+    def __init__(self, top_player_name: str, bottom_player_name, rng: np.random.Generator | None = None):
+        """Initializes the game board with optional network play.
+
+        Args:
+            top_player_name (str): name of the top player
+            bottom_player_name (str): name of the bottom player
+            rng (np.random.Generator, optional): generator for shuffling, a new unseeded one if not given
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
         # blueprint for clearing the board
         self.half_board = {
             Row.FRONT: [],
@@ -23,25 +42,34 @@ class Board:
             Row.SUPPORT: [],
             Row.EFFECTS: []
         }
+        # observers that are notified about every change, see BoardObserver
+        self.observers = []
+        # hash of the position, created by the first call of get_hash
+        self._zobrist = None
+        # undo log of the changes since the first push, frames are the log positions of the pushes
+        self._undo = []
+        self._frames = []
         # Player attributes
         self.player_states = {
             "top_player":{
                 "name": top_player_name,
-                "half_board": self.half_board.copy(),
+                "half_board": self._new_half_board(),
                 "passed": False,
-                "deck": [],
+                "deck": deque(),
                 "hand": [],
                 "graveyard": [],
+                "row_scores": dict.fromkeys(self.half_board, 0),
                 "current_rows_won": 0,
                 "rounds_won": 0
             },
             "bottom_player":{
                 "name": bottom_player_name,
-                "half_board": self.half_board.copy(),
+                "half_board": self._new_half_board(),
                 "passed": False,
-                "deck": [],
+                "deck": deque(),
                 "hand": [],
                 "graveyard": [],
+                "row_scores": dict.fromkeys(self.half_board, 0),
                 "current_rows_won": 0,
                 "rounds_won": 0
             }
@@ -57,25 +85,30 @@ class Board:
         self.round_number = 1
 
     def reset(self) -> None:
+        if self._frames:
+            self._undo.append((_UNDO_RESET, self.player_states, self.round_number,
+                               getattr(self, "done", False), self.turn_player))
         # Player attributes
         self.player_states = {
             "top_player":{
                 "name": self.get_player_name(False),
-                "half_board": self.half_board.copy(),
+                "half_board": self._new_half_board(),
                 "passed": False,
-                "deck": [],
+                "deck": deque(),
                 "hand": [],
                 "graveyard": [],
+                "row_scores": dict.fromkeys(self.half_board, 0),
                 "current_rows_won": 0,
                 "rounds_won": 0
             },
             "bottom_player":{
                 "name": self.get_player_name(True),
-                "half_board": self.half_board.copy(),
+                "half_board": self._new_half_board(),
                 "passed": False,
-                "deck": [],
+                "deck": deque(),
                 "hand": [],
                 "graveyard": [],
+                "row_scores": dict.fromkeys(self.half_board, 0),
                 "current_rows_won": 0,
                 "rounds_won": 0
             }
@@ -88,6 +121,175 @@ class Board:
         # Setup for game
         self.clear_deck()  # Generate empty player decks
         self.clear_hands() # Generate empty player hands
+        for observer in self.observers:
+            observer.board_reset()
+
+    def add_observer(self, observer) -> None:
+        """
+        Method to register an observer, it is notified about every change of the board.
+
+        Args:
+            observer (BoardObserver): observer to notify
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer) -> None:
+        """
+        Method to unregister an observer.
+
+        Args:
+            observer (BoardObserver): observer that should no longer be notified
+        """
+        self.observers.remove(observer)
+
+    def get_hash(self) -> int:
+        """
+        Method to get the 64-bit Zobrist hash of the position: hands, decks and rows (as multisets),
+        passed flags, round number and rounds won, see src/zobrist.py. It is created by the first
+        call and then kept up to date with every change, so boards that are never hashed pay nothing.
+
+        Returns:
+            int: hash of the position
+        """
+        if self._zobrist is None:
+            self._zobrist = ZobristHash(self)
+        return self._zobrist.value
+
+    def clone(self) -> "Board":
+        """
+        Method to copy the board for a lookahead. Only the containers that are changed in place
+        (hands, decks, rows and row scores) are copied, the cards and the graveyards (which are
+        only replaced) are shared. The copy has no observers, no undo log and its own rng,
+        spawned from the rng of the board (so shuffling the copy leaves the board's draws unchanged).
+
+        Returns:
+            Board: independent copy of the board
+        """
+        board = Board.__new__(Board)
+        board.__dict__.update(self.__dict__)
+        board.rng = self.rng.spawn(1)[0]
+        board.observers = []
+        board._zobrist = None
+        board._undo = []
+        board._frames = []
+        board.player_states = {}
+        for player, state in self.player_states.items():
+            state = state.copy()
+            state["half_board"] = {row: cards[:] for row, cards in state["half_board"].items()}
+            state["deck"] = state["deck"].copy()
+            state["hand"] = state["hand"][:]
+            state["row_scores"] = state["row_scores"].copy()
+            board.player_states[player] = state
+        return board
+
+    def push(self) -> None:
+        """
+        Method to remember the current state, pop goes back to it. Pushes can be nested.
+        While a push is open every change logs how it is undone, which costs O(1) per change
+        (shuffling the deck logs a copy of the deck).
+        """
+        self._frames.append(len(self._undo))
+
+    def pop(self) -> None:
+        """
+        Method to undo every change since the last push. Observers that follow the undo
+        are told every undone change (see BoardObserver), the others are notified with board_restored.
+
+        Raises:
+            IndexError: if there was no push
+        """
+        start = self._frames.pop()
+        undo = self._undo
+        followers = self._get_undo_followers(start)
+        while len(undo) > start:
+            entry = undo.pop()
+            kind = entry[0]
+            if kind == _UNDO_STATE:
+                _, player, key, value = entry
+                # passing twice logs True, nothing to follow then
+                unpassed = key == "passed" and not value and self.player_states[player][key]
+                self.player_states[player][key] = value
+                bottom_player = player == "bottom_player"
+                for observer in followers:
+                    if key == "deck":
+                        observer.deck_set(bottom_player)
+                    elif key == "hand":
+                        observer.hand_set(bottom_player)
+                    elif unpassed:
+                        observer.round_unpassed(bottom_player)
+            elif kind == _UNDO_DRAW:
+                _, bottom_player, num_cards = entry
+                hand = self.get_hand(bottom_player)
+                deck = self.get_deck(bottom_player)
+                for _ in range(num_cards):
+                    deck.appendleft(hand.pop())
+                if followers:
+                    cards = [deck[index] for index in range(num_cards)]
+                    for observer in followers:
+                        observer.cards_undrawn(bottom_player, cards)
+            elif kind == _UNDO_DECK_ORDER:
+                _, bottom_player, cards = entry
+                deck = self.get_deck(bottom_player)
+                deck.clear()
+                deck.extend(cards)
+                for observer in followers:
+                    observer.deck_set(bottom_player)
+            elif kind == _UNDO_PLAY:
+                _, bottom_player, card_index, card, row, row_score, top_rows_won, bottom_rows_won = entry
+                player_state = self.player_states[self._get_player_identifier(bottom_player)]
+                if row is not None:
+                    player_state["half_board"][row].pop()
+                    player_state["row_scores"][row] = row_score
+                    self.player_states["top_player"]["current_rows_won"] = top_rows_won
+                    self.player_states["bottom_player"]["current_rows_won"] = bottom_rows_won
+                player_state["hand"].insert(card_index, card)
+                for observer in followers:
+                    observer.card_unplayed(bottom_player, card_index, card, row)
+            elif kind == _UNDO_ROUND:
+                self.round_number = entry[1]
+            else:
+                _, self.player_states, self.round_number, self.done, self.turn_player = entry
+        for observer in self.observers:
+            if observer not in followers:
+                observer.board_restored()
+
+    def _get_undo_followers(self, start: int) -> list:
+        """Returns the observers that are told the undone changes since start one by one"""
+        if not self.observers:
+            return []
+        for index in range(start, len(self._undo)):
+            entry = self._undo[index]
+            # the end of a round and a reset replace everything, only a restore can follow them
+            if entry[0] in (_UNDO_ROUND, _UNDO_RESET) or (entry[0] == _UNDO_STATE and entry[2] not in _FOLLOWED_KEYS):
+                return []
+        return [observer for observer in self.observers if observer.follows_undo]
+
+    def _log_state(self, player_identifier: str, key: str) -> None:
+        """Logs the value of a player state before it is replaced, if a push is open"""
+        if self._frames:
+            self._undo.append((_UNDO_STATE, player_identifier, key, self.player_states[player_identifier][key]))
+
+    def _log_play(self, bottom_player: bool, card_index: int, card: Card, row: Row) -> None:
+        """Logs a played card with the scores its row changes, cards drawn by an effect are logged on their own"""
+        if isinstance(card, EffectCard):
+            self._undo.append((_UNDO_PLAY, bottom_player, card_index, card, None, 0, 0, 0))
+            return
+        self._undo.append((
+            _UNDO_PLAY, bottom_player, card_index, card, row,
+            self.player_states[self._get_player_identifier(bottom_player)]["row_scores"][row],
+            self.player_states["top_player"]["current_rows_won"],
+            self.player_states["bottom_player"]["current_rows_won"],
+        ))
+
+    def _new_half_board(self) -> dict[Row, list]:
+        """
+        Method to create an empty half board from the blueprint. Every row gets its own
+        list, so the half boards of the players never share the lists of the rows.
+
+        Returns:
+            dict[Row, list]: Row: [Cards] dict without cards
+        """
+        return {row: [] for row in self.half_board}
 
     def _get_player_identifier(self, bottom_player: bool) -> str:
         """
@@ -105,13 +307,23 @@ class Board:
 
     def clear_deck(self) -> None:
         """Clears the game board"""
-        self.player_states["top_player"]["deck"] = []
-        self.player_states["bottom_player"]["deck"] = []
+        self._log_state("top_player", "deck")
+        self._log_state("bottom_player", "deck")
+        self.player_states["top_player"]["deck"] = deque()
+        self.player_states["bottom_player"]["deck"] = deque()
+        for observer in self.observers:
+            observer.deck_set(False)
+            observer.deck_set(True)
 
     def clear_hands(self) -> None:
         """Clears the hands"""
+        self._log_state("top_player", "hand")
+        self._log_state("bottom_player", "hand")
         self.player_states["top_player"]["hand"] = []
         self.player_states["bottom_player"]["hand"] = []
+        for observer in self.observers:
+            observer.hand_set(False)
+            observer.hand_set(True)
 
     def set_deck(self, bottom_player: bool, deck: list[Card]) -> None:
         """
@@ -120,13 +332,26 @@ class Board:
         of the top player will be set
 
         Args:
-            deck (list[Card]): _description_
-            bottom_player (bool): _description_
+            bottom_player (bool): Indicate which players deck to set. True for bottom players deck
+            deck (list[Card]): cards of the deck, the first card is drawn first
         """
         player_identifier = self._get_player_identifier(bottom_player)
-        self.player_states[player_identifier]["deck"] = deck
+        self._log_state(player_identifier, "deck")
+        self.player_states[player_identifier]["deck"] = deque(deck)
+        for observer in self.observers:
+            observer.deck_set(bottom_player)
+
+    def set_deck_ids(self, bottom_player: bool, card_ids) -> None:
+        """
+        Method to set the deck of a player from card ids, e.g. decks of a DeckBank.
+
+        Args:
+            bottom_player (bool): Indicate which players deck to set. True for bottom players deck
+            card_ids (np.ndarray): ids of the cards of the deck, the first card is drawn first
+        """
+        self.set_deck(bottom_player, [get_card(card_id) for card_id in card_ids.tolist()])
 
-    def get_deck(self, bottom_player: bool):
+    def get_deck(self, bottom_player: bool) -> deque[Card]:
         """
         Method to get the deck of a player. If bottom player the deck of
         the bottom player will be returned, otherwise the deck of the
@@ -134,6 +359,9 @@ class Board:
 
         Args:
             bottom_player (bool): Indicate which players deck to get. True for bottom players deck
+
+        Returns:
+            deque[Card]: deck of the player, cards are drawn from the left
         """
         player_identifier = self._get_player_identifier(bottom_player)
         return self.player_states[player_identifier]["deck"]
@@ -186,6 +414,31 @@ class Board:
         player_identifier = self._get_player_identifier(bottom_player)
         return self.player_states[player_identifier]["hand"]
 
+    def get_hand_size(self, bottom_player: bool) -> int:
+        """
+        Method to get the number of cards in the hand of a player
+
+        Args:
+            bottom_player (bool): Indicates if hand of bottom or top player is counted
+
+        Returns:
+            int: number of cards in the hand
+        """
+        return len(self.player_states[self._get_player_identifier(bottom_player)]["hand"])
+
+    def get_hand_card(self, bottom_player: bool, card_index: int) -> Card:
+        """
+        Method to get one card of the hand of a player, without getting the whole hand
+
+        Args:
+            bottom_player (bool): Indicates if the card of the bottom or top player is returned
+            card_index (int): index of the card in the hand
+
+        Returns:
+            Card: card at the index
+        """
+        return self.player_states[self._get_player_identifier(bottom_player)]["hand"][card_index]
+
     def set_hand(self, bottom_player: bool, hand: list[Card]) -> None:
         """
         Method to get the hand of a player
@@ -197,7 +450,10 @@ class Board:
             list[Card]: Hand of the player
         """
         player_identifier = self._get_player_identifier(bottom_player)
+        self._log_state(player_identifier, "hand")
         self.player_states[player_identifier]["hand"] = hand
+        for observer in self.observers:
+            observer.hand_set(bottom_player)
 
     def get_half_board(self, bottom_player: bool) -> dict[Row, list]:
         """
@@ -233,14 +489,22 @@ class Board:
             num_cards (int, optional): The number of cards to draw. Defaults to 2.
             shuffle (boolean, optional)
         """
-        actually_drawn = min(len(self.get_deck(bottom_player)), num_cards)
+        deck = self.get_deck(bottom_player)
+        hand = self.get_hand(bottom_player)
+        actually_drawn = min(len(deck), num_cards)
         if shuffle:
-            random.shuffle(self.get_deck(bottom_player))
-            #self.set_deck(bottom_player, )
-        # Draw cards from the deck
-        self.set_hand(bottom_player, self.get_hand(bottom_player) + self.get_deck(bottom_player)[:actually_drawn])
-        # Remove drawn cards from the deck
-        self.set_deck(bottom_player, self.get_deck(bottom_player)[actually_drawn:])
+            if self._frames:
+                self._undo.append((_UNDO_DECK_ORDER, bottom_player, list(deck)))
+            self.rng.shuffle(deck)
+        # Move the cards from the deck into the hand
+        for _ in range(actually_drawn):
+            hand.append(deck.popleft())
+        if self._frames and actually_drawn:
+            self._undo.append((_UNDO_DRAW, bottom_player, actually_drawn))
+        if self.observers and actually_drawn:
+            drawn_cards = hand[-actually_drawn:]
+            for observer in self.observers:
+                observer.cards_drawn(bottom_player, drawn_cards)
 
     def play_card(self, bottom_player, card_index, row) -> None:
         """
@@ -252,20 +516,57 @@ class Board:
             row (Row): row in which the card is played
         """
         played_card = self.get_hand(bottom_player)[card_index]
+        if self._frames:
+            # cards drawn by an effect are logged (and undone) on their own
+            self._log_play(bottom_player, card_index, played_card, row)
         # special case if effect card
         if isinstance(played_card, EffectCard):
             played_card.execute_effect(self, bottom_player)
+            row = None
         else:
-            # **PLEASE LEAVE AS IS, is using += the function adds cards to both boards (dont know why 0_o)
             # add it to the players board
-            row_cards = self.player_states[self._get_player_identifier(bottom_player)]["half_board"][row]
-            self.player_states[self._get_player_identifier(bottom_player)]["half_board"][row] = row_cards + [played_card]
-        # remove card from hand
-        self.set_hand(bottom_player, self.get_hand(bottom_player)[:card_index] + self.get_hand(bottom_player)[card_index+1:])
+            self.get_half_board(bottom_player)[row].append(played_card)
+            self._add_row_score(bottom_player, row, played_card.strength)
+        # remove card from hand (effects only append to the hand, so the index is still valid)
+        del self.get_hand(bottom_player)[card_index]
+        for observer in self.observers:
+            observer.card_played(bottom_player, card_index, played_card, row)
+
+    def _get_row_outcome(self, row: Row) -> tuple[int, int]:
+        """
+        Method to get which player wins a row, based on the cached row scores.
 
-        top_player_won_rows, bottom_player_won_rows = self.get_won_rows()
-        self.player_states["top_player"]["current_rows_won"] = top_player_won_rows
-        self.player_states["bottom_player"]["current_rows_won"] = bottom_player_won_rows
+        Args:
+            row (Row): row to compare
+
+        Returns:
+            tuple[int, int]: 1 if the row is won, 0 otherwise (top_player, bottom_player)
+        """
+        top_score = self.player_states["top_player"]["row_scores"][row]
+        bottom_score = self.player_states["bottom_player"]["row_scores"][row]
+        # rows without any score are not won by anyone
+        if top_score == bottom_score == 0:
+            return 0, 0
+        return int(top_score >= bottom_score), int(top_score <= bottom_score)
+
+    def _add_row_score(self, bottom_player: bool, row: Row, strength: int) -> None:
+        """
+        Method to add strength to a row of a player. Updates the cached row score and
+        the won rows of both players, only the given row is compared again.
+
+        Args:
+            bottom_player (bool): player whose row gets the strength
+            row (Row): row the strength is added to
+            strength (int): strength to add
+        """
+        if row == Row.EFFECTS:
+            self.player_states[self._get_player_identifier(bottom_player)]["row_scores"][row] += strength
+            return
+        top_won_before, bottom_won_before = self._get_row_outcome(row)
+        self.player_states[self._get_player_identifier(bottom_player)]["row_scores"][row] += strength
+        top_won_after, bottom_won_after = self._get_row_outcome(row)
+        self.player_states["top_player"]["current_rows_won"] += top_won_after - top_won_before
+        self.player_states["bottom_player"]["current_rows_won"] += bottom_won_after - bottom_won_before
 
     def pass_round(self, bottom_player: bool) -> None:
         """
@@ -275,7 +576,10 @@ class Board:
             bottom_player (bool): Set for bottom or top player
         """
         player_identifier = self._get_player_identifier(bottom_player)
+        self._log_state(player_identifier, "passed")
         self.player_states[player_identifier]["passed"] = True
+        for observer in self.observers:
+            observer.round_passed(bottom_player)
 
     def end_round(self):
         """
@@ -284,6 +588,12 @@ class Board:
         and resets the passing states of the players.
         Drawing cards for the next round has to be handled outside of this class.
         """
+        if self._frames:
+            # every changed value is replaced, not changed in place, so the old references are logged
+            for player in ("top_player", "bottom_player"):
+                for key in ("half_board", "graveyard", "row_scores", "current_rows_won", "passed", "rounds_won"):
+                    self._log_state(player, key)
+            self._undo.append((_UNDO_ROUND, self.round_number))
         for bottom_player in [True, False]:
             player = self._get_player_identifier(bottom_player)
             opponent = self._get_player_identifier(not bottom_player)
@@ -296,13 +606,37 @@ class Board:
             # update graveyard
             self.player_states[player]["graveyard"] = list(chain(*self.player_states[player]["half_board"].values()))
             # reset board
-            self.player_states[player]["half_board"] = self.half_board.copy()
+            self.player_states[player]["half_board"] = self._new_half_board()
+            self.player_states[player]["row_scores"] = dict.fromkeys(self.half_board, 0)
             # reset rows won
             self.player_states[player]["current_rows_won"] = 0
             # reset passed state
             self.player_states[player]["passed"] = False
         # update round ticker
         self.round_number += 1
+        for observer in self.observers:
+            observer.round_ended()
+
+    def set_round_state(self, round_number: int, rounds_won: tuple[int, int], graveyards: tuple[list[int], list[int]]) -> None:
+        """
+        Method to set what the past rounds left behind, e.g. to load a snapshot of another board.
+        Everything else of a state can be set with the other methods (decks, hands, played cards, passing).
+
+        Args:
+            round_number (int): current round
+            rounds_won (tuple[int, int]): rounds won (top_player, bottom_player)
+            graveyards (tuple[list[int], list[int]]): card ids of the graveyards (top_player, bottom_player)
+        """
+        for player, won, graveyard in zip(("top_player", "bottom_player"), rounds_won, graveyards):
+            self._log_state(player, "rounds_won")
+            self._log_state(player, "graveyard")
+            self.player_states[player]["rounds_won"] = won
+            self.player_states[player]["graveyard"] = [get_card(card_id) for card_id in graveyard]
+        if self._frames:
+            self._undo.append((_UNDO_ROUND, self.round_number))
+        self.round_number = round_number
+        for observer in self.observers:
+            observer.board_restored()
 
     def game_ended(self) -> bool:
         """
@@ -317,7 +651,8 @@ class Board:
 
     def get_row_score(self, bottom_player: bool, row: Row) -> int:
         """
-        Method to get the score for one row of a player. The return will be a single int
+        Method to get the score for one row of a player. The return will be a single int.
+        The score is kept up to date by play_card and end_round.
         
         Args:
             bottom_player (bool): Indicates if scores for bottom (otherwise top) player should be
@@ -328,9 +663,7 @@ class Board:
             int: score of the row
         """
         player_identifier = self._get_player_identifier(bottom_player)
-        return sum(
-            card.strength for card in self.player_states[player_identifier]["half_board"][row]
-        )
+        return self.player_states[player_identifier]["row_scores"][row]
 
     def get_row_scores(self, bottom_player: bool) -> dict[Row, int]:
         """
@@ -343,9 +676,8 @@ class Board:
             tuple[dict, dict]: dict that contains rows as keys and int scores as values,
             indicating the row score
         """
-        field_rows = [row for row in self.half_board.keys() if row != Row.EFFECTS]
-        row_scores = {row: self.get_row_score(bottom_player, row) for row in field_rows}
-        return row_scores
+        row_scores = self.player_states[self._get_player_identifier(bottom_player)]["row_scores"]
+        return {row: score for row, score in row_scores.items() if row != Row.EFFECTS}
 
     def get_won_rows(self) -> tuple[int, int]:
         """
@@ -356,19 +688,10 @@ class Board:
         Returns:
             tuple[int, int]: Number of won rows for each player. (top_player, bottom_player)
         """
-        top_score = 0
-        bottom_score = 0
-
-        scores_top = self.get_row_scores(False)
-        scores_bottom = self.get_row_scores(True)
-        for row in scores_top.keys():
-            # only add scores that are non empty
-            if scores_bottom[row] == scores_top[row] and scores_bottom[row]==0:
-                continue
-            top_score += int(scores_top[row] >= scores_bottom[row])
-            bottom_score += int(scores_top[row] <= scores_bottom[row])
-
-        return top_score, bottom_score
+        return (
+            self.player_states["top_player"]["current_rows_won"],
+            self.player_states["bottom_player"]["current_rows_won"]
+        )
 
     def get_winner(self) -> list[str]:
         """
@@ -436,9 +759,16 @@ if __name__ == '__main__':
 
     assert len(board.get_deck(bottom_player)) == 15
     assert len(board.get_valid_choices(bottom_player)) == 5
+    board.set_hand(bottom_player, [Card("KNIGHT", 3, Row.FRONT)] + board.get_hand(bottom_player))
     board.play_card(False, 0, Row.FRONT)
     assert len(board.player_states["top_player"]["half_board"][Row.FRONT]) == 1
     assert len(board.player_states["bottom_player"]["half_board"][Row.FRONT]) == 0
+    assert len(board.get_hand(bottom_player)) == 5
+    # guard: the half boards must never share row lists (with each other or the blueprint)
+    for half_board_row in board.half_board:
+        assert board.get_half_board(True)[half_board_row] is not board.get_half_board(False)[half_board_row]
+        assert board.get_half_board(True)[half_board_row] is not board.half_board[half_board_row]
+    assert board.half_board == {Row.FRONT: [], Row.WISE: [], Row.SUPPORT: [], Row.EFFECTS: []}
     #board.player_states["top_player"]["half_board"]
     board.reset()
     board.set_deck(bottom_player, [Card("KNIGHT", 10, Row.FRONT)])
@@ -463,9 +793,81 @@ if __name__ == '__main__':
     board.end_round()
     assert len(board.get_graveyard(bottom_player)) == 1
     assert len(board.get_hand(bottom_player)) == 0
+    # guard: boards cleared at the end of a round must not be shared either
+    board.set_hand(True, [Card("HEALER", 2, Row.SUPPORT)])
+    board.play_card(True, 0, Row.SUPPORT)
+    assert len(board.get_half_board(True)[Row.SUPPORT]) == 1
+    assert len(board.get_half_board(False)[Row.SUPPORT]) == 0
+    assert board.get_row_score(False, Row.SUPPORT) == 0
 
     board.player_states["top_player"]["rounds_won"] = 2
     board.player_states["bottom_player"]["rounds_won"] = 1
     if board.game_ended():
         winner = board.get_winner()
         assert len(winner) == 1 and winner[0] == "Hungriger"
+    # guard: pop undoes every change since the push, clones are independent of their board
+    from src.array_board import ArrayBoard
+    from src.deck_sampler import sample_decks
+    from src.observation import ObservationBuffer
+
+    def get_position(board) -> tuple:
+        return tuple(
+            (tuple(card.card_id for card in board.get_hand(player)), tuple(card.card_id for card in board.get_deck(player)),
+             # the accessors of single cards agree with the hand
+             tuple(board.get_hand_card(player, index).card_id for index in range(board.get_hand_size(player))),
+             tuple(tuple(card.card_id for card in cards) for cards in board.get_half_board(player).values()),
+             tuple(card.card_id for card in board.get_graveyard(player)), tuple(board.get_row_scores(player).items()),
+             board.has_passed(player), board.get_rounds_won(player))
+            for player in (False, True)
+        ) + (board.get_won_rows(), board.round_number, board.get_hash())
+
+    def play_random(board, rng, num_moves) -> None:
+        bottom_player = bool(rng.integers(2))
+        for _ in range(num_moves):
+            if board.game_ended():
+                return
+            hand = board.get_hand(bottom_player)
+            if hand and not board.has_passed(bottom_player) and rng.random() > 0.15:
+                card_index = int(rng.integers(len(hand)))
+                card = hand[card_index]
+                board.play_card(bottom_player, card_index, Row.FRONT if card.type == Row.ANY else card.type)
+            else:
+                board.pass_round(bottom_player)
+            if board.has_passed(True) and board.has_passed(False):
+                board.end_round()
+                board.draw_cards_to_hand(True, shuffle=bool(rng.integers(2)))
+                board.draw_cards_to_hand(False)
+            bottom_player = not bottom_player
+
+    rng = np.random.default_rng(0)
+    for backend in (Board, ArrayBoard):
+        for game in range(100):
+            board = backend("top", "bottom", rng=np.random.default_rng(game))
+            for player, deck in zip((True, False), sample_decks(rng, 2)):
+                board.set_deck_ids(player, deck)
+                board.draw_cards_to_hand(player, 10)
+            board.get_hash()
+            observations = [ObservationBuffer(board), ObservationBuffer(board, bottom_player=True)]
+            while not board.game_ended():
+                position = get_position(board)
+                board.push()
+                play_random(board, rng, int(rng.integers(1, 8)))
+                inner = get_position(board)
+                board.push()
+                play_random(board, rng, 5)
+                board.pop()
+                assert get_position(board) == inner, game
+                board.pop()
+                assert get_position(board) == position, game
+                # the observations followed the undone changes like a full rewrite
+                for observation in observations:
+                    incremental = observation.get_observation()
+                    observation.refresh()
+                    assert (incremental == observation.get_observation()).all(), game
+                rng_state = board.rng.bit_generator.state
+                clone = board.clone()
+                play_random(clone, rng, 10)
+                clone.draw_cards_to_hand(True, shuffle=True)
+                assert get_position(board) == position, game
+                assert board.rng.bit_generator.state == rng_state, game
+                play_random(board, rng, 3)
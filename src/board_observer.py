@@ -0,0 +1,106 @@
+"""Module that provides the BoardObserver class, the interface to follow the changes of a board"""
+# local imports
+from src.row import Row
+from src.cards import Card
+
+
+class BoardObserver:
+    """Gets notified by a board (Board or ArrayBoard) after every change of its state.
+
+    Register an observer with board.add_observer(observer). Every method does nothing
+    by default, so an observer only has to implement the changes it is interested in.
+    The board is already in the new state when a method is called.
+
+    board.pop reports the undone changes one by one (as deck_set, hand_set and the
+    inverse methods cards_undrawn, card_unplayed and round_unpassed) to observers that
+    set follows_undo. The other observers are notified with board_restored instead, as are
+    all observers if a round ended or the board was reset since the push.
+    """
+    # True if the observer implements the inverse methods, so pop does not need board_restored
+    follows_undo = False
+
+    def board_reset(self) -> None:
+        """Called after the board was reset, all cards are gone and the round is 1 again"""
+
+    def deck_set(self, bottom_player: bool) -> None:
+        """
+        Called after the deck of a player was replaced (or cleared)
+
+        Args:
+            bottom_player (bool): True if the deck of the bottom player changed
+        """
+
+    def hand_set(self, bottom_player: bool) -> None:
+        """
+        Called after the hand of a player was replaced (or cleared)
+
+        Args:
+            bottom_player (bool): True if the hand of the bottom player changed
+        """
+
+    def cards_drawn(self, bottom_player: bool, cards: list[Card]) -> None:
+        """
+        Called after cards were moved from the deck to the end of the hand
+
+        Args:
+            bottom_player (bool): True if the bottom player drew the cards
+            cards (list[Card]): drawn cards, in the order they were added to the hand
+        """
+
+    def card_played(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        """
+        Called after a card was removed from the hand and played. Cards drawn by
+        an effect card were already reported by cards_drawn.
+
+        Args:
+            bottom_player (bool): True if the bottom player played the card
+            card_index (int): index the card had in the hand
+            card (Card): played card
+            row (Row | None): row the card was added to, None for effect cards (not added to a row)
+        """
+
+    def round_passed(self, bottom_player: bool) -> None:
+        """
+        Called after a player passed the round
+
+        Args:
+            bottom_player (bool): True if the bottom player passed
+        """
+
+    def round_ended(self) -> None:
+        """Called after the end of a round, the rows were moved into the graveyards"""
+
+    def board_restored(self) -> None:
+        """
+        Called after the board was set to another state at once (board.pop went back to an earlier
+        state or board.set_round_state loaded the round state), the changes are not reported one by one
+        """
+
+    def cards_undrawn(self, bottom_player: bool, cards: list[Card]) -> None:
+        """
+        Called by board.pop after drawn cards were moved from the end of the hand back to the top of the deck
+
+        Args:
+            bottom_player (bool): True if the cards of the bottom player were moved
+            cards (list[Card]): moved cards, in the order they are in the deck now
+        """
+
+    def card_unplayed(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        """
+        Called by board.pop after a played card was taken back from the end of its row into the hand.
+        Cards drawn by an effect card were already taken back with cards_undrawn.
+
+        Args:
+            bottom_player (bool): True if the card of the bottom player was taken back
+            card_index (int): index the card has in the hand again
+            card (Card): card that was taken back
+            row (Row | None): row the card was removed from, None for effect cards
+        """
+
+    def round_unpassed(self, bottom_player: bool) -> None:
+        """
+        Called by board.pop after the passed flag of a player was cleared again
+
+        Args:
+            bottom_player (bool): True if the bottom player has not passed anymore
+        """
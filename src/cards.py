@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-import random
 from enum import Enum
+import numpy as np
 from src.row import Row
 
 
@@ -13,20 +13,50 @@ class CardName(Enum):
     DRAW2 = 5
 
 
-class Card:  
-    def __init__(self, name: CardName, strength: int, row_restriction=Row | None):
-        self.name = name
-        self.type = row_restriction
-        self.strength = strength
-    
+class Card:
+    """A card of the game. Cards are immutable flyweights: creating a card with the same
+    class, name, strength and row again returns the same (interned) instance, so all decks,
+    hands and games share one object per kind of card. Every card carries its observation
+    vector and its integer id, see get_card_id.
+    """
+    __slots__ = ("name", "type", "strength", "vector", "card_id")
+
+    def __new__(cls, name: str, strength: int, row_restriction: Row | None = None):
+        key = (cls, name, strength, row_restriction)
+        card = _card_prototypes.get(key)
+        if card is None:
+            card = super().__new__(cls)
+            _card_prototypes[key] = card
+        return card
+
+    def __init__(self, name: str, strength: int, row_restriction: Row | None = None):
+        # interned cards are already set up
+        if hasattr(self, "card_id"):
+            return
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "type", row_restriction)
+        object.__setattr__(self, "strength", strength)
+        object.__setattr__(self, "vector", (strength, row_restriction.value, CardName[name].value))
+        object.__setattr__(self, "card_id", len(_card_registry))
+        _card_registry.append(self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Cards are immutable, can not set {name}")
+
+    def __reduce__(self):
+        # recreate (and intern) the card from its arguments, ids differ between processes
+        return self.__class__, (self.name, self.strength, self.type)
+
     def get_card_vector(self):
-        return self.strength, self.type.value, CardName[self.name].value
+        return self.vector
 
     def __str__(self):
         return f"{self.name} (Str: {self.strength}, Row: {self.type})"
 
 
 class EffectCard(Card, ABC):
+    __slots__ = ()
+
     @abstractmethod
     def execute_effect(self, env) -> None:
         """
@@ -42,9 +72,19 @@ class EffectCard(Card, ABC):
 
 
 class DrawCard(EffectCard):
+    __slots__ = ("num_card",)
+
+    def __new__(cls, name, num_cards):
+        return super().__new__(cls, name, num_cards, Row.EFFECTS)
+
     def __init__(self, name, num_cards):
+        if hasattr(self, "card_id"):
+            return
+        object.__setattr__(self, "num_card", num_cards)
         super().__init__(name, num_cards, Row.EFFECTS)
-        self.num_card = num_cards
+
+    def __reduce__(self):
+        return self.__class__, (self.name, self.num_card)
 
     def execute_effect(self, env, bottom_player) -> None:
         safe_n_cards = min(len(env.get_deck(bottom_player)), self.num_card)
@@ -52,7 +92,13 @@ class DrawCard(EffectCard):
 
 
 class Booster:
-    def __init__(self):
+    def __init__(self, rng: np.random.Generator | None = None):
+        """
+        Args:
+            rng (np.random.Generator, optional): generator the booster is opened with,
+            a new unseeded one if not given
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
         self.available_strength = [1,2,3,4,5]
         self.available_cards_weights = [0.3, 0.3, 0.3, 0.05, 0.05] # Probabilities
         self.strength_weights = [0.35, 0.25, 0.2, 0.15, 0.05] # Probabilities
@@ -61,12 +107,74 @@ class Booster:
             DrawCard("DRAW2", 2)
         ]
         self.available_cards = [
-                            Card("KNIGHT", random.choices(self.available_strength, self.strength_weights)[0], Row.FRONT),
-                            Card("CLERIC", random.choices(self.available_strength, self.strength_weights)[0], Row.WISE),
-                            Card("HEALER", random.choices(self.available_strength, self.strength_weights)[0], Row.SUPPORT),
-                            Card("HERO", random.choices(self.available_strength, self.strength_weights)[0], Row.ANY), # Can be played in any row
-                            random.choice(self.available_effects)
+                            Card("KNIGHT", self._choose_strength(), Row.FRONT),
+                            Card("CLERIC", self._choose_strength(), Row.WISE),
+                            Card("HEALER", self._choose_strength(), Row.SUPPORT),
+                            Card("HERO", self._choose_strength(), Row.ANY), # Can be played in any row
+                            self.available_effects[self.rng.integers(len(self.available_effects))]
                             ]
-        
+
+    def _choose_strength(self) -> int:
+        return self.available_strength[self.rng.choice(len(self.available_strength), p=self.strength_weights)]
+
     def open(self,size):
-        return random.choices(self.available_cards, self.available_cards_weights, k=size)
\ No newline at end of file
+        picks = self.rng.choice(len(self.available_cards), size=size, p=self.available_cards_weights)
+        return [self.available_cards[pick] for pick in picks.tolist()]
+
+
+# id 0 is reserved for "no card", e.g. for empty slots in fixed size card arrays
+EMPTY_CARD_ID = 0
+# all known cards, the index in the list is the id of the card (filled by Card.__init__)
+_card_registry: list[Card | None] = [None]
+# the interned cards by (class, name, strength, row)
+_card_prototypes: dict[tuple, Card] = {}
+
+
+def get_card_id(card: Card) -> int:
+    """
+    Method to get the integer id of a card. Cards with the same class, name, strength
+    and row are the same instance and share one id, it is handed out when the card is created.
+
+    Args:
+        card (Card): card to get the id for
+
+    Returns:
+        int: id of the card
+    """
+    return card.card_id
+
+
+def get_card(card_id: int) -> Card:
+    """
+    Method to get the card for an id that was handed out by get_card_id
+
+    Args:
+        card_id (int): id of the card
+
+    Returns:
+        Card: card belonging to the id
+    """
+    return _card_registry[card_id]
+
+
+def get_card_count() -> int:
+    """
+    Method to get the number of handed out card ids (including EMPTY_CARD_ID).
+    All ids are smaller than this number, so it can be used as size of lookup tables.
+
+    Returns:
+        int: number of card ids
+    """
+    return len(_card_registry)
+
+
+def _register_booster_cards() -> None:
+    """Registers every card a Booster can contain, so their ids are the same in every process"""
+    for name, row in [("KNIGHT", Row.FRONT), ("CLERIC", Row.WISE), ("HEALER", Row.SUPPORT), ("HERO", Row.ANY)]:
+        for strength in [1,2,3,4,5]:
+            Card(name, strength, row)
+    DrawCard("DRAW1", 1)
+    DrawCard("DRAW2", 2)
+
+
+_register_booster_cards()
\ No newline at end of file
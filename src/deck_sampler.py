@@ -0,0 +1,133 @@
+"""Module that provides batched deck sampling with numpy and the DeckBank that buffers the decks"""
+import numpy as np
+# local imports
+from src.row import Row
+from src.cards import Booster, Card, DrawCard, get_card_id
+
+DECK_SIZE = 20
+# the kinds of cards of a Booster, same order as Booster.available_cards
+UNIT_CARDS = (("KNIGHT", Row.FRONT), ("CLERIC", Row.WISE), ("HEALER", Row.SUPPORT), ("HERO", Row.ANY))
+# probabilities of the Booster, copied as the Booster only sets them per instance
+# (and every instance draws the strengths of its cards when it is created)
+STRENGTHS = np.array([1, 2, 3, 4, 5])
+STRENGTH_WEIGHTS = np.array([0.35, 0.25, 0.2, 0.15, 0.05])
+CARD_WEIGHTS = np.array([0.3, 0.3, 0.3, 0.05, 0.05])
+# card ids by [kind of unit card, index of the strength]
+UNIT_CARD_IDS = np.array([
+    [get_card_id(Card(name, strength, row)) for strength in STRENGTHS.tolist()]
+    for name, row in UNIT_CARDS
+], dtype=np.int16)
+EFFECT_CARD_IDS = np.array([get_card_id(DrawCard("DRAW1", 1)), get_card_id(DrawCard("DRAW2", 2))], dtype=np.int16)
+
+
+def sample_decks(rng: np.random.Generator, num_decks: int, deck_size: int = DECK_SIZE) -> np.ndarray:
+    """
+    Samples decks like Booster().open(deck_size) does, for many decks at once.
+    Every deck gets its own booster: one strength per unit card, one of the draw
+    cards as effect card, then deck_size weighted picks from these five cards.
+
+    Args:
+        rng (np.random.Generator): generator the decks are sampled with
+        num_decks (int): number of decks
+        deck_size (int, optional): cards per deck
+
+    Returns:
+        np.ndarray: card ids of shape (num_decks, deck_size)
+    """
+    strengths = rng.choice(len(STRENGTHS), size=(num_decks, len(UNIT_CARDS)), p=STRENGTH_WEIGHTS)
+    # card ids of the five cards of every booster
+    boosters = np.empty((num_decks, len(UNIT_CARDS) + 1), dtype=np.int16)
+    boosters[:, :len(UNIT_CARDS)] = UNIT_CARD_IDS[np.arange(len(UNIT_CARDS)), strengths]
+    boosters[:, -1] = EFFECT_CARD_IDS[rng.integers(0, len(EFFECT_CARD_IDS), num_decks)]
+    picks = rng.choice(len(CARD_WEIGHTS), size=(num_decks, deck_size), p=CARD_WEIGHTS)
+    return np.take_along_axis(boosters, picks, axis=1)
+
+
+class DeckBank:
+    """Ring buffer of sampled decks.
+
+    The decks are sampled in batches of capacity decks with sample_decks, so the
+    environments only copy a deck out of the bank when they are reset.
+    """
+    def __init__(self, rng: np.random.Generator, capacity: int = 4096, deck_size: int = DECK_SIZE):
+        """
+        Args:
+            rng (np.random.Generator): generator the decks are sampled with
+            capacity (int, optional): number of decks sampled at once
+            deck_size (int, optional): cards per deck
+        """
+        self.rng = rng
+        self.decks = np.zeros((capacity, deck_size), dtype=np.int16)
+        # the next deck handed out, the bank is refilled when it reaches the capacity
+        self.position = capacity
+
+    def set_rng(self, rng: np.random.Generator) -> None:
+        """
+        Method to change the generator, e.g. after seeding. The decks that were
+        sampled with the old generator are dropped.
+
+        Args:
+            rng (np.random.Generator): new generator
+        """
+        self.rng = rng
+        self.position = len(self.decks)
+
+    def refill(self) -> None:
+        """Samples a new batch of decks, all decks in the bank are replaced"""
+        self.decks[:] = sample_decks(self.rng, len(self.decks), self.decks.shape[1])
+        self.position = 0
+
+    def take(self, num_decks: int = 1) -> np.ndarray:
+        """
+        Method to take decks from the bank, it is refilled when it runs empty.
+
+        Args:
+            num_decks (int, optional): number of decks
+
+        Returns:
+            np.ndarray: card ids of shape (num_decks, deck_size)
+        """
+        decks = np.empty((num_decks, self.decks.shape[1]), dtype=self.decks.dtype)
+        taken = 0
+        while taken < num_decks:
+            if self.position == len(self.decks):
+                self.refill()
+            count = min(num_decks - taken, len(self.decks) - self.position)
+            decks[taken:taken + count] = self.decks[self.position:self.position + count]
+            self.position += count
+            taken += count
+        return decks
+
+    def next_deck(self) -> np.ndarray:
+        """
+        Method to take one deck from the bank.
+
+        Returns:
+            np.ndarray: card ids of the deck
+        """
+        if self.position == len(self.decks):
+            self.refill()
+        self.position += 1
+        return self.decks[self.position - 1].copy()
+
+
+# Example usage
+if __name__ == '__main__':
+    from collections import Counter
+    # the sampled decks must have the same distribution as the decks of the Booster
+    booster = Booster(np.random.default_rng(4))
+    assert STRENGTHS.tolist() == booster.available_strength
+    assert STRENGTH_WEIGHTS.tolist() == booster.strength_weights
+    assert CARD_WEIGHTS.tolist() == booster.available_cards_weights
+    rng = np.random.default_rng(0)
+    booster_cards = Counter(get_card_id(card) for _ in range(20000) for card in Booster(rng).open(DECK_SIZE))
+    sampled_cards = Counter(sample_decks(np.random.default_rng(1), 20000).ravel().tolist())
+    for card_id in set(booster_cards) | set(sampled_cards):
+        assert abs(booster_cards[card_id] - sampled_cards[card_id]) / (20000 * DECK_SIZE) < 0.003, card_id
+    # cards of one kind have the same strength in a deck, like in a Booster
+    deck = sample_decks(np.random.default_rng(2), 1)[0]
+    assert all(len(set(deck[np.isin(deck, ids)].tolist())) <= 1 for ids in UNIT_CARD_IDS)
+    bank = DeckBank(np.random.default_rng(3), capacity=3)
+    decks = bank.take(5)
+    assert decks.shape == (5, DECK_SIZE) and bank.position == 2
+    assert np.array_equal(bank.next_deck(), bank.decks[2])
@@ -0,0 +1,195 @@
+"""Module that provides a pool of Game_Controller worker processes as vectorized environment"""
+import os
+import multiprocessing as mp
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+# local imports
+from src.observation import OBSERVATION_SIZE
+from src.game_controller import NUM_ACTIONS
+# the worker loop lives in its own module, spawned workers do not import stable-baselines3
+from src.env_worker import _shared_views, _worker
+
+
+def spawn_seeds(seed: int | None, count: int) -> list[int]:
+    """
+    Derives independent seeds for count environments from one seed.
+
+    Args:
+        seed (int | None): root seed, fresh entropy if None
+        count (int): number of seeds
+
+    Returns:
+        list[int]: one seed per environment
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(count)]
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """Vectorized environment that runs one Game_Controller per worker process.
+
+    Works like the SubprocVecEnv of stable-baselines3, but the workers write observations,
+    rewards and done flags directly into shared memory, so they are not pickled on every step.
+    The workers are shut down by close(), the pool can also be used as context manager.
+    """
+    def __init__(self, num_workers: int | None = None, board_backend: str = "dict", start_method: str = "spawn",
+                 seed: int | None = None):
+        """Starts the worker processes.
+
+        Args:
+            num_workers (int, optional): number of workers (and games). Defaults to the number of CPU cores.
+            board_backend (str, optional): board implementation of the workers, see BOARD_BACKENDS
+            start_method (str, optional): multiprocessing start method. Defaults to spawn, which is
+            available on every platform and does not fork a process that already runs torch.
+            seed (int, optional): seed of the pool, every worker gets its own stream derived from it
+            with the first reset. Defaults to None (unseeded).
+        """
+        num_workers = num_workers or os.cpu_count() or 1
+        ctx = mp.get_context(start_method)
+        observation_size = OBSERVATION_SIZE
+        self.closed = False
+        self.waiting = False
+        # lock free shared arrays, every worker only writes its own row
+        self.shared = {
+            "observations": ctx.RawArray("B", num_workers * observation_size),
+            "terminal_observations": ctx.RawArray("B", num_workers * observation_size),
+            "rewards": ctx.RawArray("f", num_workers),
+            "dones": ctx.RawArray("b", num_workers),
+            "truncations": ctx.RawArray("b", num_workers),
+            "action_masks": ctx.RawArray("b", num_workers * NUM_ACTIONS),
+        }
+        self.observations, self.terminal_observations, self.rewards, self.dones, self.truncations, self.masks = \
+            _shared_views(self.shared, num_workers, observation_size)
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for index, (work_remote, remote) in enumerate(zip(work_remotes, self.remotes)):
+            process = ctx.Process(
+                target=_worker,
+                args=(index, work_remote, remote, self.shared, num_workers, {"board_backend": board_backend}),
+                # if the main process dies the workers go down with it
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.remotes[0].send(("get_attr", "observation_space"))
+        observation_space = self.remotes[0].recv()
+        self.remotes[0].send(("get_attr", "action_space"))
+        action_space = self.remotes[0].recv()
+        super().__init__(num_workers, observation_space, action_space)
+        if seed is not None:
+            self.seed(seed)
+
+    def seed(self, seed: int | None = None) -> list[int]:
+        """
+        Sets the seeds the workers are reset with at the next reset. Unlike the seed + index
+        of the VecEnv, the seeds are spawned from one SeedSequence, so the streams of the
+        workers are independent.
+
+        Args:
+            seed (int, optional): seed of the pool, a random one if not given
+
+        Returns:
+            list[int]: seeds of the workers
+        """
+        self._seeds = spawn_seeds(seed, self.num_envs)
+        return self._seeds
+
+    def reset(self) -> np.ndarray:
+        for remote, seed, options in zip(self.remotes, self._seeds, self._options):
+            remote.send(("reset", (seed, options)))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        for index, reset_info in enumerate(self.reset_infos):
+            reset_info["action_mask"] = self.masks[index].copy()
+        self._reset_seeds()
+        self._reset_options()
+        return self.observations.copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", int(action)))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [remote.recv() or {} for remote in self.remotes]
+        self.waiting = False
+        for info, mask in zip(infos, self.masks.copy()):
+            info["action_mask"] = mask
+        for index in np.flatnonzero(self.dones).tolist():
+            infos[index]["terminal_observation"] = self.terminal_observations[index].copy()
+            infos[index]["TimeLimit.truncated"] = bool(self.truncations[index])
+        return self.observations.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def close(self) -> None:
+        """Shuts down all workers. Workers that do not stop in time are terminated."""
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for remote in self.remotes:
+            remote.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_target_remotes(self, indices) -> list:
+        return [self.remotes[index] for index in self._get_indices(indices)]
+
+    def get_attr(self, attr_name: str, indices=None) -> list:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name: str, value, indices=None) -> None:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the action masks of the current observations, see Game_Controller.action_masks.
+        The workers write them into the shared memory with every step, no worker is asked.
+
+        Returns:
+            np.ndarray: bool masks of shape (num_envs, NUM_ACTIONS)
+        """
+        return self.masks.copy()
+
+    def has_attr(self, attr_name: str) -> bool:
+        # the bound method of a worker env can not be sent through the pipe
+        if attr_name == "action_masks":
+            return True
+        return super().has_attr(attr_name)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list:
+        # the maskable algorithms of sb3_contrib get the masks with env_method("action_masks")
+        if method_name == "action_masks":
+            return list(self.action_masks()[self._get_indices(indices)])
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> list[bool]:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
@@ -0,0 +1,96 @@
+"""Module with the main loop of the SharedMemoryVecEnv worker processes.
+
+Kept apart from env_pool, so a spawned worker only imports the game and not stable-baselines3.
+"""
+import numpy as np
+
+# local imports
+from src.game_controller import Game_Controller, NUM_ACTIONS
+
+
+def _shared_views(shared: dict, num_envs: int, observation_size: int) -> tuple[np.ndarray, ...]:
+    """
+    Creates numpy views on the shared memory of the pool.
+
+    Args:
+        shared (dict): shared arrays created by SharedMemoryVecEnv
+        num_envs (int): number of workers
+        observation_size (int): size of one observation
+
+    Returns:
+        tuple[np.ndarray, ...]: observations, terminal observations, rewards, dones, truncations, action masks
+    """
+    return (
+        np.frombuffer(shared["observations"], dtype=np.uint8).reshape(num_envs, observation_size),
+        np.frombuffer(shared["terminal_observations"], dtype=np.uint8).reshape(num_envs, observation_size),
+        np.frombuffer(shared["rewards"], dtype=np.float32),
+        np.frombuffer(shared["dones"], dtype=np.bool_),
+        np.frombuffer(shared["truncations"], dtype=np.bool_),
+        np.frombuffer(shared["action_masks"], dtype=np.bool_).reshape(num_envs, NUM_ACTIONS),
+    )
+
+
+def _worker(index: int, remote, parent_remote, shared: dict, num_envs: int, env_kwargs: dict) -> None:
+    """
+    Main loop of a worker process. Runs one Game_Controller and writes observations,
+    rewards and done flags into the shared memory, only the info dicts and results of
+    attribute/method calls are sent back through the pipe.
+
+    Args:
+        index (int): index of the worker, row in the shared arrays
+        remote (Connection): end of the pipe used by the worker
+        parent_remote (Connection): end of the pipe used by the pool (closed in the worker)
+        shared (dict): shared arrays created by SharedMemoryVecEnv
+        num_envs (int): number of workers
+        env_kwargs (dict): keyword arguments for the Game_Controller (training is always True)
+    """
+    parent_remote.close()
+    # the observations are copied into the shared memory, the env can hand out its buffer
+    env = Game_Controller(True, copy_observations=False, **env_kwargs)
+    observations, terminal_observations, rewards, dones, truncations, action_masks = \
+        _shared_views(shared, num_envs, env.observation_space.shape[0])
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                observation, reward, terminated, truncated, info = env.step(data)
+                done = terminated or truncated
+                if done:
+                    # save final observation where the pool can get it, then reset
+                    terminal_observations[index] = observation
+                    observation, _ = env.reset()
+                observations[index] = observation
+                rewards[index] = reward
+                dones[index] = done
+                truncations[index] = truncated and not terminated
+                # the mask of the returned observation goes through the shared memory too
+                action_masks[index] = env.action_masks()
+                del info["action_mask"]
+                # most infos are empty, there is nothing to pickle then
+                remote.send(info or None)
+            elif command == "reset":
+                seed, options = data
+                observation, reset_info = env.reset(seed=seed, options=options)
+                observations[index] = observation
+                action_masks[index] = reset_info.pop("action_mask")
+                remote.send(reset_info)
+            elif command == "get_attr":
+                remote.send(getattr(env, data))
+            elif command == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif command == "env_method":
+                method_name, method_args, method_kwargs = data
+                remote.send(getattr(env, method_name)(*method_args, **method_kwargs))
+            elif command == "is_wrapped":
+                from stable_baselines3.common.env_util import is_wrapped
+                remote.send(is_wrapped(env, data))
+            elif command == "close":
+                break
+            else:
+                raise NotImplementedError(f"`{command}` is not implemented in the worker")
+    except (KeyboardInterrupt, EOFError):
+        # the pool is going down, nothing left to do
+        pass
+    finally:
+        env.close()
+        remote.close()
@@ -1,6 +1,4 @@
 # third party imports
-from itertools import chain
-import random
 import numpy as np
 from gymnasium import Env, spaces
 import logging
@@ -9,8 +7,23 @@ import time
 # local imports
 from src.player import Human,ArtificialRetardation
 from src.board import Board, Row
-from src.display import CardTable
-from src.cards import Booster
+from src.array_board import ArrayBoard
+from src.deck_sampler import DeckBank, DECK_SIZE
+from src.observation import ObservationBuffer, OBSERVATION_SIZE
+from src.profiling import PhaseProfiler
+from src.game_log import setup_game_logging
+from src.recorder import EpisodeRecorder
+
+logger = logging.getLogger(__name__)
+
+# implementations of the board state the environment can be built with, the dict board is the
+# faster one per step (see the ArrayBoard docstring and python -m src.benchmark env)
+BOARD_BACKENDS = {
+    "dict": Board,
+    "array": ArrayBoard
+}
+# actions are 0 = pass and k = play card k-1 of the hand
+NUM_ACTIONS = 40
 
 class Game_Controller(Env):
     """A gym-like environment that simulates a card game between two players.
@@ -21,36 +34,74 @@ class Game_Controller(Env):
         action_space (gym.spaces.Discrete): The space of possible actions, represented as an integer index corresponding to a card in the player's hand.
         observation_space (gym.spaces.Box): The space of possible observations, representing the state of the game board and players' hands."""
 
-    def __init__(self, training = False):
-        """Initialize the environment with a random seed and initial state."""
+    def __init__(self, training = False, board_backend = "dict", copy_observations = True, profile = False,
+                 log_level = None, record_dir = None, dict_observations = False):
+        """Initialize the environment with a random seed and initial state.
+
+        Args:
+            training (bool, optional): If True two bots play against each other without rendering.
+            board_backend (str, optional): Key of BOARD_BACKENDS, selects the board implementation.
+            copy_observations (bool, optional): If False step and reset return a read-only view of
+            the observation buffer instead of a copy. Only use it if the caller copies the observation
+            before the next step, e.g. the workers of the SharedMemoryVecEnv.
+            profile (bool, optional): If True the phases of step and reset are timed, see enable_profiling.
+            log_level (int, optional): level of the game log (written by the pipeline of src/game_log.py).
+            Defaults to logging.WARNING (nothing is logged) in training and logging.DEBUG otherwise.
+            record_dir (str, optional): If set the games are recorded into this directory, see enable_recording.
+            dict_observations (bool, optional): If True the observations are dicts of the observation
+            ("observation") and the action mask ("action_mask", see action_masks), for policies that
+            read the mask from the observation.
+        """
+        if board_backend not in BOARD_BACKENDS:
+            raise ValueError(f"Unknown board backend {board_backend}, choose one of {list(BOARD_BACKENDS)}")
 
         super().__init__()
         self.training = training
-        self.display = CardTable()
+        self.copy_observations = copy_observations
+        self.profiler = None
+        if profile:
+            self.enable_profiling()
+        # the display is only built when something is rendered, see display
+        self._display = None
         # Define action and observation space
-        self.action_space = spaces.Discrete(40)  # Example: two possible actions - 0 or 1
-        self.observation_space = spaces.Box(low=0, high=50, shape=(465,), dtype=np.uint8)
+        self.action_space = spaces.Discrete(NUM_ACTIONS)
+        self.observation_space = spaces.Box(low=0, high=50, shape=(OBSERVATION_SIZE,), dtype=np.uint8)
+        self.dict_observations = dict_observations
+        if dict_observations:
+            self.observation_space = spaces.Dict({
+                "observation": self.observation_space,
+                "action_mask": spaces.MultiBinary(NUM_ACTIONS)
+            })
         # Initialize state
         self._state = None
         self.done = False
+        # all random decisions of the game (coin flip, decks, bots) use the generator of the env,
+        # reset(seed=...) seeds it and makes the game reproducible
         self.coin_flip = self.get_coin_flip()
         self.turn_indicator = self.coin_flip
+        # players as (top, bottom), the coin flip decides who is first in self.players
         if training:
-            self.players =  [
-                ArtificialRetardation("Trained Monkey"),
-                ArtificialRetardation("Clueless Robot")
+            self.seats =  [
+                ArtificialRetardation("Trained Monkey", self.np_random),
+                ArtificialRetardation("Clueless Robot", self.np_random)
                 ]
         else:
             self.display.start_render()
-            self.players =  [
-                ArtificialRetardation("Clueless Robot"),
+            self.seats =  [
+                ArtificialRetardation("Clueless Robot", self.np_random),
                 Human("IQ Test Subject", self.display.ask_prompt)
             ]
 
-        self.board = Board(self.players[0].name, self.players[1].name)
-
-        if not self.coin_flip:
-            self.players.reverse()
+        self.board = BOARD_BACKENDS[board_backend](self.seats[0].name, self.seats[1].name, self.np_random)
+        for player, bottom_player in zip(self.seats, (False, True)):
+            player.sit_down(self.board, bottom_player)
+        self.observation = ObservationBuffer(self.board)
+        # decks are sampled in batches, resetting only takes them out of the bank
+        self.deck_bank = DeckBank(self.np_random, deck_size=DECK_SIZE)
+        self._seat_players()
+        self.recorder = None
+        if record_dir is not None:
+            self.enable_recording(record_dir)
 
         self.rewards = {
             True : 0,
@@ -59,13 +110,47 @@ class Game_Controller(Env):
         
         self.steps=0
 
-        time_stamp = time.strftime("%d%m%Y_%H%M%S", time.localtime())
-        logging.basicConfig(level=logging.DEBUG, filename='logs/'+str(time_stamp)+'.log', filemode='w', format='%(message)s')
+        # the game log is quiet in training, the pipeline is only set up (once per process) if something is logged
+        if log_level is None:
+            log_level = logging.WARNING if training else logging.DEBUG
+        self.log_debug = log_level <= logging.DEBUG
+        if log_level < logging.WARNING:
+            setup_game_logging(level=log_level)
+
+    @property
+    def display(self):
+        """The CardTable the game is rendered on.
 
-    def setup_hand_for_new_round(self) -> None:
-        self.board.set_deck(True, Booster().open(20))
+        rich and getchlib are only imported when the display is used for the first time,
+        so headless training envs never construct the table and do not need a terminal.
+        """
+        if self._display is None:
+            from src.display import CardTable
+            self._display = CardTable()
+        return self._display
+
+    def _seat_players(self) -> None:
+        """Orders the players by the coin flip, if not coin flip the bottom player begins"""
+        self.players = list(self.seats)
+        if not self.coin_flip:
+            self.players.reverse()
+
+    def _set_rng(self, rng: np.random.Generator) -> None:
+        """Hands the generator to everything that makes random decisions"""
+        self.board.rng = rng
+        for player in self.seats:
+            player.rng = rng
+        # decks of the old generator are dropped
+        self.deck_bank.set_rng(rng)
+
+    def setup_hand_for_new_round(self, seed=None) -> None:
+        bottom_deck = self.deck_bank.next_deck()
+        top_deck = self.deck_bank.next_deck()
+        if self.recorder is not None:
+            self.recorder.start_episode(seed, self.coin_flip, top_deck, bottom_deck)
+        self.board.set_deck_ids(True, bottom_deck)
         self.board.draw_cards_to_hand(True, 10)
-        self.board.set_deck(False, Booster().open(20))
+        self.board.set_deck_ids(False, top_deck)
         self.board.draw_cards_to_hand(False, 10)
 
     def step(self, action):
@@ -77,15 +162,22 @@ class Game_Controller(Env):
         Returns:
             tuple: A tuple containing the new observation, 
             the reward obtained by the player, 
-            a boolean indicating if the episode has been truncated, 
             a boolean indicating whether the episode has ended, 
+            a boolean indicating if the episode has been truncated, 
             and a dictionary with additional information."""
+        # profiler is None unless profiling was enabled, then every phase is timed
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.step_started()
         self.steps+=1
-        logging.debug("Step: %s", self.steps)
-        logging.debug("Action: %s", action)
+        if self.log_debug:
+            logger.debug("Step: %s", self.steps)
+            logger.debug("Action: %s", action)
         info = {}
         # Note: if not coinflip, human begins
         first_player_is_bottom_player = not self.coin_flip
+        if profiler is not None:
+            profiler.lap("logging")
 
         for player, is_bottom_player in zip(self.players, [first_player_is_bottom_player, not first_player_is_bottom_player]):
             player_is_human = isinstance(player, Human)
@@ -93,31 +185,41 @@ class Game_Controller(Env):
             if self.board.has_passed(is_bottom_player):
                 continue
             
-            if action and action >= len(self.board.get_hand(is_bottom_player))+1:
+            if action and action >= self.board.get_hand_size(is_bottom_player)+1:
                 action = 0
 
             card_index = player.make_choice(self.board.get_valid_choices(is_bottom_player),
                                             action=action)
             # we are passing this turn
             if card_index == 0:
+                if profiler is not None:
+                    profiler.lap("player_choice")
                 self.board.pass_round(is_bottom_player)
+                if profiler is not None:
+                    profiler.lap("play_card")
                 if not self.training and not player_is_human:
                     self.display.write_sub_message(f"Player {self.board.get_player_name(is_bottom_player)} passed!")
                     time.sleep(1.5)
                 continue
             card_index = card_index - 1
             # otherwise play card
-            played_card = self.board.get_hand(is_bottom_player)[card_index]
+            played_card = self.board.get_hand_card(is_bottom_player, card_index)
             played_row = played_card.type
             if played_row == Row.ANY:
                 played_row = player.make_row_choice(played_card, [Row.FRONT, Row.WISE, Row.SUPPORT])
+            if profiler is not None:
+                profiler.lap("player_choice")
             self.board.play_card(is_bottom_player, card_index, played_row) # (bool, card_index -> int, row (Enum))
+            if profiler is not None:
+                profiler.lap("play_card")
             # if AR played we want to delay the move by 0.5 seconds to make it look more natural
             if not self.training and not player_is_human:
                 time.sleep(0.5)
             # render the move of player one
             if not self.training and player == self.players[0]:
                 self.render()
+            if profiler is not None:
+                profiler.lap("display")
  
 
         round_over = self.board.has_passed(True) and self.board.has_passed(False)
@@ -140,45 +242,80 @@ class Game_Controller(Env):
         truncated = self.steps == 100
 
         self.done = self.board.game_ended()
+        if self.recorder is not None and (self.done or truncated):
+            self.recorder.finish_episode(self.steps, (self.board.get_rounds_won(False), self.board.get_rounds_won(True)))
 
         # display the game winner
         if not self.training and self.done:
             winner = self.board.get_winner()
             if len(winner) == 1:
                 message = f"{winner[0]} won the game!"
-                logging.debug("%s WON", winner[0])
+                logger.debug("%s WON", winner[0])
             else:
                 message = "Draw, no one won the game"
-                logging.debug("DRAW")
+                logger.debug("DRAW")
             self.display.write_message(message)
+        if profiler is not None:
+            profiler.lap("round_end")
 
         observation = self.get_state()
+        if profiler is not None:
+            profiler.lap("get_state")
         reward = self.get_reward()
-        logging.debug("Round Number: %s",self.board.round_number)
-        if truncated:
-            logging.debug("TRUNCATED")
-        return observation, reward, truncated , self.done, info
+        if profiler is not None:
+            profiler.lap("get_reward")
+        if self.log_debug:
+            logger.debug("Round Number: %s",self.board.round_number)
+            if truncated:
+                logger.debug("TRUNCATED")
+        if profiler is not None:
+            profiler.lap("logging")
+            profiler.step_finished()
+            # the stats are handed out once per game, like the episode stats of the Monitor
+            if self.done or truncated:
+                info["profile"] = profiler.get_profile()
+        info["action_mask"] = self.action_masks()
+        return observation, reward, self.done, truncated, info
 
     def reset(self, seed=None, options=None):
         """Reset the environment to its initial state and returns the starting observation.
         
         Args:
-            seed (int, optional): Seed for randomizing the board. Defaults to None.
+            seed (int, optional): Seed for the generator of the env. The coin flip, the decks
+            and the decisions of the bots are drawn again from it. Defaults to None.
         
         Returns:
             np.array: The starting observation.
         """
         # Reset the environment to its initial state
         super().reset(seed=seed)
+        if seed is not None:
+            # the seeded generator decides everything from here on, the coin flip included
+            self._set_rng(self.np_random)
+            self.coin_flip = self.get_coin_flip()
+            self.turn_indicator = self.coin_flip
+            self._seat_players()
         info = {}
+        self.steps = 0
         self.rewards = {
             True : 0,
             False : 0
             }
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
         self.board.reset()
-        self.setup_hand_for_new_round()
+        self.setup_hand_for_new_round(seed)
+        if profiler is not None:
+            profiler.lap("reset")
         self._state = self.get_state()
-        logging.debug("NEW GAME")
+        if profiler is not None:
+            profiler.lap("reset_get_state")
+        if self.log_debug:
+            logger.debug("NEW GAME")
+        if profiler is not None:
+            profiler.lap("logging")
+        info["action_mask"] = self.action_masks()
         return self._state, info
 
     def render(self, mode='human'):
@@ -204,54 +341,38 @@ class Game_Controller(Env):
 
     def get_state(self): # AR will always be player flag False
         """Return the current state of the environment.
-    
-        Returns:
-        np.array: The current state of the environment as a vector."""
 
-        # Board 76 * 3 +
-        # Hand 38 * 3 +
-        # Graveyard 38 * 3 +
-        # turn score 6 +
-        # rounds won 2 +
-        # current round 1
-        # = 465
+        The observation is kept up to date by the ObservationBuffer while the board changes,
+        see src/observation.py for the layout.
 
-        state = np.zeros((465,), dtype=np.uint8)
-        
-        top_board_cards = list(chain(*list(self.board.get_half_board(False).values())))
-        bottom_board_cards = list(chain(*list(self.board.get_half_board(True).values())))
-
-        top_board_card_vectors = np.array([
-            card.get_card_vector() for card in top_board_cards
-        ], dtype=np.uint8).flatten()
-
-        bot_board_card_vectors = np.array([
-            card.get_card_vector() for card in bottom_board_cards
-        ], dtype=np.uint8).flatten()
-
-        hand = np.array([
-            card.get_card_vector() for card in self.board.get_hand(False)
-        ], dtype=np.uint8).flatten()
-        row_scores = np.array(
-            [score for row, score in self.board.get_row_scores(True).items()]+
-            [score for row, score in self.board.get_row_scores(False).items()]
-        ).flatten()
-        #graveyard = np.concatenate(self.board.get_graveyard(False).flatten())
-        skip = 0
-        state[skip:len(bot_board_card_vectors)] = bot_board_card_vectors
-        skip += 114 # 38 * card vector of 3
-        state[skip:skip+len(top_board_card_vectors)] = top_board_card_vectors
-        skip += 114 # 38 * card vector of 3
-        state[skip:skip+len(hand)] = hand
-        skip += 114 # 38 * card vector of 3
-        state[skip:skip+len(row_scores)] = row_scores
-        state[-3] = self.board.round_number             # 462
-        state[-2] = self.board.get_rounds_won(True)     # 463
-        state[-1] = self.board.get_rounds_won(False)    # 464
-
-        self._state = state
+        Returns:
+        np.array: The current state of the environment as a vector. A copy, unless the
+        environment was created with copy_observations=False, then it is a read-only view
+        that changes with the next step. With dict_observations a dict with the observation
+        and the action mask."""
+        self._state = self.observation.get_observation(self.copy_observations)
+        if self.dict_observations:
+            # MultiBinary observations are int8, the view shares the memory of the bool mask
+            self._state = {"observation": self._state, "action_mask": self.action_masks().view(np.int8)}
         return self._state
 
+    def action_masks(self) -> np.ndarray:
+        """Return the actions the agent (the observing player) can take, see Board.get_valid_choices.
+
+        Passing (action 0) is always possible, card k-1 can be played (action k) if it is in the
+        hand and the agent has not passed yet. Used by the maskable algorithms of sb3_contrib,
+        the mask is also in the info of step and reset.
+
+        Returns:
+        np.ndarray: bool mask of shape (NUM_ACTIONS,), True for the valid actions"""
+        bottom_player = self.observation.bottom_player
+        mask = np.zeros(NUM_ACTIONS, dtype=bool)
+        mask[0] = True
+        if not self.board.has_passed(bottom_player):
+            # the valid choices are the indices of the hand
+            mask[1:min(self.board.get_hand_size(bottom_player) + 1, NUM_ACTIONS)] = True
+        return mask
+
     def get_reward(self, player=True):
         """Calculates and returns the reward for a given player's actions.
 
@@ -287,16 +408,64 @@ class Game_Controller(Env):
                 reward -= win_reward*2
 
         self.rewards[player] += reward
-        logging.debug("Reward: %s", self.rewards[player])
+        if self.log_debug:
+            logger.debug("Reward: %s", self.rewards[player])
         return reward
 
+    def enable_profiling(self, cprofile_start: int | None = None, cprofile_steps: int = 100,
+                         cprofile_path: str = "game_controller.pstats") -> None:
+        """Starts timing the phases of step and reset, see PhaseProfiler. The stats are added
+        to the info of the last step of every game and can be fetched with get_profile().
+
+        Args:
+            cprofile_start (int, optional): step (counted from now) a cProfile capture starts with,
+            no capture if None
+            cprofile_steps (int, optional): number of steps that are captured
+            cprofile_path (str, optional): file the pstats of the capture are written to
+        """
+        self.profiler = PhaseProfiler(cprofile_start, cprofile_steps, cprofile_path)
+
+    def disable_profiling(self) -> None:
+        """Stops timing the phases, the accumulated stats are dropped"""
+        self.profiler = None
+
+    def get_profile(self) -> dict[str, dict[str, float]]:
+        """
+        Returns the accumulated stats per phase (calls, total_ms, mean_us), empty if profiling is disabled.
+        """
+        if self.profiler is None:
+            return {}
+        return self.profiler.get_profile()
+
+    def enable_recording(self, record_dir: str, **recorder_kwargs) -> None:
+        """Starts recording the games into chunk files, see EpisodeRecorder. The recording
+        starts with the next reset, the games can be replayed with the EpisodeReplayer.
+
+        Args:
+            record_dir (str): directory of the chunk files
+            recorder_kwargs: arguments of the EpisodeRecorder (episodes_per_chunk, buffer_size)
+        """
+        self.disable_recording()
+        self.recorder = EpisodeRecorder(record_dir, **recorder_kwargs)
+        self.board.add_observer(self.recorder)
+
+    def disable_recording(self) -> None:
+        """Stops recording, the finished games are written"""
+        if self.recorder is None:
+            return
+        self.board.remove_observer(self.recorder)
+        self.recorder.close()
+        self.recorder = None
+
     def get_coin_flip(self):
         """Determine whether the first player starts by coin flip (True) or fixed order (False).
     
         Returns:
         bool: True if the coin flip determines the starting player, False otherwise."""
-        return bool(random.getrandbits(1))
+        return bool(self.np_random.integers(2))
 
     def close(self):
-        self.display.stop_render()
+        self.disable_recording()
+        if self._display is not None:
+            self._display.stop_render()
     
@@ -0,0 +1,157 @@
+"""Module that provides the background logging pipeline of the game
+
+Records of the "src" loggers are put into a queue and written by a listener thread, in
+batches, into a size rotated log file. Rotated files are compressed with gzip.
+The pipeline is set up once per process, building more envs does not change it.
+"""
+import os
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import logging.handlers
+
+# parent of all loggers of the game (src.game_controller, ...)
+GAME_LOGGER = "src"
+LOG_DIR = "logs"
+MAX_BYTES = 50 * 1024 * 1024
+BACKUP_COUNT = 5
+BATCH_SIZE = 512
+# seconds after which a batch is written, even if it is not full
+FLUSH_INTERVAL = 2.0
+
+# listener of the running pipeline, None if it is not set up
+_listener = None
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """Compresses the rotated log file"""
+    with open(source, "rb") as source_file, gzip.open(dest, "wb") as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that collects the formatted records and writes them in batches.
+
+    Rotation is checked when a batch is written, rotated files are compressed if compress is set.
+    """
+    def __init__(self, filename: str, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL, compress: bool = True):
+        """
+        Args:
+            filename (str): path of the log file
+            max_bytes (int, optional): size at which the file is rotated
+            backup_count (int, optional): number of rotated files that are kept
+            batch_size (int, optional): records that are collected before they are written
+            flush_interval (float, optional): seconds after which a batch is written, even if it is not full
+            compress (bool, optional): If True rotated files are compressed with gzip
+        """
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.batch = []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        if compress:
+            self.namer = _gzip_namer
+            self.rotator = _gzip_rotator
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.batch.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+        if len(self.batch) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the collected records, the file is rotated first if the batch does not fit anymore"""
+        self.acquire()
+        try:
+            self.last_flush = time.monotonic()
+            if not self.batch:
+                return
+            text = "".join(self.batch)
+            self.batch.clear()
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self.stream.tell() > 0 and self.stream.tell() + len(text) >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(text)
+            self.stream.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+def setup_game_logging(log_dir: str = LOG_DIR, level: int = logging.DEBUG, **handler_kwargs) -> None:
+    """
+    Sets up the pipeline for the "src" loggers, if it is not running yet. The root logger is not changed.
+    Every process writes its own file <log_dir>/<timestamp>_<pid>.log.
+
+    Args:
+        log_dir (str, optional): directory of the log files, it is created if needed
+        level (int, optional): minimum level of the written records
+        handler_kwargs: arguments of the BatchedRotatingFileHandler (max_bytes, backup_count, ...)
+    """
+    global _listener
+    if _listener is not None:
+        return
+    os.makedirs(log_dir, exist_ok=True)
+    time_stamp = time.strftime("%d%m%Y_%H%M%S", time.localtime())
+    handler = BatchedRotatingFileHandler(os.path.join(log_dir, f"{time_stamp}_{os.getpid()}.log"), **handler_kwargs)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(GAME_LOGGER)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    # the records are only written by the pipeline
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(stop_game_logging)
+
+
+def stop_game_logging() -> None:
+    """Writes the queued records and stops the pipeline"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logger = logging.getLogger(GAME_LOGGER)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    _listener = None
+
+
+# Example usage
+if __name__ == '__main__':
+    import tempfile
+    with tempfile.TemporaryDirectory() as temp_dir:
+        setup_game_logging(temp_dir, max_bytes=2000, backup_count=2, batch_size=10)
+        # a second setup does not add another handler
+        setup_game_logging(temp_dir)
+        assert len(logging.getLogger(GAME_LOGGER).handlers) == 1
+        game_logger = logging.getLogger("src.game_controller")
+        for number in range(1000):
+            game_logger.debug("Step: %s", number)
+        stop_game_logging()
+        files = sorted(os.listdir(temp_dir))
+        # the current file and two compressed backups
+        assert len(files) == 3 and sum(name.endswith(".gz") for name in files) == 2, files
+        with open(os.path.join(temp_dir, [name for name in files if name.endswith(".log")][0]), encoding="utf-8") as log:
+            assert log.read().rstrip().endswith("Step: 999")
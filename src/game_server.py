@@ -0,0 +1,544 @@
+"""Module that provides the GameServer, an asyncio server that hosts many tables of the card game at once
+
+Clients connect over TCP or a Unix socket and talk newline delimited JSON:
+
+    client -> server
+        {"type": "join", "name": "Hugo"}            sit down at the next free seat
+        {"type": "move", "action": 3, "row": 2}     0 passes, k plays card k-1 of the hand,
+                                                    row (value of Row) is only read for heroes
+    server -> client
+        {"type": "seated", "table": 7, "bottom_player": true, "opponent": "..."}
+        {"type": "turn", "hand": [...], ...}        the client has to move, see get_view
+        {"type": "game_over", "winner": [...], "rounds_won": [own, opponent]}
+        {"type": "error", "message": "..."}         e.g. a move without an integer action, the
+                                                    table keeps waiting for a valid one
+
+After a game the client can join again. Seats that are still empty fill_delay seconds after
+the first player sat down get a bot, a client that disconnects is replaced by a bot.
+The bundled client simulator (load_test) plays many random clients against a server.
+"""
+import json
+import time
+import logging
+import asyncio
+import argparse
+from collections import deque
+import numpy as np
+
+# local imports
+from src.row import Row
+from src.player import ArtificialRetardation
+from src.deck_sampler import sample_decks
+from src.tournament import Match
+
+logger = logging.getLogger(__name__)
+
+# seconds until the empty seats of a table get a bot
+FILL_DELAY = 1.0
+# number of move latencies the statistics are computed from
+LATENCY_WINDOW = 100000
+# connections that may wait to be accepted, a load test connects hundreds of clients at once
+BACKLOG = 1024
+
+
+def get_view(board, bottom_player: bool) -> dict:
+    """
+    Returns what a player sees of the board, the first entry of every pair is its own.
+
+    Args:
+        board (Board): board of the table
+        bottom_player (bool): player that looks at the board
+
+    Returns:
+        dict: turn message with the card ids of the hand and the rows (in Row order), the row
+        scores, the round number, rounds won, the passed flags and the hand size of the opponent
+    """
+    players = (bottom_player, not bottom_player)
+    return {
+        "type": "turn",
+        "hand": [card.card_id for card in board.get_hand(bottom_player)],
+        "rows": [[[card.card_id for card in cards] for cards in board.get_half_board(player).values()]
+                 for player in players],
+        "row_scores": [list(board.get_row_scores(player).values()) for player in players],
+        "round": board.round_number,
+        "rounds_won": [board.get_rounds_won(player) for player in players],
+        "passed": [board.has_passed(player) for player in players],
+        "opponent_hand_size": len(board.get_hand(not bottom_player)),
+    }
+
+
+class RemoteSeat:
+    """Seat of a client, the connection handler puts its moves into the queue"""
+    def __init__(self, name: str, writer: asyncio.StreamWriter):
+        self.name = name
+        self.writer = writer
+        # move messages of the client (with an integer action), None if it disconnected
+        self.moves = asyncio.Queue()
+        self.row = None
+        self.connected = True
+        self.playing = False
+
+    async def send(self, message: dict) -> None:
+        if not self.connected:
+            return
+        try:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            await self.writer.drain()
+        except ConnectionError:
+            # the connection handler puts None into the moves, the table replaces the seat
+            self.connected = False
+
+    async def choose(self, match: Match) -> int | None:
+        """Returns the action of the client, None if it disconnected"""
+        await self.send(get_view(match.board, match.seat))
+        move = await self.moves.get()
+        if move is None:
+            return None
+        self.row = move.get("row")
+        return move["action"]
+
+    def make_row_choice(self, card, row_choices: list[Row]) -> Row:
+        # the row is sent with the move, an invalid row is replaced by the first one
+        return Row(self.row) if self.row in [row.value for row in row_choices] else row_choices[0]
+
+
+class BotSeat:
+    """Seat of a Player of the game (e.g. ArtificialRetardation), it chooses right away"""
+    def __init__(self, player):
+        self.player = player
+        self.name = player.name
+
+    async def send(self, message: dict) -> None:
+        pass
+
+    async def choose(self, match: Match) -> int:
+        return self.player.make_choice(match.board.get_valid_choices(match.seat))
+
+    def make_row_choice(self, card, row_choices: list[Row]) -> Row:
+        return self.player.make_row_choice(card, row_choices)
+
+
+class PolicySeat:
+    """Seat of a trained model, the actions of all tables are batched by an InferenceServer"""
+    def __init__(self, name: str, inference, rng: np.random.Generator):
+        self.name = name
+        self.inference = inference
+        self.rng = rng
+
+    async def send(self, message: dict) -> None:
+        pass
+
+    async def choose(self, match: Match) -> int:
+        # the board does not change while the table waits, the view of the observation is enough
+        return await self.inference.predict_async(match.get_observation(), match.get_action_mask())
+
+    def make_row_choice(self, card, row_choices: list[Row]) -> Row:
+        return row_choices[self.rng.integers(len(row_choices))]
+
+
+class Table:
+    """One game of the server, it starts when both seats are taken"""
+    def __init__(self, table_id: int, server: "GameServer"):
+        self.table_id = table_id
+        self.server = server
+        # (top, bottom) seats, None while empty
+        self.seats = [None, None]
+        self.full = asyncio.Event()
+
+    def get_free_seat(self) -> int | None:
+        """Returns the index of an empty seat (1 = bottom player), None if the table is full"""
+        for index in (1, 0):
+            if self.seats[index] is None:
+                return index
+        return None
+
+    def sit_down(self, seat) -> bool:
+        """Seats a player, returns True if it is the bottom player"""
+        index = self.get_free_seat()
+        self.seats[index] = seat
+        if self.get_free_seat() is None:
+            # new players go to the next table
+            self.server.close_table(self)
+            self.full.set()
+        return bool(index)
+
+    async def run(self) -> None:
+        """Plays the game of the table, the clients are released even if it fails"""
+        try:
+            await self._play()
+        except Exception:
+            # the clients would wait for a game_over that never comes
+            for seat in self.seats:
+                if seat is not None:
+                    await seat.send({"type": "error", "message": "the table failed, join again"})
+            raise
+        finally:
+            for seat in self.seats:
+                if isinstance(seat, RemoteSeat):
+                    seat.playing = False
+
+    async def _play(self) -> None:
+        """Waits for the players (or fills the seats with bots), plays the game and reports the result"""
+        if self.server.fill_delay is None:
+            await self.full.wait()
+        else:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.server.fill_delay)
+            except asyncio.TimeoutError:
+                while self.get_free_seat() is not None:
+                    self.sit_down(self.server.make_bot())
+        rng = self.server.rng
+        top_deck, bottom_deck = sample_decks(rng, 2)
+        match = Match(0, 1, top_deck, bottom_deck, bool(rng.integers(2)), rng)
+        # the seats choose the rows of their heroes
+        match.players = self.seats
+        for index, seat in enumerate(self.seats):
+            await seat.send({"type": "seated", "table": self.table_id, "bottom_player": bool(index),
+                             "opponent": self.seats[1 - index].name})
+        match.start()
+        while not match.over:
+            index = int(match.seat)
+            seat = self.seats[index]
+            start = time.perf_counter()
+            action = await seat.choose(match)
+            if action is None:
+                # the client is gone, a bot plays on
+                self.seats[index] = self.server.make_bot()
+                continue
+            # the moves of the random bots take no time, only clients and models are measured
+            if not isinstance(seat, BotSeat):
+                self.server.record_move(time.perf_counter() - start)
+            match.play(int(action))
+        for index, seat in enumerate(self.seats):
+            players = (bool(index), not index)
+            if isinstance(seat, RemoteSeat):
+                # released before the message, the client may join again as soon as it reads it
+                seat.playing = False
+            await seat.send({"type": "game_over", "winner": match.board.get_winner(),
+                             "rounds_won": [match.board.get_rounds_won(player) for player in players]})
+
+
+class GameServer:
+    """Hosts tables for the clients that connect to it, every table is an asyncio task"""
+    def __init__(self, bot: str = "random", fill_delay: float | None = FILL_DELAY, seed: int | None = None,
+                 max_batch_size: int = 64, max_wait: float = 0.002):
+        """
+        Args:
+            bot (str, optional): "random" for an ArtificialRetardation or the path of a saved model
+            or policy, its moves are batched over all tables by an InferenceServer
+            fill_delay (float, optional): seconds until empty seats get a bot, None never fills them
+            seed (int, optional): seed for the decks, coin flips and bots
+            max_batch_size (int, optional): maximum batch of the InferenceServer of a model bot
+            max_wait (float, optional): maximum wait of the InferenceServer of a model bot
+        """
+        self.rng = np.random.default_rng(seed)
+        self.fill_delay = fill_delay
+        self.inference = None
+        if bot != "random":
+            from src.inference import InferenceServer
+            self.inference = InferenceServer(bot, max_batch_size=max_batch_size, max_wait=max_wait)
+        self.open_table = None
+        self.tables = set()
+        self.num_tables = 0
+        self.num_bots = 0
+        self.finished_tables = 0
+        self.num_moves = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.start_time = time.perf_counter()
+        self.server = None
+
+    def make_bot(self):
+        """Creates the seat of a bot for an empty seat"""
+        self.num_bots += 1
+        name = f"Bot {self.num_bots}"
+        if self.inference is not None:
+            return PolicySeat(name, self.inference, self.rng)
+        return BotSeat(ArtificialRetardation(name, self.rng))
+
+    def _get_table(self) -> Table:
+        """Returns the table that waits for players, a new one if none waits"""
+        if self.open_table is None:
+            self.open_table = Table(self.num_tables, self)
+            self.num_tables += 1
+            task = asyncio.create_task(self.open_table.run())
+            self.tables.add(task)
+            task.add_done_callback(self._table_finished)
+        return self.open_table
+
+    def close_table(self, table: Table) -> None:
+        """Called by a table when its seats are taken, new players go to the next table"""
+        if self.open_table is table:
+            self.open_table = None
+
+    def _table_finished(self, task: asyncio.Task) -> None:
+        self.tables.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error("A table failed", exc_info=task.exception())
+        else:
+            self.finished_tables += 1
+
+    def record_move(self, latency: float) -> None:
+        """Records the time a seat needed for a move"""
+        self.num_moves += 1
+        self.latencies.append(latency)
+
+    def get_stats(self) -> dict[str, float]:
+        """
+        Returns the statistics of the server since it was started.
+
+        Returns:
+            dict[str, float]: running and finished tables, tables/s, moves and the mean, median
+            and 99th percentile of the move latency in milliseconds (of the last LATENCY_WINDOW moves)
+        """
+        elapsed = time.perf_counter() - self.start_time
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            "running_tables": len(self.tables),
+            "finished_tables": self.finished_tables,
+            "tables_per_s": self.finished_tables / elapsed,
+            "moves": self.num_moves,
+            "latency_mean_ms": float(latencies.mean()),
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+        }
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Reads the messages of one client until it disconnects"""
+        seat = None
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                    kind = message["type"]
+                except (ValueError, KeyError, TypeError):
+                    await self._send_error(writer, "messages are JSON objects with a type")
+                    continue
+                if kind == "join":
+                    if seat is not None and seat.playing:
+                        await self._send_error(writer, "already seated")
+                        continue
+                    seat = RemoteSeat(str(message.get("name", "Client")), writer)
+                    seat.playing = True
+                    self._get_table().sit_down(seat)
+                elif kind == "move" and seat is not None and seat.playing:
+                    action = message.get("action")
+                    # None in the moves means the client is gone, bad moves are answered and the table keeps waiting
+                    if not isinstance(action, int) or isinstance(action, bool):
+                        await self._send_error(writer, "a move needs an integer action")
+                        continue
+                    seat.moves.put_nowait(message)
+                else:
+                    await self._send_error(writer, f"unexpected message {kind}")
+        except ConnectionError:
+            pass
+        finally:
+            if seat is not None:
+                seat.connected = False
+                seat.moves.put_nowait(None)
+            writer.close()
+
+    @staticmethod
+    async def _send_error(writer: asyncio.StreamWriter, message: str) -> None:
+        writer.write(json.dumps({"type": "error", "message": message}).encode() + b"\n")
+        await writer.drain()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, unix_path: str | None = None):
+        """
+        Starts listening, on a Unix socket if unix_path is given and on TCP otherwise.
+
+        Args:
+            host (str, optional): TCP host
+            port (int, optional): TCP port, 0 picks a free one (see address)
+            unix_path (str, optional): path of the Unix socket
+        """
+        if unix_path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, unix_path, backlog=BACKLOG)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, host, port, backlog=BACKLOG)
+        self.start_time = time.perf_counter()
+        return self.server
+
+    @property
+    def address(self):
+        """Address the server listens on, (host, port) or the path of the Unix socket"""
+        return self.server.sockets[0].getsockname()
+
+    async def close(self) -> None:
+        """Stops listening and cancels the running tables"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in list(self.tables):
+            task.cancel()
+        await asyncio.gather(*self.tables, return_exceptions=True)
+        if self.inference is not None:
+            self.inference.close()
+
+
+async def open_connection(address) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Connects to a server, address is (host, port) or the path of a Unix socket"""
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def run_client(address, name: str, num_games: int, rng: np.random.Generator, think_time: float = 0.0) -> int:
+    """
+    Simulated client: plays num_games games with random moves (like ArtificialRetardation,
+    passing sometimes) and joins the next table after every game.
+
+    Args:
+        address: (host, port) or path of the Unix socket
+        name (str): name of the client
+        num_games (int): number of games
+        rng (np.random.Generator): generator of the moves
+        think_time (float, optional): seconds the client waits before every move
+
+    Returns:
+        int: number of moves the client made
+    """
+    reader, writer = await open_connection(address)
+    num_moves = 0
+    try:
+        for _ in range(num_games):
+            writer.write(json.dumps({"type": "join", "name": name}).encode() + b"\n")
+            await writer.drain()
+            while True:
+                message = json.loads(await reader.readline())
+                if message["type"] == "game_over":
+                    break
+                if message["type"] == "error":
+                    raise RuntimeError(message["message"])
+                if message["type"] != "turn":
+                    continue
+                if think_time:
+                    await asyncio.sleep(think_time)
+                hand_size = len(message["hand"])
+                action = int(rng.integers(1, hand_size + 1)) if hand_size and rng.random() > 0.1 else 0
+                move = {"type": "move", "action": action, "row": int(rng.integers(1, 4))}
+                writer.write(json.dumps(move).encode() + b"\n")
+                await writer.drain()
+                num_moves += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return num_moves
+
+
+async def load_test(address, num_clients: int, games_per_client: int, seed: int | None = None,
+                    think_time: float = 0.0) -> dict[str, float]:
+    """
+    Runs num_clients simulated clients against a server at the same time.
+
+    Returns:
+        dict[str, float]: clients, games (per client), moves, seconds and moves/s of the clients
+    """
+    rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(num_clients)]
+    start = time.perf_counter()
+    moves = await asyncio.gather(*(
+        run_client(address, f"Client {index}", games_per_client, rng, think_time) for index, rng in enumerate(rngs)
+    ))
+    elapsed = time.perf_counter() - start
+    return {"clients": num_clients, "games": games_per_client, "moves": sum(moves), "seconds": elapsed,
+            "moves_per_s": sum(moves) / elapsed}
+
+
+async def play_human(address, name: str) -> None:
+    """Plays games on a server in the terminal"""
+    reader, writer = await open_connection(address)
+    writer.write(json.dumps({"type": "join", "name": name}).encode() + b"\n")
+    await writer.drain()
+    while line := await reader.readline():
+        message = json.loads(line)
+        if message["type"] == "seated":
+            print(f"Table {message['table']}, you play against {message['opponent']}")
+        elif message["type"] == "turn":
+            from src.cards import get_card
+            print(f"Round {message['round']}, rounds won {message['rounds_won']}, "
+                  f"row scores {message['row_scores'][0]} vs {message['row_scores'][1]}")
+            print("Hand: " + ", ".join(f"{index + 1}: {get_card(card_id).name}"
+                                       for index, card_id in enumerate(message["hand"])))
+            text = await asyncio.to_thread(input, "Card to play (0 passes), optionally followed by the row 1-3: ")
+            numbers = [int(part) for part in text.split() if part.isdigit()] or [0]
+            move = {"type": "move", "action": numbers[0], "row": numbers[1] if len(numbers) > 1 else 1}
+            writer.write(json.dumps(move).encode() + b"\n")
+            await writer.drain()
+        elif message["type"] == "game_over":
+            print(f"Game over, winner: {' and '.join(message['winner'])}, rounds won {message['rounds_won']}")
+            break
+        elif message["type"] == "error":
+            print(message["message"])
+    writer.close()
+
+
+def print_stats(stats: dict[str, float]) -> None:
+    print(f"{stats['running_tables']} tables running, {stats['finished_tables']} finished "
+          f"({stats['tables_per_s']:.1f} tables/s), {stats['moves']} moves, latency "
+          f"mean {stats['latency_mean_ms']:.2f} ms, p50 {stats['latency_p50_ms']:.2f} ms, "
+          f"p99 {stats['latency_p99_ms']:.2f} ms")
+
+
+async def serve(args) -> None:
+    """Runs a server until it is interrupted, the statistics are printed every report_interval seconds"""
+    server = GameServer(args.bot, args.fill_delay, args.seed)
+    await server.start(args.host, args.port, args.unix)
+    print(f"Serving on {server.address}")
+    try:
+        while True:
+            await asyncio.sleep(args.report_interval)
+            print_stats(server.get_stats())
+    finally:
+        await server.close()
+
+
+async def bench(args) -> None:
+    """Runs a server and the client simulator in this process and prints the statistics of both"""
+    server = GameServer(args.bot, args.fill_delay, args.seed)
+    await server.start(args.host, 0, args.unix)
+    try:
+        result = await load_test(server.address, args.clients, args.games, args.seed, args.think_time)
+    finally:
+        stats = server.get_stats()
+        await server.close()
+    print(f"{result['clients']} clients played {result['games']} games each, "
+          f"{result['moves']} moves in {result['seconds']:.1f} s ({result['moves_per_s']:.0f} moves/s)")
+    print_stats(stats)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hosts many tables of the card game, see src/game_server.py")
+    parser.add_argument("command", choices=["serve", "loadtest", "bench", "play"],
+                        help="serve: run a server, loadtest: run simulated clients against a server, "
+                             "bench: both in this process, play: play on a server in the terminal")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="path of a Unix socket, used instead of TCP")
+    parser.add_argument("--bot", default="random", help="bot for empty seats: random or a saved model or policy")
+    parser.add_argument("--fill-delay", type=float, default=FILL_DELAY)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--games", type=int, default=5, help="games per simulated client")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds a simulated client waits per move")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--name", default="Human")
+    args = parser.parse_args()
+    address = args.unix if args.unix is not None else (args.host, args.port)
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(args))
+        elif args.command == "loadtest":
+            result = asyncio.run(load_test(address, args.clients, args.games, args.seed, args.think_time))
+            print(f"{result['moves']} moves in {result['seconds']:.1f} s ({result['moves_per_s']:.0f} moves/s)")
+        elif args.command == "bench":
+            asyncio.run(bench(args))
+        else:
+            asyncio.run(play_human(address, args.name))
+    except KeyboardInterrupt:
+        pass
+
+
+# Example usage
+if __name__ == '__main__':
+    main()
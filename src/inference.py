@@ -0,0 +1,361 @@
+"""Module that provides the InferenceServer, it answers the policy calls of many concurrent games with batched forward passes
+
+Every game (a thread, an asyncio task or a worker process) hands in its observation and waits
+for the action. The server collects the waiting observations and runs them through the policy
+at once: a batch is started as soon as max_batch_size observations are waiting or max_wait
+seconds after its first observation arrived, so no game waits longer than max_wait plus the
+forward pass of the batch before.
+"""
+import time
+import queue
+import asyncio
+import zipfile
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+import numpy as np
+
+# local imports
+from src.row import Row
+from src.player import Player
+from src.observation import ObservationBuffer
+from src.game_controller import NUM_ACTIONS
+
+MAX_BATCH_SIZE = 64
+# seconds the first observation of a batch waits for more
+MAX_WAIT = 0.002
+
+
+def load_policy(path: str) -> tuple:
+    """
+    Loads the policy of a saved model or a saved policy on the cpu.
+
+    Args:
+        path (str): saved model (model.save) or policy (policy.save)
+
+    Returns:
+        tuple: the policy and True if it is maskable (it takes the valid actions)
+    """
+    # model.save() writes a zip archive with a data entry, policy.save() a torch file
+    if zipfile.is_zipfile(path) and "data" in zipfile.ZipFile(path).namelist():
+        from sb3_contrib import MaskablePPO
+        from src.algorithms import load_model
+        model = load_model(path, device="cpu")
+        return model.policy, isinstance(model, MaskablePPO)
+    from sb3_contrib.common.maskable.policies import MaskableActorCriticPolicy
+    from src.algorithms import load_saved_policy
+    policy = load_saved_policy(path, device="cpu")
+    return policy, isinstance(policy, MaskableActorCriticPolicy)
+
+
+def get_action_mask(hand_size: int) -> np.ndarray:
+    """Returns the valid actions of a player that has not passed, see Game_Controller.action_masks"""
+    mask = np.zeros(NUM_ACTIONS, dtype=bool)
+    mask[:hand_size + 1] = True
+    return mask
+
+
+class InferenceServer:
+    """Runs a policy in a thread of its own and answers the requests of many games in batches.
+
+    Threads call predict, asyncio tasks await predict_async, worker processes get a client
+    from connect. The server is shut down by close(), it can also be used as context manager.
+    """
+    def __init__(self, policy, max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT,
+                 masked: bool | None = None):
+        """Starts the thread of the server.
+
+        Args:
+            policy: policy of stable-baselines3 or path of a saved model or policy, see load_policy
+            max_batch_size (int, optional): maximum number of observations per forward pass
+            max_wait (float, optional): seconds a batch waits for more observations after the first one
+            masked (bool, optional): If True the action masks are passed to the policy. Defaults
+            to True for maskable policies that are loaded from a path.
+        """
+        if isinstance(policy, str):
+            policy, maskable = load_policy(policy)
+            masked = maskable if masked is None else masked
+        self.policy = policy
+        self.policy.set_training_mode(False)
+        self.masked = bool(masked)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        # (observation, action mask, future) of the waiting games, None shuts the server down
+        self.requests = queue.SimpleQueue()
+        self.num_batches = 0
+        self.num_requests = 0
+        # queues of the worker processes, created by the first call of connect
+        self._context = None
+        self._process_requests = None
+        self._responses = []
+        self._bridge = None
+        self._thread = threading.Thread(target=self._serve, name="InferenceServer", daemon=True)
+        self._thread.start()
+
+    def submit(self, observation: np.ndarray, action_mask: np.ndarray | None = None) -> Future:
+        """
+        Hands in an observation, the future gets the action when its batch is done.
+
+        Args:
+            observation (np.ndarray): observation of the game, it must not change until the action is there
+            action_mask (np.ndarray, optional): valid actions, only used by masked policies
+
+        Returns:
+            Future: future of the action (int)
+        """
+        future = Future()
+        self.requests.put((observation, action_mask, future))
+        return future
+
+    def predict(self, observation: np.ndarray, action_mask: np.ndarray | None = None) -> int:
+        """Returns the action for an observation, blocks until its batch is done"""
+        return self.submit(observation, action_mask).result()
+
+    async def predict_async(self, observation: np.ndarray, action_mask: np.ndarray | None = None) -> int:
+        """Returns the action for an observation, the event loop keeps running until its batch is done"""
+        return await asyncio.wrap_future(self.submit(observation, action_mask))
+
+    def connect(self) -> "InferenceClient":
+        """
+        Creates a client for a worker process. The client holds multiprocessing queues, so it
+        has to be handed to the process when it is started (as argument of the process or of
+        the initializer of a pool, created with the spawn context).
+
+        Returns:
+            InferenceClient: client with the same predict as the server
+        """
+        if self._process_requests is None:
+            self._context = mp.get_context("spawn")
+            self._process_requests = self._context.Queue()
+            self._bridge = threading.Thread(target=self._forward_process_requests, name="InferenceBridge",
+                                            daemon=True)
+            self._bridge.start()
+        responses = self._context.Queue()
+        self._responses.append(responses)
+        return InferenceClient(len(self._responses) - 1, self._process_requests, responses)
+
+    def _forward_process_requests(self) -> None:
+        """Hands the requests of the worker processes to the server and sends the actions back"""
+        while True:
+            request = self._process_requests.get()
+            if request is None:
+                return
+            client_id, observation, action_mask = request
+            responses = self._responses[client_id]
+            self.submit(observation, action_mask).add_done_callback(
+                lambda future, responses=responses: responses.put(future.exception() or future.result())
+            )
+
+    def _serve(self) -> None:
+        """Main loop of the server thread, collects the batches and answers them"""
+        running = True
+        while running:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    # answer the waiting games first
+                    running = False
+                    break
+                batch.append(request)
+            self._answer(batch)
+
+    def _answer(self, batch: list[tuple]) -> None:
+        """Runs one forward pass for the batch and sets the actions of the futures"""
+        try:
+            observations = np.stack([observation for observation, _, _ in batch])
+            if self.masked:
+                action_masks = np.stack([
+                    action_mask if action_mask is not None else np.ones(NUM_ACTIONS, dtype=bool)
+                    for _, action_mask, _ in batch
+                ])
+                actions, _ = self.policy.predict(observations, deterministic=True, action_masks=action_masks)
+            else:
+                actions, _ = self.policy.predict(observations, deterministic=True)
+        except Exception as error:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        self.num_batches += 1
+        self.num_requests += len(batch)
+        for (_, _, future), action in zip(batch, actions.tolist()):
+            future.set_result(action)
+
+    def get_stats(self) -> dict[str, float]:
+        """Returns the number of batches and requests and the mean batch size"""
+        return {
+            "batches": self.num_batches,
+            "requests": self.num_requests,
+            "mean_batch_size": self.num_requests / max(self.num_batches, 1),
+        }
+
+    def close(self) -> None:
+        """Answers the waiting games and stops the server"""
+        if self._process_requests is not None:
+            self._process_requests.put(None)
+            self._bridge.join()
+        self.requests.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class InferenceClient:
+    """Connection of a worker process to an InferenceServer, see InferenceServer.connect.
+
+    A client waits for one action at a time, every game that runs concurrently needs its own.
+    """
+    def __init__(self, client_id: int, requests, responses):
+        self.client_id = client_id
+        self.requests = requests
+        self.responses = responses
+
+    def predict(self, observation: np.ndarray, action_mask: np.ndarray | None = None) -> int:
+        """Returns the action for an observation, blocks until its batch is done"""
+        self.requests.put((self.client_id, observation, action_mask))
+        action = self.responses.get()
+        if isinstance(action, Exception):
+            raise action
+        return action
+
+
+class PolicyPlayer(Player):
+    """Player that chooses its cards with a policy served by an InferenceServer (or a client of it)"""
+    def __init__(self, name, rng: np.random.Generator | None = None, server=None):
+        """
+        Args:
+            name (str): name of the player
+            rng (np.random.Generator, optional): generator for the row choices of heroes
+            server (InferenceServer | InferenceClient): server that predicts the actions
+        """
+        super().__init__(name, rng)
+        self.server = server
+        self.observation = None
+
+    def sit_down(self, board, bottom_player: bool) -> None:
+        super().sit_down(board, bottom_player)
+        # the player observes the board from its own seat, like the agent does
+        if self.observation is not None:
+            self.observation.board.remove_observer(self.observation)
+        self.observation = ObservationBuffer(board, bottom_player)
+
+    def make_choice(self, valid_choices, action=None) -> int:
+        # the board does not change while the player waits for the action, the view is enough
+        return self.server.predict(self.observation.get_observation(copy=False), get_action_mask(len(valid_choices)))
+
+    def make_row_choice(self, card, row_choices: list[Row]) -> Row:
+        row_choices = list(row_choices)
+        return row_choices[self.rng.integers(len(row_choices))]
+
+
+def _play_in_process(client: InferenceClient, seed: int, num_games: int) -> None:
+    """Plays games of a PolicyPlayer against a random player in a worker process"""
+    _play_games(client, seed, num_games)
+
+
+def _play_games(server, seed: int, num_games: int) -> list[int]:
+    """
+    Plays games of a PolicyPlayer (top) against a random player (bottom).
+
+    Returns:
+        list[int]: actions of the PolicyPlayer
+    """
+    from src.board import Board
+    from src.player import ArtificialRetardation
+    from src.deck_sampler import sample_decks
+    rng = np.random.default_rng(seed)
+    players = (PolicyPlayer("Policy", rng, server), ArtificialRetardation("Random", rng))
+    actions = []
+    for _ in range(num_games):
+        board = Board(players[0].name, players[1].name, rng)
+        board.reset()
+        for player, bottom_player, deck in zip(players, (False, True), sample_decks(rng, 2)):
+            player.sit_down(board, bottom_player)
+            board.set_deck_ids(bottom_player, deck)
+            board.draw_cards_to_hand(bottom_player, 10)
+        bottom_player = bool(rng.integers(2))
+        while not board.game_ended():
+            if not board.has_passed(bottom_player):
+                player = players[int(bottom_player)]
+                choice = player.make_choice(board.get_valid_choices(bottom_player))
+                if not bottom_player:
+                    actions.append(choice)
+                hand = board.get_hand(bottom_player)
+                if choice < 1 or choice > len(hand):
+                    board.pass_round(bottom_player)
+                else:
+                    card = hand[choice - 1]
+                    row = card.type
+                    if row == Row.ANY:
+                        row = player.make_row_choice(card, [Row.FRONT, Row.WISE, Row.SUPPORT])
+                    board.play_card(bottom_player, choice - 1, row)
+            if board.has_passed(True) and board.has_passed(False):
+                board.end_round()
+                board.draw_cards_to_hand(True)
+                board.draw_cards_to_hand(False)
+            bottom_player = not bottom_player
+    return actions
+
+
+# Example usage
+if __name__ == '__main__':
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    if len(sys.argv) > 1:
+        policy, masked = load_policy(sys.argv[1])
+    else:
+        # an untrained network is enough to compare the batched with the single calls
+        import os
+        import tempfile
+        from src.game_controller import Game_Controller
+        from src.train_model import create_model
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "QRDQN_Agent.zip")
+            create_model("QRDQN", Game_Controller(True), 0.005, device="cpu").save(path)
+            policy, masked = load_policy(path)
+
+    class DirectServer:
+        """Calls the policy for every observation on its own"""
+        def predict(self, observation, action_mask=None):
+            if masked:
+                return int(policy.predict(observation[None], deterministic=True, action_masks=action_mask[None])[0][0])
+            return int(policy.predict(observation[None], deterministic=True)[0][0])
+
+    num_games, num_threads = 20, 16
+    start = time.perf_counter()
+    expected = [_play_games(DirectServer(), seed, num_games) for seed in range(num_threads)]
+    direct_time = time.perf_counter() - start
+    with InferenceServer(policy, masked=masked) as server:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(num_threads) as executor:
+            batched = list(executor.map(_play_games, [server] * num_threads, range(num_threads), [num_games] * num_threads))
+        batched_time = time.perf_counter() - start
+        # the batched actions are the ones of the single calls, every game sees the same random choices
+        assert batched == expected
+        stats = server.get_stats()
+        print(f"{stats['requests']} requests, direct {stats['requests'] / direct_time:.0f}/s, "
+              f"batched {stats['requests'] / batched_time:.0f}/s, mean batch size {stats['mean_batch_size']:.1f}")
+
+        # asyncio tasks and worker processes are served by the same server
+        async def play_async() -> list[int]:
+            observations = np.zeros((8, policy.observation_space.shape[0]), dtype=np.uint8)
+            return await asyncio.gather(*(server.predict_async(observation) for observation in observations))
+        assert len(asyncio.run(play_async())) == 8
+        context = mp.get_context("spawn")
+        processes = [context.Process(target=_play_in_process, args=(server.connect(), seed, 2)) for seed in range(2)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            assert process.exitcode == 0
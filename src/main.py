@@ -1,135 +1,125 @@
 # third party imports
 import os
-import time
-import torch as th
-import gymnasium as gym
-import numpy as np
-from sb3_contrib import QRDQN
-from typing import Dict
-from stable_baselines3 import PPO, DQN, A2C
-from stable_baselines3.common.vec_env import VecFrameStack
-from stable_baselines3.common.evaluation import evaluate_policy
-from stable_baselines3.common.env_checker import check_env
-from stable_baselines3.common.logger import configure
 # local imports
-from src.game_controller import Game_Controller
-from src.utils import get_path, get_int, get_index, get_bool, get_choice, get_user_input
+# only the menu is imported up front, every branch imports what it needs when it is chosen
+from src.utils import get_path, get_directory, get_int, get_index, get_bool, get_choice
 
-def mutate(params: dict[str, th.Tensor]) -> dict[str, th.Tensor]:
-    """Mutate parameters by adding normal noise to them"""
-    return dict((name, param + th.randn_like(param)) for name, param in params.items())
+def play():
+   from sb3_contrib import MaskablePPO
+   from src.game_controller import Game_Controller
+   from src.algorithms import load_model
 
-def main():
-   index = get_index("Do you want to play , simulate or train a network? ",
-                  ['play','simulate [not implemented]','train'])
-
-   if index == 0:
-      env = Game_Controller()
-      # Load the trained agent
-      # NOTE: if you have loading issue, you can pass `print_system_info=True`
-      # to compare the system on which the model was trained vs the current one
-      model = QRDQN.load(get_path("Which network should be loaded?"),
-                           env=env, print_system_info=True)
-      observation, _ = env.reset()
-      env.render()
-      while not env.done:
+   env = Game_Controller()
+   # Load the trained agent
+   # NOTE: if you have loading issue, you can pass `print_system_info=True`
+   # to compare the system on which the model was trained vs the current one
+   model = load_model(get_path("Which network should be loaded?"),
+                        env=env, print_system_info=True)
+   observation, _ = env.reset()
+   env.render()
+   while not env.done:
+      if isinstance(model, MaskablePPO):
+         action, _states = model.predict(observation, deterministic=True, action_masks=env.action_masks())
+      else:
          action, _states = model.predict(observation, deterministic=True)
-         action = action.item()  # cast 0 dim array containing int
-         observation, reward, truncates, done, info = env.step(action)
-         env.render()
-      env.close()
-   elif index == 1:
-      raise NotImplementedError
+      action = action.item()  # cast 0 dim array containing int
+      observation, reward, done, truncated, info = env.step(action)
+      env.render()
+   env.close()
+
+def train():
+   from stable_baselines3.common.vec_env import VecMonitor
+   from stable_baselines3.common.logger import configure
+   from src.train_model import evolve, ALGORITHMS, create_model, load_model, evaluate_model
+
+   num_envs = get_int("How many games should be played in parallel? (1 = single Game_Controller)", 1)
+   if num_envs > 1 and get_bool("Where should the games run?", ["Worker processes", "Lockstep in this process"]):
+      from src.env_pool import SharedMemoryVecEnv
+      # one Game_Controller per worker process, observations are passed through shared memory
+      env = VecMonitor(SharedMemoryVecEnv(num_envs))
+   elif num_envs > 1:
+      from src.vec_game_controller import VecGameController
+      # all games are stepped together in batched numpy arrays
+      env = VecMonitor(VecGameController(num_envs))
    else:
+      from stable_baselines3.common.env_checker import check_env
+      from src.game_controller import Game_Controller
       env = Game_Controller(True)
       observation, _ = env.reset()
       check_env(env, warn=True)
       observation, _ = env.reset()
 
-      # set up logger
-      log_path = os.path.join('logs', 'training')
-      new_logger = configure(log_path, ["stdout", "csv", "tensorboard"])
+   # set up logger
+   log_path = os.path.join('logs', 'training')
+   new_logger = configure(log_path, ["stdout", "csv", "tensorboard"])
 
-      if get_bool("Train a new network or continue training?",["Train new","Continue training"]):
-         timesteps = get_int("How many timesteps should be made for the first training?")
-         lr_choice = get_choice("Which learnrate should be used?",[0.1, 0.05, 0.005])
+   if get_bool("Train a new network or continue training?",["Train new","Continue training"]):
+      # the maskable algorithm only explores valid actions, instead of passing with every invalid one
+      algorithm = get_choice("Which algorithm should be used? (MaskablePPO only plays valid actions)", list(ALGORITHMS))
+      timesteps = get_int("How many timesteps should be made for the first training?")
+      lr_choice = get_choice("Which learnrate should be used?",[0.1, 0.05, 0.005])
+      if algorithm == "QRDQN" and num_envs > 1:
+         # episodic training only works with one env, the games of a vector env are trained per step
+         model = create_model(algorithm, env, lr_choice, (1, "step"))
+      elif algorithm == "QRDQN":
          train_frequency = get_choice("In what interval should the networks weights be adjusted?",
                                       [(1,"episode"),(1, "step")])
-         model = QRDQN("MlpPolicy",
-                           env,
-                           #ent_coef=0.0,
-                           #policy_kwargs={"net_arch": [32]},
-                           #seed=0,
-                           train_freq=train_frequency, #Update the model every train_freq steps. Alternatively pass a tuple of frequency and unit like (5, "step") or (2, "episode").
-                           learning_rate=lr_choice,
-                           verbose=1) #, tensorGame_Controller_log=log_path) # alias of DQNPolicy # PPO
-         # Set new logger
-         model.set_logger(new_logger)
-         # Use traditional actor-critic policy gradient updates to
-         # find good initial parameters
-         model.learn(total_timesteps=timesteps)
-         model.save('QRDQNAgent_DUMB')
-         mean_reward, std_reward = evaluate_policy(model, env, n_eval_episodes=10, render=False)
+         model = create_model(algorithm, env, lr_choice, train_frequency)
       else:
-         model = QRDQN.load(get_path("Which network should be loaded?"), env=env, print_system_info=True)
+         model = create_model(algorithm, env, lr_choice)
+      # Set new logger
+      model.set_logger(new_logger)
+      # Use traditional actor-critic policy gradient updates to
+      # find good initial parameters
+      model.learn(total_timesteps=timesteps)
+      model.save(algorithm + 'Agent_DUMB')
+      mean_reward, std_reward = evaluate_model(model, env, n_eval_episodes=10, render=False)
+   else:
+      model = load_model(get_path("Which network should be loaded?"), env=env, print_system_info=True)
+      if getattr(model, "replay_buffer", None) is not None:
          model.load_replay_buffer(get_path("Which replay buffer should be loaded?"))
-         mean_reward, std_reward = evaluate_policy(model, env, n_eval_episodes=10, render=False)
+      mean_reward, std_reward = evaluate_model(model, env, n_eval_episodes=10, render=False)
+
+   ## START EVOLUTIONARY TRAINING
+   pop_size = get_int("How big should the population be?",10) # Population size
+   iterations = get_int("How many iterations?")
+   num_workers = get_int("How many processes should evaluate the population? (1 = this process)", 1)
+   evolve(model, pop_size, iterations, prior_champion_fitness=mean_reward, num_workers=num_workers)
+   # Save the policy independently from the model
+   # Note: if you don't save the complete model with `model.save()`
+   # you cannot continue training afterward
+   policy = model.policy
+   policy.save("Champion_Policy")
+   # shut down the worker processes (if any)
+   env.close()
+   print("Finished Training")
+
+def simulate():
+   from src.simulate import simulate as simulate_games, PLAYERS, GAMES_PER_SHARD
+
+   directory = get_directory("Where should the transitions be saved? (choose a started run to continue it)")
+   if directory is None:
+      # dialog was cancelled
+      print("No directory chosen, nothing was simulated")
+      return
+   num_games = get_int("How many games should be simulated?", 1)
+   agent = get_choice("Which player should be the agent (its observations and actions are saved)?", list(PLAYERS))
+   opponent = get_choice("Which player should be the opponent?", list(PLAYERS))
+   num_workers = get_int("How many processes should simulate? (0 = one per CPU core)", 0)
+   games_per_shard = get_int(f"How many games should be saved per shard? (0 = {GAMES_PER_SHARD})", 0) or GAMES_PER_SHARD
+   simulate_games(directory, num_games, agent, opponent, num_workers or None, games_per_shard)
+   print("Finished Simulation")
 
-      # Include only variables with "policy", "action" (policy) or "shared_net" (shared layers)
-      # in their name: only these ones affect the action.
-      # NOTE: you can retrieve those parameters using model.get_parameters() too
-      mean_params = dict(
-      (key, value)
-      for key, value in model.policy.state_dict().items()
-      if ("policy" in key or "shared_net" in key or "action" in key)
-      )
+def main():
+   index = get_index("Do you want to play , simulate or train a network? ",
+                  ['play','simulate','train'])
 
-      ## START EVOLUTIONARY TRAINING
-      pop_size = get_int("How big should the population be?",10) # Population size
-      # Keep top 10%
-      n_elite = pop_size // 10 # Elite size (the best networks in this 10% will be kept until replaced by better ones)
-      # Retrieve the environment
-      vec_env = model.get_env()
-      prior_champion_fitness = mean_reward
-      for iteration in range(get_int("How many iterations?")):
-         # Create population of candidates and evaluate them
-         population = []
-         for population_i in range(pop_size):
-               candidate = mutate(mean_params)
-               # Load new policy parameters to agent.
-               # Tell function that it should only update parameters
-               # we give it (policy parameters)
-               model.policy.load_state_dict(candidate, strict=False)
-               # Evaluate the candidate
-               fitness, _ = evaluate_policy(model, vec_env)
-               population.append((candidate, fitness))
-         # Take top 10% and use average over their parameters as next mean parameter
-         top_candidates = sorted(population, key=lambda x: x[1], reverse=True)[:n_elite]
-         mean_params = dict(
-               (
-                  name,
-                  th.stack([candidate[0][name] for candidate in top_candidates]).mean(dim=0),
-               )
-               for name in mean_params.keys()
-         )
-         mean_fitness = sum(top_candidate[1] for top_candidate in top_candidates) / n_elite
-         print(f"Iteration {iteration + 1:<3} Mean top fitness: {mean_fitness:.2f}")
-         print(f"Best fitness this iteration: {top_candidates[0][1]:.2f} vs Champion: {prior_champion_fitness}")
-         if top_candidates[0][1] > prior_champion_fitness:
-               print("Saving new Champion")
-               prior_champion_fitness = top_candidates[0][1]
-               champion = top_candidates[0][0]
-               model.policy.load_state_dict(champion, strict=False)
-               model.save_replay_buffer("QRDQNEVO_replay")
-               name = "QRDQN_Agent_" + str(round(prior_champion_fitness))
-               model.save(name)
-               time.sleep(1)
-      # Save the policy independently from the model
-      # Note: if you don't save the complete model with `model.save()`
-      # you cannot continue training afterward
-      policy = model.policy
-      policy.save("Champion_Policy")
-      print("Finished Training")
+   if index == 0:
+      play()
+   elif index == 1:
+      simulate()
+   else:
+      train()
 
 if __name__ == "__main__":
-   main()
\ No newline at end of file
+   main()
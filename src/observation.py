@@ -0,0 +1,257 @@
+"""Module that provides the ObservationBuffer, the observation of a Game_Controller kept up to date by the board"""
+import numpy as np
+# local imports
+from src.row import Row
+from src.cards import Card
+from src.board_observer import BoardObserver
+
+# observation layout, see Game_Controller.get_state
+OBSERVATION_SIZE = 465
+OBSERVED_CARDS = 38
+CARD_VECTOR_SIZE = 3
+CARD_SLOTS = OBSERVED_CARDS * CARD_VECTOR_SIZE
+BOTTOM_BOARD_OFFSET = 0
+TOP_BOARD_OFFSET = CARD_SLOTS
+TOP_HAND_OFFSET = 2 * CARD_SLOTS
+ROW_SCORES_OFFSET = 3 * CARD_SLOTS
+ROUND_NUMBER_INDEX = -3
+BOTTOM_ROUNDS_WON_INDEX = -2
+TOP_ROUNDS_WON_INDEX = -1
+# rows in the order their cards are written into the observation, only the first three are scored
+OBSERVED_ROWS = (Row.FRONT, Row.WISE, Row.SUPPORT, Row.EFFECTS)
+OBSERVED_ROW_INDEX = {row: index for index, row in enumerate(OBSERVED_ROWS)}
+SCORED_ROWS = 3
+
+
+class ObservationBuffer(BoardObserver):
+    """Observation of one player (the top player, the AR, by default) as preallocated array.
+
+    The layout is written from the view of the observing player: its board, hand, scores
+    and rounds won are in the "top" slots, the ones of its opponent in the "bottom" slots.
+    The buffer is registered as observer of the board and only writes the slots that
+    changed: a played card moves the following cards of the board by one slot and is
+    removed from the hand, drawn cards are appended to the hand, the end of a round
+    clears the board. Nothing is allocated while the game is played.
+    """
+    # the undone changes of board.pop move the slots back, see cards_undrawn and card_unplayed
+    follows_undo = True
+
+    def __init__(self, board, bottom_player: bool = False):
+        """
+        Creates the buffer and registers it at the board.
+
+        Args:
+            board (Board | ArrayBoard): board that is observed
+            bottom_player (bool, optional): If True the observation is the one of the bottom player
+        """
+        self.board = board
+        self.bottom_player = bottom_player
+        self.buffer = np.zeros((OBSERVATION_SIZE,), dtype=np.uint8)
+        # view handed out instead of a copy, it changes with the buffer and can not be written
+        self.view = self.buffer.view()
+        self.view.flags.writeable = False
+        # number of cards per row (top_player, bottom_player), needed to find the slot of a card
+        self.row_sizes = [[0] * len(OBSERVED_ROWS), [0] * len(OBSERVED_ROWS)]
+        # observed cards of the hand of the observing player
+        self.hand_size = 0
+        board.add_observer(self)
+        self.refresh()
+
+    def get_observation(self, copy: bool = True) -> np.ndarray:
+        """
+        Method to get the current observation.
+
+        Args:
+            copy (bool, optional): If False the read-only view of the buffer is returned,
+            it changes when the board changes. Defaults to True.
+
+        Returns:
+            np.ndarray: observation of 465 uint8 values
+        """
+        if copy:
+            return self.buffer.copy()
+        return self.view
+
+    def refresh(self) -> None:
+        """Writes the whole observation from the board again."""
+        self.buffer.fill(0)
+        for bottom_player in (True, False):
+            half_board = self.board.get_half_board(bottom_player)
+            self.row_sizes[int(bottom_player)] = [len(half_board[row]) for row in OBSERVED_ROWS]
+            cards = [card for row in OBSERVED_ROWS for card in half_board[row]]
+            self._write_cards(self._get_board_offset(bottom_player), cards)
+            for row_index, row in enumerate(OBSERVED_ROWS[:SCORED_ROWS]):
+                self._write_row_score(bottom_player, row_index, self.board.get_row_score(bottom_player, row))
+        self.hand_set(self.bottom_player)
+        self._write_round()
+
+    def _get_board_offset(self, bottom_player: bool) -> int:
+        """Returns the position of the first card of the board of a player"""
+        return BOTTOM_BOARD_OFFSET if bottom_player != self.bottom_player else TOP_BOARD_OFFSET
+
+    def _write_cards(self, offset: int, cards: list[Card]) -> None:
+        """Writes the vectors of the cards one after another, starting at offset"""
+        for card in cards:
+            self.buffer[offset:offset + CARD_VECTOR_SIZE] = card.vector
+            offset += CARD_VECTOR_SIZE
+
+    def _write_row_score(self, bottom_player: bool, row_index: int, score: int) -> None:
+        """Writes the score of a row, the scores of the opponent come first"""
+        self.buffer[ROW_SCORES_OFFSET + (0 if bottom_player != self.bottom_player else SCORED_ROWS) + row_index] = score
+
+    def _write_round(self) -> None:
+        """Writes the round number and the rounds won of both players"""
+        self.buffer[ROUND_NUMBER_INDEX] = self.board.round_number
+        self.buffer[BOTTOM_ROUNDS_WON_INDEX] = self.board.get_rounds_won(not self.bottom_player)
+        self.buffer[TOP_ROUNDS_WON_INDEX] = self.board.get_rounds_won(self.bottom_player)
+
+    def board_restored(self) -> None:
+        self.refresh()
+
+    def board_reset(self) -> None:
+        self.buffer.fill(0)
+        self.row_sizes = [[0] * len(OBSERVED_ROWS), [0] * len(OBSERVED_ROWS)]
+        self.hand_size = 0
+        self._write_round()
+
+    def hand_set(self, bottom_player: bool) -> None:
+        # only the hand of the observing player is observed
+        if bottom_player != self.bottom_player:
+            return
+        hand = self.board.get_hand(bottom_player)[:OBSERVED_CARDS]
+        self.buffer[TOP_HAND_OFFSET:TOP_HAND_OFFSET + CARD_SLOTS] = 0
+        self._write_cards(TOP_HAND_OFFSET, hand)
+        self.hand_size = len(hand)
+
+    def cards_drawn(self, bottom_player: bool, cards: list[Card]) -> None:
+        if bottom_player != self.bottom_player:
+            return
+        cards = cards[:OBSERVED_CARDS - self.hand_size]
+        self._write_cards(TOP_HAND_OFFSET + self.hand_size * CARD_VECTOR_SIZE, cards)
+        self.hand_size += len(cards)
+
+    def card_played(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        if row is not None:
+            self._add_board_card(bottom_player, card, row)
+        if bottom_player == self.bottom_player:
+            # move the following cards of the hand one slot to the front and clear the last slot
+            start = TOP_HAND_OFFSET + card_index * CARD_VECTOR_SIZE
+            end = TOP_HAND_OFFSET + self.hand_size * CARD_VECTOR_SIZE
+            self.buffer[start:end - CARD_VECTOR_SIZE] = self.buffer[start + CARD_VECTOR_SIZE:end]
+            self.buffer[end - CARD_VECTOR_SIZE:end] = 0
+            self.hand_size -= 1
+            # if the hand was full, a card that did not fit into the observation moves up into the last slot
+            if self.hand_size == OBSERVED_CARDS - 1 and self.board.get_hand_size(bottom_player) > self.hand_size:
+                self._write_cards(end - CARD_VECTOR_SIZE, [self.board.get_hand_card(bottom_player, self.hand_size)])
+                self.hand_size += 1
+
+    def _add_board_card(self, bottom_player: bool, card: Card, row: Row) -> None:
+        """Inserts a card at the end of its row, the cards of the following rows move one slot back"""
+        row_sizes = self.row_sizes[int(bottom_player)]
+        row_index = OBSERVED_ROW_INDEX[row]
+        position = sum(row_sizes[:row_index + 1])
+        card_count = min(sum(row_sizes), OBSERVED_CARDS - 1)
+        row_sizes[row_index] += 1
+        if row_index < SCORED_ROWS:
+            self._write_row_score(bottom_player, row_index, self.board.get_row_score(bottom_player, row))
+        if position >= OBSERVED_CARDS:
+            return
+        offset = self._get_board_offset(bottom_player)
+        start = offset + position * CARD_VECTOR_SIZE
+        end = offset + card_count * CARD_VECTOR_SIZE
+        self.buffer[start + CARD_VECTOR_SIZE:end + CARD_VECTOR_SIZE] = self.buffer[start:end]
+        self._write_cards(start, [card])
+
+    def cards_undrawn(self, bottom_player: bool, cards: list[Card]) -> None:
+        if bottom_player != self.bottom_player:
+            return
+        # the cards left from the end of the hand, clear the slots of the ones that were observed
+        hand_size = min(self.board.get_hand_size(bottom_player), self.hand_size)
+        self.buffer[TOP_HAND_OFFSET + hand_size * CARD_VECTOR_SIZE:TOP_HAND_OFFSET + self.hand_size * CARD_VECTOR_SIZE] = 0
+        self.hand_size = hand_size
+
+    def card_unplayed(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        if row is not None:
+            self._remove_board_card(bottom_player, row)
+        if bottom_player == self.bottom_player and card_index < OBSERVED_CARDS:
+            # move the following cards of the hand one slot back, the last one drops out of a full observation
+            start = TOP_HAND_OFFSET + card_index * CARD_VECTOR_SIZE
+            end = TOP_HAND_OFFSET + min(self.hand_size, OBSERVED_CARDS - 1) * CARD_VECTOR_SIZE
+            self.buffer[start + CARD_VECTOR_SIZE:end + CARD_VECTOR_SIZE] = self.buffer[start:end]
+            self._write_cards(start, [card])
+            self.hand_size = min(self.hand_size + 1, OBSERVED_CARDS)
+
+    def _remove_board_card(self, bottom_player: bool, row: Row) -> None:
+        """Removes the card at the end of its row, the cards of the following rows move one slot to the front"""
+        row_sizes = self.row_sizes[int(bottom_player)]
+        row_index = OBSERVED_ROW_INDEX[row]
+        position = sum(row_sizes[:row_index + 1]) - 1
+        card_count = sum(row_sizes)
+        row_sizes[row_index] -= 1
+        if row_index < SCORED_ROWS:
+            self._write_row_score(bottom_player, row_index, self.board.get_row_score(bottom_player, row))
+        if position >= OBSERVED_CARDS:
+            return
+        offset = self._get_board_offset(bottom_player)
+        start = offset + position * CARD_VECTOR_SIZE
+        end = offset + min(card_count, OBSERVED_CARDS) * CARD_VECTOR_SIZE
+        self.buffer[start:end - CARD_VECTOR_SIZE] = self.buffer[start + CARD_VECTOR_SIZE:end]
+        self.buffer[end - CARD_VECTOR_SIZE:end] = 0
+        if card_count > OBSERVED_CARDS:
+            # a card that did not fit into the observation moves up into the last slot
+            half_board = self.board.get_half_board(bottom_player)
+            cards = [card for observed_row in OBSERVED_ROWS for card in half_board[observed_row]]
+            self._write_cards(end - CARD_VECTOR_SIZE, [cards[OBSERVED_CARDS - 1]])
+
+    def round_ended(self) -> None:
+        self.buffer[BOTTOM_BOARD_OFFSET:BOTTOM_BOARD_OFFSET + CARD_SLOTS] = 0
+        self.buffer[TOP_BOARD_OFFSET:TOP_BOARD_OFFSET + CARD_SLOTS] = 0
+        self.buffer[ROW_SCORES_OFFSET:ROW_SCORES_OFFSET + 2 * SCORED_ROWS] = 0
+        self.row_sizes = [[0] * len(OBSERVED_ROWS), [0] * len(OBSERVED_ROWS)]
+        self._write_round()
+
+
+# Example usage
+if __name__ == '__main__':
+    from src.board import Board
+    from src.cards import Booster
+    # small testing
+    board = Board(top_player_name="Hungriger", bottom_player_name="Hugo")
+    observation = ObservationBuffer(board)
+    board.set_deck(False, [Card("KNIGHT", 3, Row.FRONT), Card("HEALER", 2, Row.SUPPORT)] + Booster().open(18))
+    board.draw_cards_to_hand(False, 10)
+    board.set_deck(True, [Card("CLERIC", 4, Row.WISE)])
+    board.draw_cards_to_hand(True, 1)
+    board.play_card(False, 1, Row.SUPPORT)
+    board.play_card(False, 0, Row.FRONT)
+    board.play_card(True, 0, Row.WISE)
+    view = observation.get_observation(copy=False)
+    # the front card is written before the support card, although it was played after it
+    assert view[TOP_BOARD_OFFSET:TOP_BOARD_OFFSET + 6].tolist() == [3, 1, 0, 2, 3, 2]
+    assert view[BOTTOM_BOARD_OFFSET:BOTTOM_BOARD_OFFSET + 3].tolist() == [4, 2, 1]
+    assert view[ROW_SCORES_OFFSET:ROW_SCORES_OFFSET + 6].tolist() == [0, 4, 0, 3, 0, 2]
+    assert not view.flags.writeable
+    # the incremental updates must match a full rewrite of the observation
+    incremental = observation.get_observation()
+    observation.refresh()
+    assert (incremental == observation.get_observation()).all()
+    board.end_round()
+    assert not view[:TOP_HAND_OFFSET].any() and not view[ROW_SCORES_OFFSET:ROW_SCORES_OFFSET + 6].any()
+    assert view[ROUND_NUMBER_INDEX] == 2
+    # the observation of the bottom player mirrors the board
+    board = Board(top_player_name="Hungriger", bottom_player_name="Hugo")
+    top_view, bottom_view = ObservationBuffer(board), ObservationBuffer(board, bottom_player=True)
+    mirrored = Board(top_player_name="Hugo", bottom_player_name="Hungriger")
+    mirrored_view = ObservationBuffer(mirrored)
+    for bottom_player, deck in ((True, Booster().open(20)), (False, Booster().open(20))):
+        board.set_deck(bottom_player, list(deck))
+        board.draw_cards_to_hand(bottom_player, 10)
+        mirrored.set_deck(not bottom_player, list(deck))
+        mirrored.draw_cards_to_hand(not bottom_player, 10)
+    for bottom_player, card_index in ((True, 3), (False, 0), (True, 0), (False, 5)):
+        card = board.get_hand(bottom_player)[card_index]
+        row = Row.FRONT if card.type == Row.ANY else card.type
+        board.play_card(bottom_player, card_index, row)
+        mirrored.play_card(not bottom_player, card_index, row)
+    assert (bottom_view.get_observation() == mirrored_view.get_observation()).all()
+    assert not (bottom_view.get_observation() == top_view.get_observation()).all()
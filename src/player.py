@@ -1,5 +1,5 @@
 from abc import ABC
-import random
+import numpy as np
 from src.row import Row
 from src.utils import get_name
 from src.cards import Card
@@ -11,8 +11,24 @@ any_row_choice = {
     3: Row.SUPPORT
 }
 class Player(ABC):
-    def __init__(self, name):
+    def __init__(self, name, rng: np.random.Generator | None = None):
         self.name = name
+        # generator for all random decisions, the Game_Controller hands in its own
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # board the player plays on, only players that look at the game use it
+        self.board = None
+        self.bottom_player = None
+
+    def sit_down(self, board, bottom_player: bool) -> None:
+        """
+        Called when the player takes its seat at a board.
+
+        Args:
+            board (Board | ArrayBoard): board of the game
+            bottom_player (bool): True if the player is the bottom player
+        """
+        self.board = board
+        self.bottom_player = bottom_player
 
     def make_pass_choice(self) -> bool:
         """
@@ -110,23 +126,24 @@ class Human(Player):
 
 
 class ArtificialRetardation(Player):
-    def __init__(self, name):
-        super().__init__(name)
+    def __init__(self, name, rng: np.random.Generator | None = None):
+        super().__init__(name, rng)
 
     def make_choice(self, valid_choices, action=None):
         if action is not None:
             return action
         else:
-            return int(random.choice(valid_choices)) # Monke
+            return int(valid_choices[self.rng.integers(len(valid_choices))]) # Monke
 
     def make_row_choice(self, card, row_choices: list[Row]) -> Row:
-        return random.choice(list(row_choices))
+        row_choices = list(row_choices)
+        return row_choices[self.rng.integers(len(row_choices))]
 
     def make_pass_choice(self, hand) -> bool:
         if len(hand)==0:
             self.passed = True
         else:
-            self.passed = random.choices([False, True],[0.97,0.03],k=1)[0]
+            self.passed = bool(self.rng.random() < 0.03)
         return self.passed
 '''
     def build_deck(self, booster):
@@ -0,0 +1,87 @@
+"""Module that provides the PhaseProfiler, timers and counters for the phases of a Game_Controller step"""
+import cProfile
+from time import perf_counter_ns
+
+
+class PhaseProfiler:
+    """Accumulates the time spent in the phases of step and reset.
+
+    The env calls start() when a step (or reset) begins and lap(phase) after every phase,
+    the time since the last lap is added to the phase. Optionally a cProfile capture of a
+    window of steps is written to a pstats file.
+    """
+    def __init__(self, cprofile_start: int | None = None, cprofile_steps: int = 100,
+                 cprofile_path: str = "game_controller.pstats"):
+        """
+        Args:
+            cprofile_start (int, optional): number of the step (counted from 0 since the profiler
+            was created) the cProfile capture starts with. No capture if None.
+            cprofile_steps (int, optional): number of steps that are captured
+            cprofile_path (str, optional): file the pstats of the capture are written to
+        """
+        # phase: [calls, nanoseconds]
+        self.phases = {}
+        self.steps = 0
+        self._last = 0
+        self._step_start = 0
+        self.cprofile_start = cprofile_start
+        self.cprofile_steps = cprofile_steps
+        self.cprofile_path = cprofile_path
+        self._cprofile = None
+
+    def start(self) -> None:
+        """Starts the clock for the first phase"""
+        self._last = perf_counter_ns()
+
+    def lap(self, phase: str) -> None:
+        """
+        Adds the time since the last lap (or start) to a phase.
+
+        Args:
+            phase (str): name of the phase that just finished
+        """
+        now = perf_counter_ns()
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = [0, 0]
+        stats[0] += 1
+        stats[1] += now - self._last
+        self._last = now
+
+    def step_started(self) -> None:
+        """Called at the beginning of step, starts the cProfile capture when its window begins"""
+        if self.steps == self.cprofile_start:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._step_start = perf_counter_ns()
+        self._last = self._step_start
+
+    def step_finished(self) -> None:
+        """Called at the end of step, counts the step and writes the cProfile capture when its window ends"""
+        stats = self.phases.get("step")
+        if stats is None:
+            stats = self.phases["step"] = [0, 0]
+        stats[0] += 1
+        stats[1] += perf_counter_ns() - self._step_start
+        self.steps += 1
+        if self._cprofile is not None and self.steps == self.cprofile_start + self.cprofile_steps:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_path)
+            self._cprofile = None
+
+    def get_profile(self) -> dict[str, dict[str, float]]:
+        """
+        Method to get the accumulated stats.
+
+        Returns:
+            dict[str, dict[str, float]]: per phase the number of calls, the total time in ms
+            and the mean time per call in us. "step" is the time of whole steps.
+        """
+        return {
+            phase: {"calls": calls, "total_ms": total / 1e6, "mean_us": total / calls / 1e3}
+            for phase, (calls, total) in self.phases.items()
+        }
+
+    def reset(self) -> None:
+        """Clears the accumulated stats, a running cProfile capture continues"""
+        self.phases = {}
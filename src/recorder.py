@@ -0,0 +1,282 @@
+"""Module that provides the EpisodeRecorder and the EpisodeReplayer for storing played games
+
+Every game is stored as one fixed width record (EPISODE_DTYPE): the seed, the decks as
+card ids and the moves of the players (card index, row, player). The records are appended
+to chunk files episodes_<number>.bin, the replayer memory maps them and plays any game
+again on a Board.
+
+Card ids are stored as uint8, the ids of the booster cards are the same in every process
+(see src/cards.py), so recordings can be replayed everywhere.
+"""
+import os
+import glob
+import numpy as np
+# local imports
+from src.row import Row
+from src.cards import Card
+from src.board import Board
+from src.board_observer import BoardObserver
+from src.deck_sampler import DECK_SIZE
+
+START_HAND_SIZE = 10
+ROUND_DRAW = 2
+# a player plays at most his deck and passes once per round, this is enough for every game
+MAX_MOVES = 64
+# a move is stored as uint16: bits 0-5 card index + 1 (0 = pass), bits 6-8 row value (0 = no row), bit 9 bottom player
+_CARD_BITS = 0x3F
+_ROW_SHIFT = 6
+_ROW_BITS = 0x7
+_BOTTOM_PLAYER_BIT = 1 << 9
+NO_SEED = -1
+
+EPISODE_DTYPE = np.dtype([
+    ("seed", "<i8"),                    # seed of the reset, NO_SEED if the env was not seeded
+    ("coin_flip", "u1"),                # coin flip of the env, if not coin flip the bottom player begins
+    ("steps", "u1"),                    # number of env steps
+    ("num_moves", "u1"),                # number of used entries in moves
+    ("rounds_won", "u1", (2,)),         # (top_player, bottom_player) at the end of the game
+    ("decks", "u1", (2, DECK_SIZE)),    # card ids of the decks (top_player, bottom_player)
+    ("moves", "<u2", (MAX_MOVES,)),
+])
+
+
+def encode_move(bottom_player: bool, card_index: int | None, row: Row | None) -> int:
+    """
+    Encodes a move into 16 bits.
+
+    Args:
+        bottom_player (bool): True if the bottom player moved
+        card_index (int | None): index of the played card in the hand, None for passing
+        row (Row | None): row the card was played in, None for effect cards and passing
+
+    Returns:
+        int: the encoded move
+    """
+    move = 0 if card_index is None else card_index + 1
+    if row is not None:
+        move |= row.value << _ROW_SHIFT
+    if bottom_player:
+        move |= _BOTTOM_PLAYER_BIT
+    return move
+
+
+def decode_move(move: int) -> tuple[bool, int | None, Row | None]:
+    """
+    Decodes a move of encode_move.
+
+    Returns:
+        tuple[bool, int | None, Row | None]: bottom player, card index (None for passing), row
+    """
+    card = move & _CARD_BITS
+    row = (move >> _ROW_SHIFT) & _ROW_BITS
+    return bool(move & _BOTTOM_PLAYER_BIT), card - 1 if card else None, Row(row) if row else None
+
+
+class EpisodeRecorder(BoardObserver):
+    """Records the games played on a board and appends them to chunk files.
+
+    The Game_Controller calls start_episode after dealing and finish_episode when the game
+    is over, the moves are collected as observer of the board.
+    Finished episodes are buffered and written in batches, call close() to write the rest.
+    """
+    def __init__(self, directory: str, episodes_per_chunk: int = 1 << 16, buffer_size: int = 1024):
+        """
+        Args:
+            directory (str): directory of the chunk files, it is created if needed
+            episodes_per_chunk (int, optional): episodes per chunk file
+            buffer_size (int, optional): episodes that are collected before they are written
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.episodes_per_chunk = episodes_per_chunk
+        self.buffer = np.zeros(buffer_size, dtype=EPISODE_DTYPE)
+        self.buffered = 0
+        # continue after the chunks that are already there
+        chunks = sorted(glob.glob(os.path.join(directory, "episodes_*.bin")))
+        self.chunk = len(chunks) - 1 if chunks else 0
+        self.chunk_episodes = os.path.getsize(chunks[-1]) // EPISODE_DTYPE.itemsize if chunks else 0
+        self.recording = False
+        self.num_moves = 0
+
+    def start_episode(self, seed: int | None, coin_flip: bool, top_deck: np.ndarray, bottom_deck: np.ndarray) -> None:
+        """
+        Starts recording a game, an unfinished game is dropped.
+
+        Args:
+            seed (int | None): seed the env was reset with
+            coin_flip (bool): coin flip of the env
+            top_deck (np.ndarray): card ids of the deck of the top player
+            bottom_deck (np.ndarray): card ids of the deck of the bottom player
+        """
+        episode = self.buffer[self.buffered]
+        episode["seed"] = NO_SEED if seed is None else seed
+        episode["coin_flip"] = coin_flip
+        episode["decks"][0] = top_deck
+        episode["decks"][1] = bottom_deck
+        episode["moves"] = 0
+        self.num_moves = 0
+        self.recording = True
+
+    def _add_move(self, move: int) -> None:
+        if not self.recording:
+            return
+        if self.num_moves == MAX_MOVES:
+            raise ValueError(f"A game can not have more than {MAX_MOVES} moves")
+        self.buffer["moves"][self.buffered, self.num_moves] = move
+        self.num_moves += 1
+
+    def card_played(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        self._add_move(encode_move(bottom_player, card_index, row))
+
+    def round_passed(self, bottom_player: bool) -> None:
+        self._add_move(encode_move(bottom_player, None, None))
+
+    def finish_episode(self, steps: int, rounds_won: tuple[int, int]) -> None:
+        """
+        Stores the recorded game.
+
+        Args:
+            steps (int): number of env steps of the game
+            rounds_won (tuple[int, int]): rounds won by (top_player, bottom_player)
+        """
+        if not self.recording:
+            return
+        episode = self.buffer[self.buffered]
+        episode["steps"] = steps
+        episode["num_moves"] = self.num_moves
+        episode["rounds_won"] = rounds_won
+        self.recording = False
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self) -> None:
+        """Appends the buffered episodes to the chunk files"""
+        written = 0
+        while written < self.buffered:
+            if self.chunk_episodes == self.episodes_per_chunk:
+                self.chunk += 1
+                self.chunk_episodes = 0
+            count = min(self.buffered - written, self.episodes_per_chunk - self.chunk_episodes)
+            with open(os.path.join(self.directory, f"episodes_{self.chunk:06d}.bin"), "ab") as chunk_file:
+                chunk_file.write(self.buffer[written:written + count].tobytes())
+            self.chunk_episodes += count
+            written += count
+        self.buffered = 0
+
+    def close(self) -> None:
+        """Writes the buffered episodes, an unfinished game is dropped"""
+        self.recording = False
+        self.flush()
+
+
+class EpisodeReplayer:
+    """Memory maps the chunk files of an EpisodeRecorder.
+
+    The episodes can be accessed by index (across all chunks) or scanned per field
+    without loading the files, any game can be played again on a Board.
+    """
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): directory of the chunk files
+        """
+        self.chunks = []
+        for path in sorted(glob.glob(os.path.join(directory, "episodes_*.bin"))):
+            if os.path.getsize(path) >= EPISODE_DTYPE.itemsize:
+                self.chunks.append(np.memmap(path, dtype=EPISODE_DTYPE, mode="r"))
+        # index of the first episode of every chunk
+        self.offsets = np.cumsum([0] + [len(chunk) for chunk in self.chunks])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index: int) -> np.void:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Episode {index} does not exist, there are {len(self)} episodes")
+        chunk = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        return self.chunks[chunk][index - self.offsets[chunk]]
+
+    def get_field(self, name: str) -> np.ndarray:
+        """
+        Method to get one field of all episodes, e.g. "rounds_won" to scan the results.
+
+        Args:
+            name (str): name of the field in EPISODE_DTYPE
+
+        Returns:
+            np.ndarray: the field of every episode
+        """
+        if not self.chunks:
+            return np.zeros((0,) + EPISODE_DTYPE[name].shape, dtype=EPISODE_DTYPE[name].base)
+        return np.concatenate([chunk[name] for chunk in self.chunks])
+
+    def replay(self, index: int, num_moves: int | None = None, board: Board | None = None) -> Board:
+        """
+        Plays an episode again on a board, with the rules of the Game_Controller.
+
+        Args:
+            index (int): index of the episode
+            num_moves (int, optional): number of moves that are replayed, all if None
+            board (Board | ArrayBoard, optional): board the game is played on, it is reset first.
+            A new Board if not given.
+
+        Returns:
+            Board: board after the moves
+        """
+        episode = self[index]
+        if board is None:
+            board = Board("top_player", "bottom_player")
+        board.reset()
+        # same order as Game_Controller.setup_hand_for_new_round
+        board.set_deck_ids(True, episode["decks"][1])
+        board.draw_cards_to_hand(True, START_HAND_SIZE)
+        board.set_deck_ids(False, episode["decks"][0])
+        board.draw_cards_to_hand(False, START_HAND_SIZE)
+        if num_moves is None:
+            num_moves = int(episode["num_moves"])
+        for move in episode["moves"][:num_moves].tolist():
+            bottom_player, card_index, row = decode_move(move)
+            if card_index is None:
+                board.pass_round(bottom_player)
+            else:
+                board.play_card(bottom_player, card_index, row)
+            # the round ends as soon as both players passed
+            if board.has_passed(True) and board.has_passed(False):
+                board.end_round()
+                board.draw_cards_to_hand(True, ROUND_DRAW)
+                board.draw_cards_to_hand(False, ROUND_DRAW)
+        return board
+
+
+# Example usage
+if __name__ == '__main__':
+    import tempfile
+    from src.game_controller import Game_Controller
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = Game_Controller(True)
+        env.enable_recording(temp_dir, episodes_per_chunk=7, buffer_size=4)
+        final_observations = []
+        for game in range(20):
+            env.reset(seed=game if game % 2 else None)
+            done = truncated = False
+            while not (done or truncated):
+                observation, _, done, truncated, _ = env.step(int(env.np_random.integers(6)))
+            final_observations.append(observation.copy())
+        # an unfinished game is not stored
+        env.reset()
+        env.step(1)
+        env.close()
+        replayer = EpisodeReplayer(temp_dir)
+        assert len(replayer) == 20 and len(replayer.chunks) == 3
+        assert replayer[1]["seed"] == 1 and replayer[2]["seed"] == NO_SEED
+        from src.observation import ObservationBuffer
+        for game in reversed(range(20)):
+            board = Board("top_player", "bottom_player")
+            observation = ObservationBuffer(board)
+            replayer.replay(game, board=board)
+            assert np.array_equal(observation.get_observation(), final_observations[game]), game
+            assert tuple(replayer[game]["rounds_won"]) == (board.get_rounds_won(False), board.get_rounds_won(True))
+        assert np.array_equal(replayer.get_field("num_moves")[:5], [replayer[i]["num_moves"] for i in range(5)])
@@ -0,0 +1,416 @@
+"""Module that provides the SearchPlayer, a determinized Monte Carlo tree search (ISMCTS) player
+
+The player does not know the hand and deck of its opponent. For every playout it samples them
+(a determinization) from the booster distribution, keeping the strengths of the cards the
+opponent already revealed. The statistics are stored in a transposition table, keyed by the
+hash of the information set of the searching player, so move orders that lead to the same
+situation share their statistics. Playouts run on the SearchState, a compact copy of the board
+with card ids in lists that is cheap to clone.
+"""
+import math
+import time
+import random
+import numpy as np
+# local imports
+from src.row import Row
+from src.cards import Card, DrawCard, get_card, get_card_count
+from src.player import Player
+from src.board_observer import BoardObserver
+from src.deck_sampler import UNIT_CARD_IDS, EFFECT_CARD_IDS, STRENGTH_WEIGHTS, CARD_WEIGHTS
+
+PASS = 0
+# an action is card id << 2 | row slot, the row slot is the row value - 1 (FRONT, WISE, SUPPORT) or EFFECT_SLOT
+EFFECT_SLOT = 3
+HERO_SLOT = -1
+SCORED_SLOTS = (0, 1, 2)
+ROUND_DRAW = 2
+# chance that a playout passes while it still has cards
+PLAYOUT_PASS_CHANCE = 0.15
+EXPLORATION = 0.7
+MAX_TABLE_SIZE = 1_000_000
+
+# properties of every card id, filled by _update_card_tables
+_card_strengths = [0]
+_card_slots = [PASS]
+_card_draws = [0]
+# (kind of unit card, index of the strength) of the booster cards
+_unit_card_kinds = {card_id: (kind, strength_index)
+                    for kind, card_ids in enumerate(UNIT_CARD_IDS.tolist())
+                    for strength_index, card_id in enumerate(card_ids)}
+_effect_card_ids = EFFECT_CARD_IDS.tolist()
+_strength_weights = np.cumsum(STRENGTH_WEIGHTS).tolist()
+_card_weights = np.cumsum(CARD_WEIGHTS).tolist()
+
+
+def _update_card_tables() -> None:
+    """Adds the cards that were created since the last update to the tables"""
+    for card_id in range(len(_card_strengths), get_card_count()):
+        card = get_card(card_id)
+        _card_strengths.append(card.strength)
+        _card_draws.append(card.num_card if isinstance(card, DrawCard) else 0)
+        if card.type == Row.ANY:
+            _card_slots.append(HERO_SLOT)
+        elif card.type in (Row.FRONT, Row.WISE, Row.SUPPORT) and not isinstance(card, DrawCard):
+            _card_slots.append(card.type.value - 1)
+        else:
+            _card_slots.append(EFFECT_SLOT)
+
+
+class SearchState:
+    """Compact state of a game for the search, player 0 is the top and 1 the bottom player.
+
+    Decks are lists with the next card at the end. The turn order follows Game_Controller.step:
+    the players move in turns, players that passed are skipped, a round ends when both passed
+    and the next round is started by the player that began the game.
+    """
+    __slots__ = ("hands", "decks", "scores", "passed", "rounds_won", "round_number", "first", "to_move", "over")
+
+    def clone(self) -> "SearchState":
+        state = SearchState.__new__(SearchState)
+        state.hands = [self.hands[0][:], self.hands[1][:]]
+        state.decks = [self.decks[0][:], self.decks[1][:]]
+        state.scores = self.scores[:]
+        state.passed = self.passed[:]
+        state.rounds_won = self.rounds_won[:]
+        state.round_number = self.round_number
+        state.first = self.first
+        state.to_move = self.to_move
+        state.over = self.over
+        return state
+
+    def get_key(self, player: int) -> int:
+        """
+        Hash of the information set of a player: everything it can see, of the opponent only
+        the number of cards in hand and deck.
+
+        Args:
+            player (int): player whose information set is hashed
+
+        Returns:
+            int: the hash
+        """
+        opponent = 1 - player
+        return hash((self.to_move, tuple(sorted(self.hands[player])), len(self.hands[opponent]),
+                     len(self.decks[player]), len(self.decks[opponent]), tuple(self.scores),
+                     self.passed[0], self.passed[1], self.rounds_won[0], self.rounds_won[1], self.round_number))
+
+    def get_actions(self) -> list[int]:
+        """Returns the distinct actions of the player to move, cards of the same kind are one action"""
+        actions = {PASS}
+        for card_id in self.hands[self.to_move]:
+            slot = _card_slots[card_id]
+            if slot == HERO_SLOT:
+                actions.update((card_id << 2 | row_slot) for row_slot in SCORED_SLOTS)
+            else:
+                actions.add(card_id << 2 | slot)
+        return sorted(actions)
+
+    def apply(self, action: int) -> None:
+        """
+        Plays an action of the player to move.
+
+        Args:
+            action (int): PASS or card id << 2 | row slot
+        """
+        player = self.to_move
+        if action == PASS:
+            self.passed[player] = True
+        else:
+            card_id = action >> 2
+            slot = action & 3
+            self.hands[player].remove(card_id)
+            if slot == EFFECT_SLOT:
+                self._draw(player, _card_draws[card_id])
+            else:
+                self.scores[3 * player + slot] += _card_strengths[card_id]
+        opponent = 1 - player
+        if not self.passed[opponent]:
+            self.to_move = opponent
+        elif self.passed[player]:
+            self._end_round()
+
+    def _draw(self, player: int, num_cards: int) -> None:
+        deck = self.decks[player]
+        hand = self.hands[player]
+        for _ in range(min(num_cards, len(deck))):
+            hand.append(deck.pop())
+
+    def _end_round(self) -> None:
+        """Same rules as Board.end_round, then both players draw"""
+        scores = self.scores
+        top_rows = bottom_rows = 0
+        for slot in SCORED_SLOTS:
+            top_score, bottom_score = scores[slot], scores[3 + slot]
+            # rows without any score are not won by anyone
+            if top_score == bottom_score == 0:
+                continue
+            top_rows += top_score >= bottom_score
+            bottom_rows += bottom_score >= top_score
+        self.rounds_won[0] += top_rows >= bottom_rows
+        self.rounds_won[1] += bottom_rows >= top_rows
+        self.scores = [0] * 6
+        self.passed = [False, False]
+        self.round_number += 1
+        self.over = self.round_number >= 4 or self.rounds_won[0] >= 2 or self.rounds_won[1] >= 2
+        self._draw(1, ROUND_DRAW)
+        self._draw(0, ROUND_DRAW)
+        self.to_move = self.first
+
+    def get_result(self, player: int) -> float:
+        """Returns 1 if the player won, 0.5 for a draw and 0 if it lost"""
+        own, other = self.rounds_won[player], self.rounds_won[1 - player]
+        return 1.0 if own > other else 0.5 if own == other else 0.0
+
+    def playout(self, rnd: random.Random) -> None:
+        """Plays the game to the end with a fast random policy: players play random cards and
+        pass sometimes, a player that leads the round passes when its opponent passed"""
+        while not self.over:
+            player = self.to_move
+            hand = self.hands[player]
+            if not hand or rnd.random() < PLAYOUT_PASS_CHANCE or (self.passed[1 - player] and self._leads(player)):
+                self.apply(PASS)
+                continue
+            card_id = hand[int(rnd.random() * len(hand))]
+            slot = _card_slots[card_id]
+            if slot == HERO_SLOT:
+                slot = int(rnd.random() * 3)
+            self.apply(card_id << 2 | slot)
+
+    def _leads(self, player: int) -> bool:
+        """True if the player would win the round now"""
+        own_rows = other_rows = 0
+        offset, other_offset = 3 * player, 3 * (1 - player)
+        for slot in SCORED_SLOTS:
+            own, other = self.scores[offset + slot], self.scores[other_offset + slot]
+            if own == other == 0:
+                continue
+            own_rows += own >= other
+            other_rows += other >= own
+        return own_rows > other_rows
+
+
+class SearchPlayer(Player, BoardObserver):
+    """Player that chooses its moves with determinized Monte Carlo tree search (SO-ISMCTS).
+
+    The player watches the board it sits at, to know which cards the opponent revealed and
+    who began the game. Every move gets a budget of playouts and/or seconds. The transposition
+    table is kept for the whole game, the statistics of earlier moves are reused.
+    """
+    def __init__(self, name, rng: np.random.Generator | None = None, playouts: int | None = 1000,
+                 time_budget: float | None = None, exploration: float = EXPLORATION,
+                 max_table_size: int = MAX_TABLE_SIZE):
+        """
+        Args:
+            name (str): name of the player
+            rng (np.random.Generator, optional): generator of the search
+            playouts (int, optional): playouts per move, no limit if None
+            time_budget (float, optional): seconds per move, no limit if None
+            exploration (float, optional): exploration constant of the UCB selection
+            max_table_size (int, optional): the transposition table is cleared when it gets bigger
+        """
+        super().__init__(name, rng)
+        if playouts is None and time_budget is None:
+            raise ValueError("A SearchPlayer needs a playout or a time budget")
+        self.playouts = playouts
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.max_table_size = max_table_size
+        # information set hash: {action: [visits, wins, availability]}
+        self.table = {}
+        self._reset_knowledge()
+        # row of the hero chosen by the last search, asked for by make_row_choice
+        self.hero_row = None
+        # stats of the last search
+        self.last_playouts = 0
+        self.last_duration = 0.0
+
+    def _reset_knowledge(self) -> None:
+        # strength index of the unit cards the opponent revealed (by kind) and its effect card id
+        self.revealed_strengths = {}
+        self.revealed_effect = None
+        # player (0 top, 1 bottom) that made the first move of the game
+        self.first = None
+
+    def sit_down(self, board, bottom_player: bool) -> None:
+        if self.board is not None:
+            self.board.remove_observer(self)
+        super().sit_down(board, bottom_player)
+        board.add_observer(self)
+        self.table.clear()
+        self._reset_knowledge()
+
+    def board_reset(self) -> None:
+        self.table.clear()
+        self._reset_knowledge()
+
+    def card_played(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        self._moved(bottom_player)
+        if bottom_player != self.bottom_player:
+            kind = _unit_card_kinds.get(card.card_id)
+            if kind is not None:
+                self.revealed_strengths[kind[0]] = kind[1]
+            elif card.card_id in _effect_card_ids:
+                self.revealed_effect = card.card_id
+
+    def round_passed(self, bottom_player: bool) -> None:
+        self._moved(bottom_player)
+
+    def _moved(self, bottom_player: bool) -> None:
+        if self.first is None:
+            self.first = int(bottom_player)
+
+    def _determinize(self, rnd: random.Random) -> SearchState:
+        """
+        Builds a state of the current game, the unknown cards are sampled: the order of the own
+        deck and the hand and deck of the opponent (from the booster distribution, with the
+        strengths the opponent revealed).
+        """
+        board = self.board
+        player = int(self.bottom_player)
+        opponent = 1 - player
+        state = SearchState()
+        hands = [None, None]
+        decks = [None, None]
+        hands[player] = [card.card_id for card in board.get_hand(self.bottom_player)]
+        decks[player] = [card.card_id for card in board.get_deck(self.bottom_player)]
+        rnd.shuffle(decks[player])
+        # one booster for the opponent, like deck_sampler.sample_decks
+        booster = []
+        for kind, card_ids in enumerate(UNIT_CARD_IDS.tolist()):
+            strength_index = self.revealed_strengths.get(kind)
+            if strength_index is None:
+                strength_index = _pick(_strength_weights, rnd.random())
+            booster.append(card_ids[strength_index])
+        booster.append(self.revealed_effect or _effect_card_ids[int(rnd.random() * len(_effect_card_ids))])
+        hand_size = len(board.get_hand(not self.bottom_player))
+        unknown = hand_size + len(board.get_deck(not self.bottom_player))
+        cards = [booster[_pick(_card_weights, rnd.random())] for _ in range(unknown)]
+        hands[opponent] = cards[:hand_size]
+        decks[opponent] = cards[hand_size:]
+        state.hands = hands
+        state.decks = decks
+        state.scores = [board.get_row_score(bottom_player, row)
+                        for bottom_player in (False, True) for row in (Row.FRONT, Row.WISE, Row.SUPPORT)]
+        state.passed = [board.has_passed(False), board.has_passed(True)]
+        state.rounds_won = [board.get_rounds_won(False), board.get_rounds_won(True)]
+        state.round_number = board.round_number
+        state.first = player if self.first is None else self.first
+        state.to_move = player
+        state.over = False
+        return state
+
+    def search(self) -> int:
+        """
+        Searches the best action for the current position of the board.
+
+        Returns:
+            int: PASS or card id << 2 | row slot
+        """
+        _update_card_tables()
+        if len(self.table) > self.max_table_size:
+            self.table.clear()
+        # the random module is much faster for single numbers, it is seeded from the generator of the player
+        rnd = random.Random(int(self.rng.integers(2**63)))
+        player = int(self.bottom_player)
+        table = self.table
+        exploration = self.exploration
+        start = time.perf_counter()
+        deadline = None if self.time_budget is None else start + self.time_budget
+        playouts = 0
+        while True:
+            if self.playouts is not None and playouts >= self.playouts:
+                break
+            # the clock is read every 16 playouts
+            if deadline is not None and playouts % 16 == 0 and time.perf_counter() >= deadline and playouts:
+                break
+            state = self._determinize(rnd)
+            path = []
+            # selection and expansion, the actions are the ones available in this determinization
+            while not state.over:
+                stats = table.get(state.get_key(player))
+                if stats is None:
+                    stats = table[state.get_key(player)] = {}
+                actions = state.get_actions()
+                untried = [action for action in actions if action not in stats]
+                for action in actions:
+                    if action in stats:
+                        stats[action][2] += 1
+                if untried:
+                    action = untried[int(rnd.random() * len(untried))]
+                    stats[action] = [0, 0.0, 1]
+                    path.append((stats[action], state.to_move))
+                    state.apply(action)
+                    break
+                best_action, best_value = PASS, -1.0
+                for action in actions:
+                    visits, wins, available = stats[action]
+                    value = wins / visits + exploration * math.sqrt(math.log(available) / visits)
+                    if value > best_value:
+                        best_action, best_value = action, value
+                path.append((stats[best_action], state.to_move))
+                state.apply(best_action)
+            state.playout(rnd)
+            result = state.get_result(player)
+            for action_stats, mover in path:
+                action_stats[0] += 1
+                action_stats[1] += result if mover == player else 1.0 - result
+            playouts += 1
+        self.last_playouts = playouts
+        self.last_duration = time.perf_counter() - start
+        root = self._determinize(rnd)
+        stats = table[root.get_key(player)]
+        return max(root.get_actions(), key=lambda action: (stats.get(action, (0,))[0], action))
+
+    def make_choice(self, valid_choices, action=None) -> int:
+        """
+        Searches a move, the action of the env is ignored.
+
+        Returns:
+            int: index of the chosen card in the hand + 1, 0 to pass
+        """
+        if not valid_choices:
+            return PASS
+        action = self.search()
+        if action == PASS:
+            return PASS
+        card_id = action >> 2
+        # row slots are the row values - 1
+        self.hero_row = Row((action & 3) + 1) if _card_slots[card_id] == HERO_SLOT else None
+        hand = self.board.get_hand(self.bottom_player)
+        return next(index for index, card in enumerate(hand) if card.card_id == card_id) + 1
+
+    def make_row_choice(self, card, row_choices: list[Row]) -> Row:
+        if self.hero_row in row_choices:
+            return self.hero_row
+        return row_choices[self.rng.integers(len(row_choices))]
+
+
+def _pick(cumulative_weights: list[float], number: float) -> int:
+    """Returns the index of the weight the number in [0, 1) falls into"""
+    for index, weight in enumerate(cumulative_weights):
+        if number < weight:
+            return index
+    return len(cumulative_weights) - 1
+
+
+# Example usage
+if __name__ == '__main__':
+    from src.tournament import play_pairings
+    # the search has to beat the random player clearly
+    (_, _, wins, draws, losses), = play_pairings(["search", "random"], [(0, 1, 20, 0)])
+    assert wins > 3 * losses, (wins, draws, losses)
+    # a clone is independent of the state it was cloned from
+    player = SearchPlayer("Player", np.random.default_rng(0))
+    from src.board import Board
+    board = Board("top_player", "bottom_player")
+    board.reset()
+    for bottom_player, deck in ((True, [1, 2, 3, 21, 4, 5]), (False, [6, 7, 8, 22, 9, 10])):
+        board.set_deck_ids(bottom_player, np.array(deck))
+        board.draw_cards_to_hand(bottom_player, 4)
+    player.sit_down(board, True)
+    _update_card_tables()
+    state = player._determinize(random.Random(0))
+    clone = state.clone()
+    clone.apply(clone.get_actions()[1])
+    assert len(state.hands[1]) == 4 and len(clone.hands[1]) == 3
+    assert 0 <= player.make_choice(board.get_valid_choices(True)) <= 4 and player.last_playouts == 1000
@@ -0,0 +1,257 @@
+"""Module that provides the bulk self-play simulation, it writes the transitions of many games as sharded .npy files
+
+The games are split into shards of games_per_shard games. Every shard is played by a worker
+process with its own seed (derived from the seed of the run) and written into its own
+directory shard_<number>/ with observations.npy, actions.npy, rewards.npy and dones.npy.
+A shard is written into shard_<number>.tmp/ and renamed when it is complete, so a stopped
+run can be started again: finished shards are kept and only the missing ones are played.
+"""
+import os
+import json
+import time
+import shutil
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# local imports
+from src.player import Player, ArtificialRetardation
+from src.search_player import SearchPlayer
+from src.game_controller import Game_Controller
+
+# players the games can be simulated with, created as player_class(name, rng)
+PLAYERS = {
+    "random": ArtificialRetardation,
+    "search": SearchPlayer,
+}
+GAMES_PER_SHARD = 10000
+MANIFEST = "simulation.json"
+# expected transitions per game, the buffers of a shard grow if it is not enough
+TRANSITIONS_PER_GAME = 32
+
+
+class _Seat:
+    """Seat of a player in a simulated game.
+
+    The Game_Controller hands the action of the agent to both players, in the simulation
+    every player decides on its own. The seat ignores the action of the env and remembers
+    the choice of its player, which is the action of the transition.
+    """
+    def __init__(self, player: Player):
+        self.player = player
+        self.name = player.name
+        self.action = 0
+
+    @property
+    def rng(self) -> np.random.Generator:
+        return self.player.rng
+
+    @rng.setter
+    def rng(self, rng: np.random.Generator) -> None:
+        self.player.rng = rng
+
+    def make_choice(self, valid_choices: list[int], action=None) -> int:
+        self.action = self.player.make_choice(valid_choices)
+        return self.action
+
+    def make_row_choice(self, card, row_choices):
+        return self.player.make_row_choice(card, row_choices)
+
+    def sit_down(self, board, bottom_player: bool) -> None:
+        self.player.sit_down(board, bottom_player)
+
+
+def shard_seeds(seed: int, num_shards: int) -> list[int]:
+    """
+    Derives the seeds of the shards, shard i always gets the same seed for the same run seed.
+
+    Args:
+        seed (int): seed of the run
+        num_shards (int): number of shards
+
+    Returns:
+        list[int]: one seed per shard
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(num_shards)]
+
+
+def simulate_shard(directory: str, shard: int, seed: int, num_games: int, agent: str, opponent: str,
+                   board_backend: str = "dict") -> int:
+    """
+    Plays the games of one shard and writes their transitions.
+    The observations are the ones the agent gets (the top player), the actions are the choices
+    of the agent (0 = pass, k = card k-1, 0 if it had passed already), the rewards and dones
+    are the ones of the env.
+
+    Args:
+        directory (str): output directory of the run
+        shard (int): number of the shard
+        seed (int): seed of the shard
+        num_games (int): number of games
+        agent (str): key of PLAYERS for the agent
+        opponent (str): key of PLAYERS for the opponent
+        board_backend (str, optional): board implementation, see BOARD_BACKENDS
+
+    Returns:
+        int: number of written transitions
+    """
+    env = Game_Controller(True, board_backend=board_backend, copy_observations=False)
+    agent_seat = _Seat(PLAYERS[agent]("Agent", env.np_random))
+    env.seats = [agent_seat, _Seat(PLAYERS[opponent]("Opponent", env.np_random))]
+    for seat, bottom_player in zip(env.seats, (False, True)):
+        seat.sit_down(env.board, bottom_player)
+    env._seat_players()
+    capacity = num_games * TRANSITIONS_PER_GAME
+    observations = np.empty((capacity, env.observation_space.shape[0]), dtype=np.uint8)
+    actions = np.empty(capacity, dtype=np.uint8)
+    rewards = np.empty(capacity, dtype=np.float32)
+    dones = np.empty(capacity, dtype=np.bool_)
+    size = 0
+    observation, _ = env.reset(seed=seed)
+    for _ in range(num_games):
+        done = False
+        while not done:
+            if size == capacity:
+                capacity *= 2
+                observations = np.resize(observations, (capacity, observations.shape[1]))
+                actions, rewards, dones = (np.resize(array, capacity) for array in (actions, rewards, dones))
+            observations[size] = observation
+            agent_seat.action = 0
+            observation, reward, terminated, truncated, _ = env.step(None)
+            done = terminated or truncated
+            actions[size] = agent_seat.action
+            rewards[size] = reward
+            dones[size] = done
+            size += 1
+        observation, _ = env.reset()
+    env.close()
+
+    shard_dir = os.path.join(directory, f"shard_{shard:06d}")
+    temp_dir = shard_dir + ".tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    for name, array in (("observations", observations), ("actions", actions), ("rewards", rewards), ("dones", dones)):
+        np.save(os.path.join(temp_dir, name + ".npy"), array[:size])
+    # the shard only counts as done when the directory has its final name
+    os.replace(temp_dir, shard_dir)
+    return size
+
+
+def _load_manifest(directory: str, settings: dict) -> dict:
+    """
+    Reads the settings of a started run or writes them for a new one. A run can only be
+    continued with the same settings, otherwise the shards would not fit together.
+
+    Args:
+        directory (str): output directory of the run
+        settings (dict): settings of this call, a seed of None is replaced by fresh entropy
+
+    Returns:
+        dict: settings of the run
+    """
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        for key, value in settings.items():
+            if key not in ("seed", "num_shards") and manifest[key] != value:
+                raise ValueError(f"{directory} holds a run with {key}={manifest[key]}, not {value}")
+            if key == "seed" and value is not None and manifest[key] != value:
+                raise ValueError(f"{directory} holds a run with seed={manifest[key]}, not {value}")
+        # more games can be added to a run
+        manifest["num_shards"] = max(manifest["num_shards"], settings["num_shards"])
+    else:
+        manifest = dict(settings)
+        if manifest["seed"] is None:
+            manifest["seed"] = int(np.random.SeedSequence().entropy % 2**63)
+    with open(path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def simulate(directory: str, num_games: int, agent: str = "random", opponent: str = "random",
+             num_workers: int | None = None, games_per_shard: int = GAMES_PER_SHARD, seed: int | None = None,
+             board_backend: str = "dict") -> int:
+    """
+    Simulates games in worker processes and writes their transitions as shards into directory.
+    num_games is rounded up to whole shards. Shards that are already there are not played again.
+
+    Args:
+        directory (str): output directory, it is created if needed
+        num_games (int): number of games
+        agent (str, optional): key of PLAYERS for the agent
+        opponent (str, optional): key of PLAYERS for the opponent
+        num_workers (int, optional): number of worker processes. Defaults to the number of CPU cores.
+        games_per_shard (int, optional): games per shard
+        seed (int, optional): seed of the run, fresh entropy if None. A continued run keeps its seed.
+        board_backend (str, optional): board implementation, see BOARD_BACKENDS
+
+    Returns:
+        int: number of transitions written by this call
+    """
+    for player in (agent, opponent):
+        if player not in PLAYERS:
+            raise ValueError(f"Unknown player {player}, choose one of {list(PLAYERS)}")
+    os.makedirs(directory, exist_ok=True)
+    manifest = _load_manifest(directory, {
+        "seed": seed,
+        "agent": agent,
+        "opponent": opponent,
+        "games_per_shard": games_per_shard,
+        "board_backend": board_backend,
+        "num_shards": -(-num_games // games_per_shard),
+    })
+    seeds = shard_seeds(manifest["seed"], manifest["num_shards"])
+    missing = [shard for shard in range(len(seeds))
+               if not os.path.isdir(os.path.join(directory, f"shard_{shard:06d}"))]
+    print(f"{len(seeds) - len(missing)} of {len(seeds)} shards done, simulating {len(missing)}")
+    written = 0
+    start = time.perf_counter()
+    num_workers = min(num_workers or os.cpu_count() or 1, max(len(missing), 1))
+    with ProcessPoolExecutor(num_workers, mp_context=mp.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(simulate_shard, directory, shard, seeds[shard], games_per_shard, agent, opponent,
+                            board_backend): shard
+            for shard in missing
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            written += future.result()
+            elapsed = time.perf_counter() - start
+            print(f"Shard {futures[future]} done ({done}/{len(missing)}), "
+                  f"{written} transitions, {written / elapsed:.0f} transitions/s")
+    return written
+
+
+def load_shard(directory: str, shard: int, mmap_mode: str | None = "r") -> dict[str, np.ndarray]:
+    """
+    Loads the transitions of a shard, memory mapped by default.
+
+    Args:
+        directory (str): output directory of the run
+        shard (int): number of the shard
+        mmap_mode (str, optional): mmap_mode of np.load, None loads the arrays into memory
+
+    Returns:
+        dict[str, np.ndarray]: observations, actions, rewards and dones
+    """
+    shard_dir = os.path.join(directory, f"shard_{shard:06d}")
+    return {
+        name: np.load(os.path.join(shard_dir, name + ".npy"), mmap_mode=mmap_mode)
+        for name in ("observations", "actions", "rewards", "dones")
+    }
+
+
+# Example usage
+if __name__ == '__main__':
+    import tempfile
+    with tempfile.TemporaryDirectory() as temp_dir:
+        written = simulate(temp_dir, 50, num_workers=2, games_per_shard=20, seed=0)
+        shards = [load_shard(temp_dir, shard) for shard in range(3)]
+        assert written == sum(len(shard["actions"]) for shard in shards)
+        assert all(shard["dones"].sum() == 20 and shard["dones"][-1] for shard in shards)
+        # a stopped run only plays the missing shards, with the same seeds
+        first_shard = {name: array.copy() for name, array in shards[1].items()}
+        shutil.rmtree(os.path.join(temp_dir, "shard_000001"))
+        assert simulate(temp_dir, 50, num_workers=1, games_per_shard=20) == len(first_shard["actions"])
+        assert all(np.array_equal(load_shard(temp_dir, 1)[name], array) for name, array in first_shard.items())
+        assert simulate(temp_dir, 50, games_per_shard=20) == 0
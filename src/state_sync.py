@@ -0,0 +1,401 @@
+"""Module that provides a compact binary protocol to keep a copy of a board in sync with it
+
+A client gets a snapshot of the whole board when it joins, after that only deltas of the
+changes: a card moved from the deck to the hand, a card played from the hand into a row,
+a passed flag set... The StateEncoder follows the board as observer and writes the messages,
+the StateDecoder replays them with the mutation methods of another board (Board or ArrayBoard),
+so the copy goes through the same code as the original and ends up in the same state.
+
+Every message starts with a header of two fields:
+    kind (u8): kind of the message, the highest bit is set if it is about the bottom player
+    seq (u32): sequence number, deltas are numbered without gaps (a snapshot has the number
+               of the last delta it includes)
+followed by the body of the kind. Lists of cards are written as count (u8) and card ids (u8 each).
+Messages are bytes objects, the transport has to frame them (e.g. with a length prefix).
+"""
+from collections import deque
+import struct
+import numpy as np
+# local imports
+from src.row import Row
+from src.cards import EffectCard, get_card
+from src.board_observer import BoardObserver
+
+HEADER = struct.Struct("<BI")
+BOTTOM_PLAYER_FLAG = 0x80
+# kinds of messages
+SNAPSHOT = 0     # round number, then per player: passed, rounds won, deck, hand, rows, graveyard
+RESET = 1        # no body
+DECK_SET = 2     # cards of the deck
+HAND_SET = 3     # cards of the hand
+DRAW = 4         # number of cards drawn from the deck (u8)
+PLAY = 5         # index of the card in the hand (u8), value of the row (u8, 0 for effect cards)
+PASS = 6         # no body
+END_ROUND = 7    # no body
+# rows in the order of the half boards
+ROWS = (Row.FRONT, Row.WISE, Row.SUPPORT, Row.EFFECTS)
+# number of deltas the encoder keeps to catch up clients that missed some
+HISTORY_SIZE = 1024
+
+
+class ResyncError(Exception):
+    """Raised if a delta does not follow the last applied message, the client needs a snapshot"""
+
+
+def _card_ids(cards) -> list[int]:
+    return [card.card_id for card in cards]
+
+
+def _pack_cards(card_ids: list[int]) -> bytes:
+    return bytes([len(card_ids)]) + bytes(card_ids)
+
+
+def _unpack_cards(data: bytes, offset: int) -> tuple[list[int], int]:
+    count = data[offset]
+    return list(data[offset + 1:offset + 1 + count]), offset + 1 + count
+
+
+def _header(kind: int, bottom_player: bool, seq: int) -> bytes:
+    return HEADER.pack(kind | (BOTTOM_PLAYER_FLAG if bottom_player else 0), seq)
+
+
+def encode_snapshot(board, seq: int = 0) -> bytes:
+    """
+    Method to write the whole state of a board into one message.
+
+    Args:
+        board (Board | ArrayBoard): board to write
+        seq (int, optional): sequence number of the last delta the snapshot includes
+
+    Returns:
+        bytes: snapshot message
+    """
+    parts = [_header(SNAPSHOT, False, seq), bytes([board.round_number])]
+    for bottom_player in (False, True):
+        parts.append(bytes([board.has_passed(bottom_player), board.get_rounds_won(bottom_player)]))
+        parts.append(_pack_cards(_card_ids(board.get_deck(bottom_player))))
+        parts.append(_pack_cards(_card_ids(board.get_hand(bottom_player))))
+        half_board = board.get_half_board(bottom_player)
+        for row in ROWS:
+            parts.append(_pack_cards(_card_ids(half_board[row])))
+        parts.append(_pack_cards(_card_ids(board.get_graveyard(bottom_player))))
+    return b"".join(parts)
+
+
+def load_snapshot(board, message: bytes) -> int:
+    """
+    Method to set a board to the state of a snapshot. Only the mutation methods of the
+    board are used: the cards on the rows are put into the hand and played again.
+
+    Args:
+        board (Board | ArrayBoard): board to set
+        message (bytes): snapshot message written by encode_snapshot
+
+    Returns:
+        int: sequence number of the snapshot
+    """
+    kind, seq = HEADER.unpack_from(message)
+    if kind != SNAPSHOT:
+        raise ValueError(f"Message of kind {kind} is not a snapshot")
+    offset = HEADER.size
+    round_number = message[offset]
+    offset += 1
+    rounds_won = []
+    graveyards = []
+    board.reset()
+    for bottom_player in (False, True):
+        passed, won = message[offset], message[offset + 1]
+        offset += 2
+        deck, offset = _unpack_cards(message, offset)
+        hand, offset = _unpack_cards(message, offset)
+        played = []
+        for row in ROWS:
+            cards, offset = _unpack_cards(message, offset)
+            played += [(card_id, row) for card_id in cards]
+        graveyard, offset = _unpack_cards(message, offset)
+        board.set_deck_ids(bottom_player, np.array(deck, dtype=np.int16))
+        # the played cards are in front of the hand and played one after the other
+        board.set_hand(bottom_player, [get_card(card_id) for card_id, _ in played] + [get_card(card_id) for card_id in hand])
+        for _, row in played:
+            board.play_card(bottom_player, 0, row)
+        if passed:
+            board.pass_round(bottom_player)
+        rounds_won.append(won)
+        graveyards.append(graveyard)
+    board.set_round_state(round_number, tuple(rounds_won), tuple(graveyards))
+    return seq
+
+
+class StateEncoder(BoardObserver):
+    """Writes every change of a board as delta message, registered as observer of the board.
+
+    Cards drawn by an effect card are not sent, the client draws them itself when it plays
+    the card. A shuffled deck is sent again before the cards are drawn from it.
+    """
+    def __init__(self, board, history_size: int = HISTORY_SIZE):
+        """
+        Registers at the board.
+
+        Args:
+            board (Board | ArrayBoard): board that is followed
+            history_size (int, optional): number of deltas kept for get_deltas_since
+        """
+        self.board = board
+        self.seq = 0
+        # (seq, message) of the last deltas
+        self.history = deque(maxlen=history_size)
+        # deltas since the last take
+        self.outbox = []
+        # draw that is not sent yet, it could belong to an effect card: (bottom_player, num_cards, deck size before)
+        self.pending_draw = None
+        board.add_observer(self)
+        self._set_mirrors()
+
+    def _set_mirrors(self) -> None:
+        # the deck order the client has, to notice shuffles
+        self.decks = [_card_ids(self.board.get_deck(bottom_player)) for bottom_player in (False, True)]
+
+    def _emit(self, kind: int, bottom_player: bool = False, body: bytes = b"") -> None:
+        if self.pending_draw is not None:
+            self._flush_draw()
+        self._append(kind, bottom_player, body)
+
+    def _append(self, kind: int, bottom_player: bool, body: bytes) -> None:
+        self.seq += 1
+        if kind == SNAPSHOT:
+            message = encode_snapshot(self.board, self.seq)
+        else:
+            message = _header(kind, bottom_player, self.seq) + body
+        self.history.append((self.seq, message))
+        self.outbox.append(message)
+
+    def _flush_draw(self) -> None:
+        bottom_player, num_cards, _ = self.pending_draw
+        self.pending_draw = None
+        self._append(DRAW, bottom_player, bytes([num_cards]))
+
+    def take(self) -> list[bytes]:
+        """
+        Method to get the deltas since the last call, to send them to every client.
+
+        Returns:
+            list[bytes]: delta messages in order
+        """
+        if self.pending_draw is not None:
+            self._flush_draw()
+        messages, self.outbox = self.outbox, []
+        return messages
+
+    def snapshot(self) -> bytes:
+        """
+        Method to get the snapshot for a joining client, the deltas of the next take follow it.
+
+        Returns:
+            bytes: snapshot message
+        """
+        if self.pending_draw is not None:
+            self._flush_draw()
+        return encode_snapshot(self.board, self.seq)
+
+    def get_deltas_since(self, seq: int) -> list[bytes] | None:
+        """
+        Method to get the deltas a client missed, e.g. after a ResyncError.
+
+        Args:
+            seq (int): sequence number of the last message the client applied
+
+        Returns:
+            list[bytes] | None: deltas after seq, None if they are not kept anymore (send a snapshot)
+        """
+        if self.pending_draw is not None:
+            self._flush_draw()
+        if seq == self.seq:
+            return []
+        if not self.history or self.history[0][0] > seq + 1 or seq > self.seq:
+            return None
+        return [message for message_seq, message in self.history if message_seq > seq]
+
+    def board_reset(self) -> None:
+        self._emit(RESET)
+        self._set_mirrors()
+
+    def board_restored(self) -> None:
+        self._emit(SNAPSHOT)
+        self._set_mirrors()
+
+    def deck_set(self, bottom_player: bool) -> None:
+        deck = _card_ids(self.board.get_deck(bottom_player))
+        self.decks[int(bottom_player)] = deck
+        self._emit(DECK_SET, bottom_player, _pack_cards(deck))
+
+    def hand_set(self, bottom_player: bool) -> None:
+        self._emit(HAND_SET, bottom_player, _pack_cards(_card_ids(self.board.get_hand(bottom_player))))
+
+    def cards_drawn(self, bottom_player: bool, cards) -> None:
+        player = int(bottom_player)
+        drawn = _card_ids(cards)
+        deck = drawn + _card_ids(self.board.get_deck(bottom_player))
+        if deck != self.decks[player]:
+            # the deck was shuffled, the client gets the new order before drawing
+            self._emit(DECK_SET, bottom_player, _pack_cards(deck))
+        elif self.pending_draw is not None:
+            self._flush_draw()
+        self.decks[player] = deck[len(drawn):]
+        self.pending_draw = (bottom_player, len(drawn), len(deck))
+
+    def card_played(self, bottom_player: bool, card_index: int, card, row: Row | None) -> None:
+        if isinstance(card, EffectCard) and self.pending_draw is not None:
+            pending_player, num_cards, deck_size = self.pending_draw
+            # the effect draws the same cards on the client. If the draw was not done by the effect,
+            # the effect drew nothing from the emptied deck, which ends in the same state as well
+            if pending_player == bottom_player and num_cards == min(deck_size, getattr(card, "num_card", 0)):
+                self.pending_draw = None
+        self._emit(PLAY, bottom_player, bytes([card_index, row.value if row is not None else 0]))
+
+    def round_passed(self, bottom_player: bool) -> None:
+        self._emit(PASS, bottom_player)
+
+    def round_ended(self) -> None:
+        self._emit(END_ROUND)
+
+
+class StateDecoder:
+    """Applies the messages of a StateEncoder to a board, the copy of the followed board"""
+    def __init__(self, board):
+        """
+        Args:
+            board (Board | ArrayBoard): board the messages are applied to
+        """
+        self.board = board
+        # sequence number of the last applied message, None until the first snapshot
+        self.seq = None
+
+    def apply(self, message: bytes) -> None:
+        """
+        Method to apply a snapshot or delta message. Deltas that are already
+        included (sequence number not newer than the last one) are skipped.
+
+        Args:
+            message (bytes): message of a StateEncoder
+
+        Raises:
+            ResyncError: if a delta does not follow the last applied message
+        """
+        kind, seq = HEADER.unpack_from(message)
+        bottom_player = bool(kind & BOTTOM_PLAYER_FLAG)
+        kind &= ~BOTTOM_PLAYER_FLAG
+        if kind == SNAPSHOT:
+            self.seq = load_snapshot(self.board, message)
+            return
+        if self.seq is None or seq > self.seq + 1:
+            raise ResyncError(f"Got delta {seq}, but the last applied message is {self.seq}")
+        if seq <= self.seq:
+            return
+        body = message[HEADER.size:]
+        board = self.board
+        if kind == RESET:
+            board.reset()
+        elif kind == DECK_SET:
+            board.set_deck_ids(bottom_player, np.array(_unpack_cards(body, 0)[0], dtype=np.int16))
+        elif kind == HAND_SET:
+            board.set_hand(bottom_player, [get_card(card_id) for card_id in _unpack_cards(body, 0)[0]])
+        elif kind == DRAW:
+            board.draw_cards_to_hand(bottom_player, body[0])
+        elif kind == PLAY:
+            board.play_card(bottom_player, body[0], Row(body[1]) if body[1] else None)
+        elif kind == PASS:
+            board.pass_round(bottom_player)
+        elif kind == END_ROUND:
+            board.end_round()
+        else:
+            raise ValueError(f"Unknown kind of message {kind}")
+        self.seq = seq
+
+
+# Example usage
+if __name__ == '__main__':
+    from src.board import Board
+    from src.array_board import ArrayBoard
+    from src.deck_sampler import sample_decks
+
+    def play_random(board, rng, num_moves) -> None:
+        bottom_player = bool(rng.integers(2))
+        for _ in range(num_moves):
+            if board.game_ended():
+                return
+            hand = board.get_hand(bottom_player)
+            if hand and not board.has_passed(bottom_player) and rng.random() > 0.15:
+                card_index = int(rng.integers(len(hand)))
+                card = hand[card_index]
+                board.play_card(bottom_player, card_index, Row.FRONT if card.type == Row.ANY else card.type)
+            else:
+                board.pass_round(bottom_player)
+            if board.has_passed(True) and board.has_passed(False):
+                board.end_round()
+                board.draw_cards_to_hand(True, shuffle=bool(rng.integers(2)))
+                board.draw_cards_to_hand(False)
+            bottom_player = not bottom_player
+
+    rng = np.random.default_rng(0)
+    delta_sizes = []
+    snapshot_sizes = []
+    for server_backend in (Board, ArrayBoard):
+        for client_backend in (Board, ArrayBoard):
+            for game in range(50):
+                server = server_backend("top", "bottom", rng=np.random.default_rng(game))
+                encoder = StateEncoder(server)
+                for player, deck in zip((True, False), sample_decks(rng, 2)):
+                    server.set_deck_ids(player, deck)
+                    server.draw_cards_to_hand(player, 10, shuffle=True)
+                # one client joins at the start, one in the middle of the game
+                client = client_backend("top", "bottom")
+                clients = [(client, StateDecoder(client))]
+                clients[0][1].apply(encoder.snapshot())
+                encoder.take()
+                while not server.game_ended():
+                    play_random(server, rng, int(rng.integers(1, 4)))
+                    if rng.random() < 0.1:
+                        # the server looks ahead and takes the moves back
+                        server.push()
+                        play_random(server, rng, 3)
+                        server.pop()
+                    if len(clients) == 1 and rng.random() < 0.2:
+                        late_board = client_backend("top", "bottom")
+                        clients.append((late_board, StateDecoder(late_board)))
+                        clients[1][1].apply(encoder.snapshot())
+                    deltas = encoder.take()
+                    delta_sizes += [len(message) for message in deltas if message[0] != SNAPSHOT]
+                    snapshot = encoder.snapshot()
+                    snapshot_sizes.append(len(snapshot))
+                    for client, decoder in clients:
+                        for message in deltas:
+                            decoder.apply(message)
+                        # the copy is in the same state (and has the same hash)
+                        assert encode_snapshot(client, encoder.seq) == snapshot, game
+                        assert client.get_hash() == server.get_hash(), game
+
+    # guard: a missing delta is noticed, the client catches up with the kept deltas or a snapshot
+    server = Board("top", "bottom", rng=np.random.default_rng(1))
+    encoder = StateEncoder(server, history_size=4)
+    client = ArrayBoard("top", "bottom")
+    decoder = StateDecoder(client)
+    decoder.apply(encoder.snapshot())
+    for player, deck in zip((True, False), sample_decks(rng, 2)):
+        server.set_deck_ids(player, deck)
+        server.draw_cards_to_hand(player, 10)
+    deltas = encoder.take()
+    try:
+        decoder.apply(deltas[1])
+        assert False, "a gap has to raise a ResyncError"
+    except ResyncError:
+        pass
+    for message in encoder.get_deltas_since(decoder.seq):
+        decoder.apply(message)
+    assert encode_snapshot(client, encoder.seq) == encoder.snapshot()
+    play_random(server, rng, 10)
+    encoder.take()
+    assert encoder.get_deltas_since(decoder.seq) is None
+    decoder.apply(encoder.snapshot())
+    assert encode_snapshot(client, encoder.seq) == encoder.snapshot()
+
+    print(f"delta: {np.mean(delta_sizes):.1f} bytes on average, snapshot: {np.mean(snapshot_sizes):.1f} bytes on average")
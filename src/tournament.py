@@ -0,0 +1,402 @@
+"""Module that provides a round-robin tournament between agents with Elo ratings
+
+Agents are given as specs: a key of PLAYERS (e.g. "random" for the ArtificialRetardation),
+a saved model (QRDQN_Agent_<fitness>, with or without .zip) or a saved policy (Champion_Policy).
+Every pairing plays its games in a worker process. The games of a pairing run side by side,
+so every decision of a model agent is made in one batched predict call.
+
+Run with python -m src.tournament <agent> <agent> ... [--games 100] [--workers 4]
+"""
+import os
+import json
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# local imports
+from src.row import Row
+from src.board import Board
+from src.observation import ObservationBuffer
+from src.deck_sampler import sample_decks
+from src.simulate import PLAYERS
+from src.inference import load_policy, get_action_mask
+
+START_HAND_SIZE = 10
+ROUND_DRAW = 2
+# games are truncated (and count as draw) after this many steps, like in the Game_Controller
+MAX_STEPS = 100
+ELO_BASE = 1500
+# virtual draws every pairing starts with, keeps the rating of an agent that never won finite
+PRIOR_DRAWS = 1.0
+CONFIDENCE = 0.95
+
+# agents loaded by a worker process, by spec
+_agents = {}
+
+
+class PlayerAgent:
+    """Agent that lets a Player of PLAYERS choose, every game gets its own player"""
+    def __init__(self, player_class):
+        self.player_class = player_class
+
+    def sit_down(self, match: "Match", bottom_player: bool) -> None:
+        player = self.player_class("Player", match.rng)
+        player.sit_down(match.board, bottom_player)
+        match.players[int(bottom_player)] = player
+
+    def act(self, matches: list["Match"]) -> list[int]:
+        return [
+            match.players[int(match.seat)].make_choice(match.board.get_valid_choices(match.seat))
+            for match in matches
+        ]
+
+
+class PolicyAgent:
+    """Agent that predicts the actions of all waiting games with one call of a saved model or policy"""
+    def __init__(self, path: str):
+        import torch as th
+        # the workers already run in parallel
+        th.set_num_threads(1)
+        # maskable policies are given the valid actions of every match
+        self.policy, self.masked = load_policy(path)
+        self.policy.set_training_mode(False)
+
+    def sit_down(self, match: "Match", bottom_player: bool) -> None:
+        pass
+
+    def act(self, matches: list["Match"]) -> list[int]:
+        observations = np.stack([match.get_observation() for match in matches])
+        if self.masked:
+            action_masks = np.stack([match.get_action_mask() for match in matches])
+            actions, _ = self.policy.predict(observations, deterministic=True, action_masks=action_masks)
+        else:
+            actions, _ = self.policy.predict(observations, deterministic=True)
+        return actions.tolist()
+
+
+def load_agent(spec: str) -> PlayerAgent | PolicyAgent:
+    """
+    Creates the agent of a spec.
+
+    Args:
+        spec (str): key of PLAYERS or path of a saved model (.zip may be left out) or policy
+
+    Returns:
+        PlayerAgent | PolicyAgent: the agent
+    """
+    if spec in PLAYERS:
+        return PlayerAgent(PLAYERS[spec])
+    for path in (spec, spec + ".zip"):
+        if os.path.isfile(path):
+            return PolicyAgent(path)
+    raise ValueError(f"Unknown agent {spec}, give a saved model or policy or one of {list(PLAYERS)}")
+
+
+class Match:
+    """One game between two agents, played with the rules of Game_Controller.step.
+
+    Unlike in the env every player chooses its own action (the card index + 1, 0 = pass)
+    from its own observation. The match waits for the choice of the player given by seat.
+    """
+    def __init__(self, top_agent: int, bottom_agent: int, top_deck: np.ndarray, bottom_deck: np.ndarray,
+                 coin_flip: bool, rng: np.random.Generator):
+        """
+        Args:
+            top_agent (int): index of the agent of the top player
+            bottom_agent (int): index of the agent of the bottom player
+            top_deck (np.ndarray): card ids of the deck of the top player
+            bottom_deck (np.ndarray): card ids of the deck of the bottom player
+            coin_flip (bool): if not coin flip the bottom player begins
+            rng (np.random.Generator): generator for the row choices of heroes
+        """
+        self.agents = (top_agent, bottom_agent)
+        # players (top, bottom) of agents that choose with a Player, they also choose the rows of heroes
+        self.players = [None, None]
+        self.rng = rng
+        self.board = Board("top_player", "bottom_player", rng)
+        self.board.reset()
+        self.observations = (ObservationBuffer(self.board), ObservationBuffer(self.board, bottom_player=True))
+        self.board.set_deck_ids(True, bottom_deck)
+        self.board.draw_cards_to_hand(True, START_HAND_SIZE)
+        self.board.set_deck_ids(False, top_deck)
+        self.board.draw_cards_to_hand(False, START_HAND_SIZE)
+        self.order = (not coin_flip, bool(coin_flip))
+        self.turn = 0
+        self.steps = 0
+        self.over = False
+
+    def start(self) -> None:
+        """Starts the game, after the agents took their seats"""
+        self._advance()
+
+    @property
+    def seat(self) -> bool:
+        """The player that has to choose, True for the bottom player"""
+        return self.order[self.turn]
+
+    @property
+    def agent(self) -> int:
+        """Index of the agent that has to choose"""
+        return self.agents[int(self.seat)]
+
+    def get_observation(self) -> np.ndarray:
+        """Returns the observation of the player that has to choose (a read-only view)"""
+        return self.observations[int(self.seat)].get_observation(copy=False)
+
+    def get_action_mask(self) -> np.ndarray:
+        """Returns the valid actions of the player that has to choose, see Game_Controller.action_masks"""
+        return get_action_mask(len(self.board.get_hand(self.seat)))
+
+    def play(self, action: int) -> None:
+        """
+        Plays the choice of the player that has to choose, invalid actions pass.
+
+        Args:
+            action (int): card index + 1, 0 to pass
+        """
+        bottom_player = self.seat
+        hand = self.board.get_hand(bottom_player)
+        if action < 1 or action > len(hand):
+            self.board.pass_round(bottom_player)
+        else:
+            row = hand[action - 1].type
+            if row == Row.ANY:
+                row_choices = [Row.FRONT, Row.WISE, Row.SUPPORT]
+                player = self.players[int(bottom_player)]
+                if player is not None:
+                    row = player.make_row_choice(hand[action - 1], row_choices)
+                else:
+                    row = row_choices[self.rng.integers(3)]
+            self.board.play_card(bottom_player, action - 1, row)
+        self.turn += 1
+        self._advance()
+
+    def _advance(self) -> None:
+        """Skips players that passed and finishes the step when both players had their turn"""
+        while True:
+            if self.turn == len(self.order):
+                self.steps += 1
+                if self.board.has_passed(True) and self.board.has_passed(False):
+                    self.board.end_round()
+                    self.board.draw_cards_to_hand(True, ROUND_DRAW)
+                    self.board.draw_cards_to_hand(False, ROUND_DRAW)
+                if self.board.game_ended() or self.steps == MAX_STEPS:
+                    self.over = True
+                    return
+                self.turn = 0
+            if not self.board.has_passed(self.seat):
+                return
+            self.turn += 1
+
+    def get_result(self) -> int:
+        """Returns 1 if the top agent won, -1 if the bottom agent won and 0 for a draw"""
+        return int(np.sign(self.board.get_rounds_won(False) - self.board.get_rounds_won(True)))
+
+
+def play_pairings(specs: list[str], pairings: list[tuple[int, int, int, int]]) -> list[tuple[int, int, int, int, int]]:
+    """
+    Plays the games of pairings side by side, the waiting games of an agent are decided together.
+    Every two games use the same decks and coin flip with swapped seats.
+
+    Args:
+        specs (list[str]): specs of all agents
+        pairings (list[tuple[int, int, int, int]]): (agent, opponent, number of games, seed)
+
+    Returns:
+        list[tuple[int, int, int, int, int]]: (agent, opponent, wins, draws, losses) of the agent per pairing
+    """
+    agents = {}
+    matches = []
+    for agent, opponent, num_games, seed in pairings:
+        for index in (agent, opponent):
+            if specs[index] not in _agents:
+                _agents[specs[index]] = load_agent(specs[index])
+            agents[index] = _agents[specs[index]]
+        rng = np.random.default_rng(seed)
+        decks = sample_decks(rng, num_games)
+        coin_flips = rng.integers(2, size=num_games // 2)
+        pairing_matches = []
+        for game in range(num_games // 2):
+            top_deck, bottom_deck = decks[2 * game], decks[2 * game + 1]
+            pairing_matches.append(Match(agent, opponent, top_deck, bottom_deck, coin_flips[game], rng))
+            pairing_matches.append(Match(opponent, agent, top_deck, bottom_deck, coin_flips[game], rng))
+        for match in pairing_matches:
+            agents[match.agents[0]].sit_down(match, False)
+            agents[match.agents[1]].sit_down(match, True)
+            match.start()
+        matches.append(pairing_matches)
+
+    active = [match for pairing_matches in matches for match in pairing_matches if not match.over]
+    while active:
+        waiting = {}
+        for match in active:
+            waiting.setdefault(match.agent, []).append(match)
+        for index, agent_matches in waiting.items():
+            for match, action in zip(agent_matches, agents[index].act(agent_matches)):
+                match.play(int(action))
+        active = [match for match in active if not match.over]
+
+    results = []
+    for (agent, opponent, _, _), pairing_matches in zip(pairings, matches):
+        # results from the view of agent, it is the top player in every second game
+        outcomes = [match.get_result() * (1 if match.agents[0] == agent else -1) for match in pairing_matches]
+        results.append((agent, opponent, outcomes.count(1), outcomes.count(0), outcomes.count(-1)))
+    return results
+
+
+def elo_ratings(wins: np.ndarray, draws: np.ndarray, prior_draws: float = PRIOR_DRAWS,
+                iterations: int = 1000) -> np.ndarray:
+    """
+    Fits Elo ratings to the results (Bradley-Terry maximum likelihood, a draw counts half).
+
+    Args:
+        wins (np.ndarray): wins[i, j] is the number of games agent i won against agent j
+        draws (np.ndarray): draws[i, j] is the number of draws between agent i and j
+        prior_draws (float, optional): virtual draws added to every pairing
+        iterations (int, optional): maximum number of iterations of the fit
+
+    Returns:
+        np.ndarray: Elo rating per agent, their mean is ELO_BASE
+    """
+    scores = wins + 0.5 * draws
+    games = scores + scores.T
+    played = ~np.eye(len(wins), dtype=bool)
+    scores = scores + 0.5 * prior_draws * played
+    games = games + prior_draws * played
+    strengths = np.ones(len(wins))
+    for _ in range(iterations):
+        new_strengths = scores.sum(axis=1) / (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+        new_strengths /= np.exp(np.log(new_strengths).mean())
+        if np.allclose(new_strengths, strengths, rtol=1e-9):
+            break
+        strengths = new_strengths
+    elo = 400 * np.log10(new_strengths)
+    return elo - elo.mean() + ELO_BASE
+
+
+def elo_intervals(wins: np.ndarray, draws: np.ndarray, seed: int | None = None, samples: int = 200,
+                  confidence: float = CONFIDENCE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Confidence intervals of the Elo ratings, by resampling the games of every pairing.
+
+    Args:
+        wins (np.ndarray): wins[i, j] is the number of games agent i won against agent j
+        draws (np.ndarray): draws[i, j] is the number of draws between agent i and j
+        seed (int, optional): seed of the resampling
+        samples (int, optional): number of resampled tournaments
+        confidence (float, optional): confidence level of the intervals
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: lower and upper bound per agent
+    """
+    rng = np.random.default_rng(seed)
+    upper = np.triu_indices(len(wins), 1)
+    counts = np.stack([wins[upper], draws[upper], wins.T[upper]], axis=1)
+    games = counts.sum(axis=1)
+    probabilities = counts / np.maximum(games, 1)[:, None]
+    probabilities[games == 0] = (0, 1, 0)
+    ratings = np.empty((samples, len(wins)))
+    for sample in range(samples):
+        resampled = rng.multinomial(games, probabilities)
+        sample_wins = np.zeros_like(wins)
+        sample_draws = np.zeros_like(draws)
+        sample_wins[upper] = resampled[:, 0]
+        sample_wins.T[upper] = resampled[:, 2]
+        sample_draws[upper] = sample_draws.T[upper] = resampled[:, 1]
+        ratings[sample] = elo_ratings(sample_wins, sample_draws)
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(ratings, tail, axis=0), np.percentile(ratings, 100 - tail, axis=0)
+
+
+def run_tournament(specs: list[str], games: int = 100, num_workers: int | None = None, seed: int = 0,
+                   games_per_task: int = 200) -> dict:
+    """
+    Plays a round-robin tournament: every pairing plays games games, half of them on each seat.
+
+    Args:
+        specs (list[str]): agents, see load_agent
+        games (int, optional): games per pairing, rounded up to an even number
+        num_workers (int, optional): number of worker processes, 1 plays in this process.
+        Defaults to the number of CPU cores.
+        seed (int, optional): seed of the tournament, the results do not depend on the number of workers
+        games_per_task (int, optional): games a worker plays side by side (pairings are not split)
+
+    Returns:
+        dict: agents, wins and draws matrices (wins[i][j]: games agent i won against agent j),
+        elo with lower and upper bound of its confidence interval
+    """
+    games += games % 2
+    pairings = [(agent, opponent) for agent in range(len(specs)) for opponent in range(agent + 1, len(specs))]
+    seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(len(pairings))]
+    pairings = [(agent, opponent, games, pairing_seed) for (agent, opponent), pairing_seed in zip(pairings, seeds)]
+    per_task = max(games_per_task // games, 1)
+    tasks = [pairings[start:start + per_task] for start in range(0, len(pairings), per_task)]
+    num_workers = min(num_workers or os.cpu_count() or 1, len(tasks))
+    results = []
+    if num_workers <= 1:
+        for task in tasks:
+            results += play_pairings(specs, task)
+    else:
+        with ProcessPoolExecutor(num_workers, mp_context=mp.get_context("spawn")) as executor:
+            futures = [executor.submit(play_pairings, specs, task) for task in tasks]
+            for future in as_completed(futures):
+                results += future.result()
+
+    wins = np.zeros((len(specs), len(specs)), dtype=np.int64)
+    draws = np.zeros_like(wins)
+    for agent, opponent, agent_wins, pairing_draws, opponent_wins in results:
+        wins[agent, opponent] = agent_wins
+        wins[opponent, agent] = opponent_wins
+        draws[agent, opponent] = draws[opponent, agent] = pairing_draws
+    lower, upper = elo_intervals(wins, draws, seed)
+    return {
+        "agents": list(specs),
+        "wins": wins.tolist(),
+        "draws": draws.tolist(),
+        "elo": elo_ratings(wins, draws).tolist(),
+        "elo_lower": lower.tolist(),
+        "elo_upper": upper.tolist(),
+    }
+
+
+def print_results(results: dict) -> None:
+    """Prints the ranking and the win matrix of a tournament"""
+    agents = results["agents"]
+    width = max(len(agent) for agent in agents)
+    print(f"{'rank':<6}{'agent':<{width + 2}}{'elo':>7}  {int(CONFIDENCE * 100)}% interval")
+    ranking = sorted(range(len(agents)), key=lambda index: -results["elo"][index])
+    for rank, index in enumerate(ranking, 1):
+        print(f"{rank:<6}{agents[index]:<{width + 2}}{results['elo'][index]:>7.0f}  "
+              f"[{results['elo_lower'][index]:.0f}, {results['elo_upper'][index]:.0f}]")
+    print("wins/draws/losses of the row agent against the column agent")
+    print(" " * (width + 3) + "".join(f"{rank:>12}" for rank in range(1, len(agents) + 1)))
+    for rank, index in enumerate(ranking, 1):
+        cells = "".join(
+            f"{'-':>12}" if index == opponent else
+            f"{results['wins'][index][opponent]:>4}/{results['draws'][index][opponent]}/{results['wins'][opponent][index]}".rjust(12)
+            for opponent in ranking
+        )
+        print(f"{rank:<3}{agents[index]:<{width}}{cells}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Round-robin tournament with Elo ratings")
+    parser.add_argument("agents", nargs="+", help=f"saved models or policies or one of {list(PLAYERS)}")
+    parser.add_argument("--games", type=int, default=100, help="games per pairing")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU cores")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this json file")
+    args = parser.parse_args()
+    if len(args.agents) < 2:
+        parser.error("a tournament needs at least two agents")
+    results = run_tournament(args.agents, args.games, args.workers, args.seed)
+    print_results(results)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as results_file:
+            json.dump(results, results_file, indent=2)
+
+
+# Example usage
+if __name__ == '__main__':
+    main()
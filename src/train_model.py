@@ -1,25 +1,245 @@
 # third party imports
 import time
+import secrets
+import tempfile
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
 import torch as th
 import os
-from sb3_contrib import QRDQN
+from sb3_contrib import QRDQN, MaskablePPO
+from sb3_contrib.common.maskable.evaluation import evaluate_policy as evaluate_masked_policy
 #from stable_baselines3 import PPO, DQN, A2C
 #from stable_baselines3.common.vec_env import VecFrameStack
 from stable_baselines3.common.evaluation import evaluate_policy
 from stable_baselines3.common.env_checker import check_env
 from stable_baselines3.common.logger import configure
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import VecMonitor
 
 # local imports
-from src.utils import get_path, get_int, get_bool
+from src.utils import get_path, get_int, get_bool, get_choice
+from src.env_pool import SharedMemoryVecEnv
+from src.game_controller import Game_Controller
+# the algorithms and the loading are imported from here by the training menu
+from src.algorithms import ALGORITHMS, get_algorithm, load_model
 
+def create_model(algorithm: str, env, learning_rate: float, train_freq=None, **kwargs):
+    """
+    Creates a new model to train on env.
 
+    Args:
+        algorithm (str): key of ALGORITHMS
+        env: env or vectorized env, MaskablePPO needs the action_masks method of the Game_Controller
+        learning_rate (float): learning rate
+        train_freq (optional): update interval of QRDQN, PPO updates after every rollout.
+            Defaults to every episode, on vectorized envs with several games to every step
+            (episodic training only works with one env)
+        kwargs: further arguments of the algorithm
 
-def mutate(params: dict[str, th.Tensor]) -> dict[str, th.Tensor]:
-    """Mutate parameters by adding normal noise to them"""
-    return dict((name, param + th.randn_like(param)) for name, param in params.items())
+    Returns:
+        the model
+    """
+    if algorithm == "MaskablePPO":
+        return MaskablePPO("MlpPolicy", env, learning_rate=learning_rate, verbose=1, **kwargs)
+    if train_freq is None:
+        train_freq = (1, "step") if getattr(env, "num_envs", 1) > 1 else (1, "episode")
+    return QRDQN("MlpPolicy",
+                 env,
+                 #ent_coef=0.0,
+                 #policy_kwargs={"net_arch": [32]},
+                 #seed=0,
+                 train_freq=train_freq, #Update the model every train_freq steps. Alternatively pass a tuple of frequency and unit like (5, "step") or (2, "episode").
+                 learning_rate=learning_rate,
+                 verbose=1,
+                 **kwargs)
+
+def evaluate_model(model, env, n_eval_episodes: int = 10, **kwargs) -> tuple[float, float]:
+    """evaluate_policy of stable-baselines3, maskable models only choose from the valid actions"""
+    if isinstance(model, MaskablePPO):
+        return evaluate_masked_policy(model, env, n_eval_episodes=n_eval_episodes, **kwargs)
+    return evaluate_policy(model, env, n_eval_episodes=n_eval_episodes, **kwargs)
+
+
+def mutate(params: dict[str, th.Tensor], generator: th.Generator | None = None) -> dict[str, th.Tensor]:
+    """Mutate parameters by adding normal noise to them (drawn from generator if given)"""
+    return dict(
+        (name, param + th.randn(param.shape, generator=generator, dtype=param.dtype).to(param.device))
+        for name, param in params.items()
+    )
+
+def get_policy_params(model) -> dict[str, th.Tensor]:
+    """
+    Returns (cpu copies of) the parameters that affect the action: variables with "policy",
+    "action" (policy) or "shared_net" (shared layers) in their name and, for QRDQN,
+    the online quantile net (the target net is only used while learning).
+    NOTE: you can retrieve those parameters using model.get_parameters() too
+    """
+    return dict(
+        (key, value.detach().cpu().clone())
+        for key, value in model.policy.state_dict().items()
+        if ("policy" in key or "shared_net" in key or "action" in key or key.startswith("quantile_net."))
+    )
+
+def make_candidate(mean_params: dict[str, th.Tensor], seed: int) -> dict[str, th.Tensor]:
+    """Mutates the mean parameters, the noise only depends on the seed"""
+    return mutate(mean_params, th.Generator().manual_seed(seed))
+
+def update_mean_params(mean_params: dict[str, th.Tensor], elite_seeds: list[int]) -> dict[str, th.Tensor]:
+    """Takes the average over the parameters of the elite candidates (given by their seeds) as next mean parameter"""
+    elites = [make_candidate(mean_params, seed) for seed in elite_seeds]
+    return dict(
+        (name, th.stack([elite[name] for elite in elites]).mean(dim=0))
+        for name in mean_params.keys()
+    )
+
+def make_evaluation_env():
+    """Creates the env candidates are evaluated on"""
+    return Monitor(Game_Controller(True))
+
+def evaluate_candidate(model, candidate: dict[str, th.Tensor], seed: int, env_factory=make_evaluation_env,
+                       n_eval_episodes: int = 10) -> float:
+    """
+    Evaluates one candidate on a fresh env. The env and torch are seeded first,
+    so the fitness only depends on the candidate and the seed.
+
+    Args:
+        model: model the candidate parameters are loaded into
+        candidate (dict[str, th.Tensor]): policy parameters
+        seed (int): seed for the games
+        env_factory (callable, optional): creates the env, must be picklable for worker processes
+        n_eval_episodes (int, optional): number of games that are played
+
+    Returns:
+        float: mean reward over the games
+    """
+    # Tell function that it should only update parameters we give it (policy parameters)
+    model.policy.load_state_dict(candidate, strict=False)
+    th.manual_seed(seed)
+    env = env_factory()
+    try:
+        # all random decisions of the games come from the generator of the env
+        env.reset(seed=seed)
+        fitness, _ = evaluate_model(model, env, n_eval_episodes=n_eval_episodes)
+    finally:
+        env.close()
+    return float(fitness)
+
+# state of an evaluation worker process, set up by _init_evaluation_worker
+_worker_state = {}
+
+def _init_evaluation_worker(model_path: str, env_factory) -> None:
+    """Loads the workers own copy of the model, the mean parameters are the ones of the saved model"""
+    th.set_num_threads(1)
+    model = load_model(model_path, device="cpu")
+    _worker_state.update(
+        model=model,
+        mean_params=get_policy_params(model),
+        generation=0,
+        env_factory=env_factory
+    )
+
+def _evaluate_in_worker(elite_seeds_history: list[list[int]], seed: int, eval_seed: int, n_eval_episodes: int) -> float:
+    """
+    Evaluates a candidate in a worker. Instead of parameters the worker only receives seeds:
+    the elite seeds of every past iteration (to catch up on the mean parameters) and the
+    seed of the candidates noise.
+    """
+    for elite_seeds in elite_seeds_history[_worker_state["generation"]:]:
+        _worker_state["mean_params"] = update_mean_params(_worker_state["mean_params"], elite_seeds)
+    _worker_state["generation"] = len(elite_seeds_history)
+    candidate = make_candidate(_worker_state["mean_params"], seed)
+    return evaluate_candidate(_worker_state["model"], candidate, eval_seed, _worker_state["env_factory"], n_eval_episodes)
+
+def evolve(model, pop_size: int, iterations: int, prior_champion_fitness: float, num_workers: int = 1,
+           seed: int | None = None, n_eval_episodes: int = 10, env_factory=make_evaluation_env) -> float:
+    """
+    Evolutionary training of the policy parameters. Every iteration pop_size mutated candidates
+    are evaluated, the average of the top 10% becomes the next mean parameter and the best
+    candidate is saved if it beats the champion. With num_workers > 1 the candidates are
+    evaluated concurrently in worker processes, each with its own copy of the model and env.
+    The fitness values are the same as in a serial run with the same seed (on the cpu).
+
+    Args:
+        model: model to train, the champion (if any) is loaded into it at the end
+        pop_size (int): population size
+        iterations (int): number of iterations
+        prior_champion_fitness (float): fitness a candidate has to beat to be saved
+        num_workers (int, optional): number of worker processes, 1 evaluates in this process
+        seed (int, optional): seed for the mutations and evaluation games, a fresh one is drawn if None
+        n_eval_episodes (int, optional): games per evaluation
+        env_factory (callable, optional): creates the evaluation env
+
+    Returns:
+        float: fitness of the champion
+    """
+    if seed is None:
+        seed = secrets.randbits(31)
+    # the seed is printed, so a run can be repeated
+    print(f"Evolution seed: {seed}")
+    mean_params = get_policy_params(model)
+    # Keep top 10%
+    n_elite = max(pop_size // 10, 1) # Elite size (the best networks in this 10% will be kept until replaced by better ones)
+    elite_seeds_history = []
+    champion = None
+    executor = None
+    if num_workers > 1:
+        model_dir = tempfile.TemporaryDirectory()
+        model_path = os.path.join(model_dir.name, "evolution_start.zip")
+        model.save(model_path)
+        executor = ProcessPoolExecutor(
+            num_workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_evaluation_worker,
+            initargs=(model_path, env_factory)
+        )
+    try:
+        for iteration in range(iterations):
+            # Create population of candidates (given by their seed) and evaluate them,
+            # all candidates of one iteration play the same games
+            seeds = [seed + iteration * pop_size + population_i for population_i in range(pop_size)]
+            eval_seed = seed + iteration
+            if executor is None:
+                fitnesses = [
+                    evaluate_candidate(model, make_candidate(mean_params, candidate_seed), eval_seed,
+                                       env_factory, n_eval_episodes)
+                    for candidate_seed in seeds
+                ]
+            else:
+                futures = [
+                    executor.submit(_evaluate_in_worker, elite_seeds_history, candidate_seed, eval_seed, n_eval_episodes)
+                    for candidate_seed in seeds
+                ]
+                fitnesses = [future.result() for future in futures]
+            population = list(zip(seeds, fitnesses))
+            # Take top 10% and use average over their parameters as next mean parameter
+            top_candidates = sorted(population, key=lambda x: x[1], reverse=True)[:n_elite]
+            mean_fitness = sum(top_candidate[1] for top_candidate in top_candidates) / n_elite
+            print(f"Iteration {iteration + 1:<3} Mean top fitness: {mean_fitness:.2f}")
+            print(f"Best fitness this iteration: {top_candidates[0][1]:.2f} vs Champion: {prior_champion_fitness}")
+            if top_candidates[0][1] > prior_champion_fitness:
+                print("Saving new Champion")
+                prior_champion_fitness = top_candidates[0][1]
+                champion = make_candidate(mean_params, top_candidates[0][0])
+                model.policy.load_state_dict(champion, strict=False)
+                # only the off-policy algorithms have a replay buffer
+                if getattr(model, "replay_buffer", None) is not None:
+                    model.save_replay_buffer(type(model).__name__ + "EVO_replay")
+                name = type(model).__name__ + "_Agent_" + str(round(prior_champion_fitness))
+                model.save(name)
+                time.sleep(1)
+            elite_seeds = [candidate_seed for candidate_seed, _ in top_candidates]
+            mean_params = update_mean_params(mean_params, elite_seeds)
+            elite_seeds_history.append(elite_seeds)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+            model_dir.cleanup()
+    if champion is not None:
+        model.policy.load_state_dict(champion, strict=False)
+    return prior_champion_fitness
 
 def training(env):
-    observation, _ = env.reset()
+    env.reset()
 
     # set up logger
     log_path = os.path.join('logs', 'training')
@@ -27,79 +247,57 @@ def training(env):
     
     
     if get_bool("Train a new network or continue training?",["Train new","Continue training"]):
+        algorithm = get_choice("Which algorithm should be used? (MaskablePPO only plays valid actions)", list(ALGORITHMS))
         timesteps = get_int("How many timesteps should be made for the first training?")
-        model = QRDQN("MlpPolicy",
-                        env,
-                        #ent_coef=0.0,
-                        #policy_kwargs={"net_arch": [32]},
-                        #seed=0,
-                        train_freq=(1,"episode"), #Update the model every train_freq steps. Alternatively pass a tuple of frequency and unit like (5, "step") or (2, "episode").
-                        learning_rate=0.05,
-                        tensorboard_log=new_logger,
-                        verbose=1) #, tensorGame_Controller_log=log_path) # alias of DQNPolicy # PPO
+        model = create_model(algorithm, env, learning_rate=0.05, tensorboard_log=new_logger)
         # Set new logger
         model.set_logger(new_logger)
         # Use traditional actor-critic policy gradient updates to
         # find good initial parameters
         model.learn(total_timesteps=timesteps)
-        model.save('QRDQNAgent_DUMB')
-        evaluate_policy(model, env, n_eval_episodes=1, render=False)
+        model.save(algorithm + 'Agent_DUMB')
+        evaluate_model(model, env, n_eval_episodes=1, render=False)
     else:
-        model = QRDQN.load(get_path("Which network should be loaded?"), env=env, print_system_info=True)
-        model.load_replay_buffer(get_path("Which replay buffer should be loaded?"))
-
-    # Include only variables with "policy", "action" (policy) or "shared_net" (shared layers)
-    # in their name: only these ones affect the action.
-    # NOTE: you can retrieve those parameters using model.get_parameters() too
-    mean_params = dict(
-    (key, value)
-    for key, value in model.policy.state_dict().items()
-    if ("policy" in key or "shared_net" in key or "action" in key)
-    )
+        model = load_model(get_path("Which network should be loaded?"), env=env, print_system_info=True)
+        if getattr(model, "replay_buffer", None) is not None:
+            model.load_replay_buffer(get_path("Which replay buffer should be loaded?"))
 
     ## START EVOLUTIONARY TRAINING
     pop_size = get_int("How big should the population be?") # Population size
-    # Keep top 10%
-    n_elite = pop_size // 10 # Elite size (the best networks in this 10% will be kept until replaced by better ones)
-    # Retrieve the environment
-    vec_env = model.get_env()
-    prior_champion_fitness = 0
-    for iteration in range(get_int("How many iterations?")):
-        # Create population of candidates and evaluate them
-        population = []
-        for population_i in range(pop_size):
-            candidate = mutate(mean_params)
-            # Load new policy parameters to agent.
-            # Tell function that it should only update parameters
-            # we give it (policy parameters)
-            model.policy.load_state_dict(candidate, strict=False)
-            # Evaluate the candidate
-            fitness, _ = evaluate_policy(model, vec_env)
-            population.append((candidate, fitness))
-        # Take top 10% and use average over their parameters as next mean parameter
-        top_candidates = sorted(population, key=lambda x: x[1], reverse=True)[:n_elite]
-        mean_params = dict(
-            (
-                name,
-                th.stack([candidate[0][name] for candidate in top_candidates]).mean(dim=0),
-            )
-            for name in mean_params.keys()
-        )
-        mean_fitness = sum(top_candidate[1] for top_candidate in top_candidates) / n_elite
-        print(f"Iteration {iteration + 1:<3} Mean top fitness: {mean_fitness:.2f}")
-        print(f"Best fitness this iteration: {top_candidates[0][1]:.2f} vs Champion: {prior_champion_fitness}")
-        if top_candidates[0][1] > prior_champion_fitness:
-            print("Saving new Champion")
-            prior_champion_fitness = top_candidates[0][1]
-            champion = top_candidates[0][0]
-            model.policy.load_state_dict(champion, strict=False)
-            model.save_replay_buffer("QRDQNEVO_replay")
-            name = "QRDQN_Agent_" + str(round(prior_champion_fitness))
-            model.save(name)
-            time.sleep(1)
+    iterations = get_int("How many iterations?")
+    num_workers = get_int("How many processes should evaluate the population? (1 = this process)", 1)
+    evolve(model, pop_size, iterations, prior_champion_fitness=0, num_workers=num_workers)
     # Save the policy independently from the model
     # Note: if you don't save the complete model with `model.save()`
     # you cannot continue training afterward
     policy = model.policy
     policy.save("Champion_Policy")
-    print("Finished Training")
\ No newline at end of file
+    print("Finished Training")
+
+
+def pool_training(num_workers: int | None = None):
+    """
+    Runs the training with one Game_Controller per worker process instead of a single
+    in-process env. The workers are shut down when the training ends, also on errors.
+
+    Args:
+        num_workers (int, optional): number of worker processes. Defaults to the number of CPU cores.
+    """
+    env = VecMonitor(SharedMemoryVecEnv(num_workers))
+    try:
+        training(env)
+    finally:
+        env.close()
+
+
+# Example usage
+if __name__ == '__main__':
+    # guard: QRDQN trains on the env pool (pool_training), episodic training would fail with several envs
+    env = VecMonitor(SharedMemoryVecEnv(2))
+    try:
+        model = create_model("QRDQN", env, 0.005, device="cpu", learning_starts=100)
+        assert model.train_freq.unit.value == "step"
+        model.learn(total_timesteps=300)
+        assert model.num_timesteps >= 300
+    finally:
+        env.close()
@@ -15,6 +15,9 @@ def clear_screen():
 def get_path(Title="Kartenspiel will wissen "):
     return fileopenbox(Title)
 
+def get_directory(Title="Kartenspiel will wissen "):
+    return diropenbox(Title)
+
 def get_int(msg="Kartenspiel will wissen ",lowerbound=0):
     return integerbox(msg, lowerbound=lowerbound, upperbound=1000000)
 
@@ -0,0 +1,372 @@
+"""Module that provides the VecGameController, a vectorized environment stepping many games at once"""
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import VecEnv
+
+# local imports
+from src.row import Row
+from src.cards import DrawCard, get_card, get_card_count
+from src.deck_sampler import DeckBank, DECK_SIZE
+from src.observation import OBSERVATION_SIZE, OBSERVED_CARDS, CARD_VECTOR_SIZE
+from src.array_board import CARD_CAPACITY, ROWS, ROW_INDEX, FIELD_ROWS, TOP_PLAYER, BOTTOM_PLAYER
+
+# game rules, same as in the Game_Controller
+START_HAND_SIZE = 10
+ROUND_DRAW = 2
+MAX_STEPS = 100
+WIN_REWARD = 10
+NUM_ACTIONS = 40
+
+
+def build_card_tables() -> dict[str, np.ndarray]:
+    """
+    Builds lookup tables indexed by card id for everything the game logic needs to know
+    about a card. The empty card id maps to zeros.
+
+    Returns:
+        dict[str, np.ndarray]: strength, row (index in ROWS, -1 for any row),
+        draw (number of cards drawn by effects) and vector (observation encoding)
+    """
+    card_count = get_card_count()
+    tables = {
+        "strength": np.zeros(card_count, dtype=np.int32),
+        "row": np.zeros(card_count, dtype=np.intp),
+        "draw": np.zeros(card_count, dtype=np.int16),
+        "vector": np.zeros((card_count, CARD_VECTOR_SIZE), dtype=np.uint8),
+    }
+    for card_id in range(1, card_count):
+        card = get_card(card_id)
+        tables["strength"][card_id] = card.strength
+        tables["row"][card_id] = -1 if card.type == Row.ANY else ROW_INDEX[card.type]
+        if isinstance(card, DrawCard):
+            tables["draw"][card_id] = card.num_card
+        tables["vector"][card_id] = card.get_card_vector()
+    return tables
+
+
+class VecGameController(VecEnv):
+    """Vectorized version of the Game_Controller in training mode.
+
+    Holds the state of num_envs games in batched numpy arrays (first axis is the game,
+    second the player, indexed like the ArrayBoard) and advances all games with one call
+    of step(actions). Finished games are reset automatically, like the DummyVecEnv does it,
+    the last observation is stored in info["terminal_observation"].
+    Rules, observations and rewards are the same as for Game_Controller(training=True).
+    """
+    def __init__(self, num_envs: int, seed: int | None = None):
+        """Initialize all games.
+
+        Args:
+            num_envs (int): number of games that are played in lockstep
+            seed (int, optional): seed for the random number generator of the games
+        """
+        observation_space = spaces.Box(low=0, high=50, shape=(OBSERVATION_SIZE,), dtype=np.uint8)
+        action_space = spaces.Discrete(NUM_ACTIONS)
+        self.render_mode = None
+        self.rng = np.random.default_rng(seed)
+        self.deck_bank = DeckBank(self.rng, capacity=max(4096, 2 * num_envs), deck_size=DECK_SIZE)
+        self.cards = build_card_tables()
+        self.games = np.arange(num_envs)
+        # game state, see ArrayBoard for the meaning of the arrays
+        self.deck = np.zeros((num_envs, 2, CARD_CAPACITY), dtype=np.int16)
+        self.deck_top = np.zeros((num_envs, 2), dtype=np.int16)
+        self.deck_end = np.zeros((num_envs, 2), dtype=np.int16)
+        self.hand = np.zeros((num_envs, 2, CARD_CAPACITY), dtype=np.int16)
+        self.hand_size = np.zeros((num_envs, 2), dtype=np.int16)
+        self.rows = np.zeros((num_envs, 2, len(ROWS), CARD_CAPACITY), dtype=np.int16)
+        self.row_size = np.zeros((num_envs, 2, len(ROWS)), dtype=np.int16)
+        self.row_score = np.zeros((num_envs, 2, len(ROWS)), dtype=np.int32)
+        self.passed = np.zeros((num_envs, 2), dtype=bool)
+        self.current_rows_won = np.zeros((num_envs, 2), dtype=np.int8)
+        self.rounds_won = np.zeros((num_envs, 2), dtype=np.int8)
+        self.round_number = np.ones(num_envs, dtype=np.int16)
+        self.steps = np.zeros(num_envs, dtype=np.int32)
+        # the coin flip decides once per env which player starts, like in the Game_Controller
+        self.coin_flip = self.rng.integers(0, 2, num_envs).astype(bool)
+        self.observations = np.zeros((num_envs, OBSERVATION_SIZE), dtype=np.uint8)
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+        super().__init__(num_envs, observation_space, action_space)
+
+    def reset(self) -> np.ndarray:
+        """Resets all games and returns the stacked observations."""
+        if self._seeds[0] is not None:
+            # the seeded generator decides everything from here on, the coin flip included
+            self.rng = np.random.default_rng(self._seeds[0])
+            self.coin_flip = self.rng.integers(0, 2, self.num_envs).astype(bool)
+            self.deck_bank.set_rng(self.rng)
+        self._reset_seeds()
+        self._reset_options()
+        self._reset_games(self.games)
+        self._encode_observations()
+        self.reset_infos = [{"action_mask": mask} for mask in self.action_masks()]
+        return self.observations.copy()
+
+    def step_async(self, actions: np.ndarray) -> None:
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        """Plays one turn in every game, see Game_Controller.step.
+
+        Returns:
+            tuple: stacked observations (num_envs, 465), rewards, dones and infos
+        """
+        actions = self.actions.copy()
+        # Note: if not coinflip, bottom player begins
+        first_player = (~self.coin_flip).astype(np.intp)
+        for player in (first_player, 1 - first_player):
+            active = ~self.passed[self.games, player]
+            # invalid actions are turned into passing, this carries over to the second player
+            too_big = actions >= self.hand_size[self.games, player] + 1
+            actions[active & too_big] = 0
+            passing = active & (actions == 0)
+            self.passed[self.games[passing], player[passing]] = True
+            playing = active & (actions != 0)
+            if playing.any():
+                self._play_cards(self.games[playing], player[playing], actions[playing] - 1)
+        self._update_won_rows()
+
+        round_over = self.passed.all(axis=1)
+        if round_over.any():
+            self._end_round(self.games[round_over])
+
+        self.steps += 1
+        truncated = self.steps >= MAX_STEPS
+        done = (self.round_number >= 4) | (self.rounds_won.max(axis=1) >= 2)
+
+        self._encode_observations()
+        rewards = self._get_rewards()
+        dones = done | truncated
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            finished = self.games[dones]
+            for game in finished.tolist():
+                infos[game]["terminal_observation"] = self.observations[game].copy()
+                infos[game]["TimeLimit.truncated"] = bool(truncated[game] and not done[game])
+            self._reset_games(finished)
+            self._encode_observations(finished)
+        for info, mask in zip(infos, self.action_masks()):
+            info["action_mask"] = mask
+        return self.observations.copy(), rewards, dones, infos
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the valid actions of the agent (the top player) in all games, see Game_Controller.action_masks.
+
+        Returns:
+            np.ndarray: bool masks of shape (num_envs, NUM_ACTIONS)
+        """
+        masks = np.zeros((self.num_envs, NUM_ACTIONS), dtype=bool)
+        masks[:, 0] = True
+        masks[:, 1:] = ((np.arange(1, NUM_ACTIONS) <= self.hand_size[:, TOP_PLAYER, None])
+                        & ~self.passed[:, TOP_PLAYER, None])
+        return masks
+
+    def _sample_decks(self, num_games: int) -> np.ndarray:
+        """
+        Takes new decks for both players of the games from the deck bank.
+
+        Args:
+            num_games (int): number of games that need decks
+
+        Returns:
+            np.ndarray: card ids of shape (num_games, 2, DECK_SIZE)
+        """
+        decks = np.empty((num_games, 2, DECK_SIZE), dtype=np.int16)
+        # same order as in Game_Controller.setup_hand_for_new_round
+        decks[:, [BOTTOM_PLAYER, TOP_PLAYER]] = self.deck_bank.take(2 * num_games).reshape(num_games, 2, DECK_SIZE)
+        return decks
+
+    def _reset_games(self, games: np.ndarray) -> None:
+        """Resets the given games and deals new decks and hands."""
+        for array in (self.hand_size, self.row_size, self.row_score, self.passed,
+                      self.current_rows_won, self.rounds_won, self.steps):
+            array[games] = 0
+        self.round_number[games] = 1
+        self.deck[games, :, :DECK_SIZE] = self._sample_decks(len(games))
+        self.deck_top[games] = 0
+        self.deck_end[games] = DECK_SIZE
+        for player in (BOTTOM_PLAYER, TOP_PLAYER):
+            self._draw_cards(games, np.full(len(games), player), np.full(len(games), START_HAND_SIZE))
+
+    def _draw_cards(self, games: np.ndarray, players: np.ndarray, num_cards: np.ndarray) -> None:
+        """
+        Moves cards from the top of the decks to the end of the hands.
+
+        Args:
+            games (np.ndarray): games in which a player draws
+            players (np.ndarray): player that draws, per game
+            num_cards (np.ndarray): number of cards to draw, limited by the deck size
+        """
+        deck_top = self.deck_top[games, players]
+        hand_size = self.hand_size[games, players]
+        num_cards = np.minimum(self.deck_end[games, players] - deck_top, num_cards)
+        for card in range(int(num_cards.max(initial=0))):
+            drawing = card < num_cards
+            self.hand[games[drawing], players[drawing], hand_size[drawing] + card] = \
+                self.deck[games[drawing], players[drawing], deck_top[drawing] + card]
+        self.hand_size[games, players] = hand_size + num_cards
+        self.deck_top[games, players] = deck_top + num_cards
+
+    def _play_cards(self, games: np.ndarray, players: np.ndarray, card_indices: np.ndarray) -> None:
+        """
+        Plays one card from the hand per game, see Board.play_card.
+
+        Args:
+            games (np.ndarray): games in which a card is played (each game at most once)
+            players (np.ndarray): player that plays the card, per game
+            card_indices (np.ndarray): index of the played card in the hand, per game
+        """
+        card_ids = self.hand[games, players, card_indices].astype(np.intp)
+        num_drawn = self.cards["draw"][card_ids]
+        effect = num_drawn > 0
+        if effect.any():
+            self._draw_cards(games[effect], players[effect], num_drawn[effect])
+        unit = ~effect
+        if unit.any():
+            self._place_units(games[unit], players[unit], card_ids[unit])
+        self._remove_from_hands(games, players, card_indices)
+
+    def _place_units(self, games: np.ndarray, players: np.ndarray, card_ids: np.ndarray) -> None:
+        """Adds unit cards to the rows of their type and updates the row scores."""
+        rows = self.cards["row"][card_ids]
+        # heroes can be played in any field row, the bot chooses randomly
+        any_row = rows < 0
+        rows[any_row] = self.rng.integers(0, len(FIELD_ROWS), int(any_row.sum()))
+        row_size = self.row_size[games, players, rows]
+        self.rows[games, players, rows, row_size] = card_ids
+        self.row_size[games, players, rows] = row_size + 1
+        self.row_score[games, players, rows] += self.cards["strength"][card_ids]
+
+    def _remove_from_hands(self, games: np.ndarray, players: np.ndarray, card_indices: np.ndarray) -> None:
+        """Removes one card per game from the hand, keeping the order of the other cards."""
+        positions = np.arange(CARD_CAPACITY)
+        source = np.minimum(positions + (positions >= card_indices[:, None]), CARD_CAPACITY - 1)
+        self.hand[games, players] = np.take_along_axis(self.hand[games, players], source, axis=1)
+        self.hand_size[games, players] -= 1
+
+    def _update_won_rows(self) -> None:
+        """Compares the field rows of both players in all games, see Board.get_won_rows."""
+        top_scores = self.row_score[:, TOP_PLAYER, :len(FIELD_ROWS)]
+        bottom_scores = self.row_score[:, BOTTOM_PLAYER, :len(FIELD_ROWS)]
+        # rows without any score are not won by anyone
+        contested = (top_scores > 0) | (bottom_scores > 0)
+        self.current_rows_won[:, TOP_PLAYER] = ((top_scores >= bottom_scores) & contested).sum(axis=1)
+        self.current_rows_won[:, BOTTOM_PLAYER] = ((top_scores <= bottom_scores) & contested).sum(axis=1)
+
+    def _end_round(self, games: np.ndarray) -> None:
+        """Ends the round in the given games and lets both players draw, see Board.end_round."""
+        top_rows_won = self.current_rows_won[games, TOP_PLAYER]
+        bottom_rows_won = self.current_rows_won[games, BOTTOM_PLAYER]
+        self.rounds_won[games, TOP_PLAYER] += top_rows_won >= bottom_rows_won
+        self.rounds_won[games, BOTTOM_PLAYER] += bottom_rows_won >= top_rows_won
+        for array in (self.row_size, self.row_score, self.current_rows_won, self.passed):
+            array[games] = 0
+        self.round_number[games] += 1
+        for player in (BOTTOM_PLAYER, TOP_PLAYER):
+            self._draw_cards(games, np.full(len(games), player), np.full(len(games), ROUND_DRAW))
+
+    def _encode_observations(self, games: np.ndarray | None = None) -> None:
+        """
+        Writes the observations of the given games (default all), same layout as Game_Controller.get_state.
+
+        Args:
+            games (np.ndarray, optional): games whose observation is written
+        """
+        if games is None:
+            games = self.games
+        num_games = len(games)
+        observations = self.observations[games]
+        card_slots = OBSERVED_CARDS * CARD_VECTOR_SIZE
+        positions = np.arange(CARD_CAPACITY)
+        for player, skip in ((BOTTOM_PLAYER, 0), (TOP_PLAYER, card_slots)):
+            # the cards of all rows (in row order) are moved to the front, keeping their order,
+            # cards that are not in a row are written to an extra column that is dropped
+            in_row = (positions < self.row_size[games, player, :, None]).reshape(num_games, -1)
+            target = np.where(in_row, np.cumsum(in_row, axis=1) - 1, OBSERVED_CARDS)
+            board_cards = np.zeros((num_games, OBSERVED_CARDS + 1), dtype=np.int16)
+            np.put_along_axis(board_cards, target, self.rows[games, player].reshape(num_games, -1), axis=1)
+            observations[:, skip:skip + card_slots] = \
+                self.cards["vector"][board_cards[:, :OBSERVED_CARDS]].reshape(num_games, -1)
+        skip = 2 * card_slots
+        in_hand = positions[:OBSERVED_CARDS] < self.hand_size[games, TOP_PLAYER, None]
+        hand_cards = np.where(in_hand, self.hand[games, TOP_PLAYER, :OBSERVED_CARDS], 0)
+        observations[:, skip:skip + card_slots] = self.cards["vector"][hand_cards].reshape(num_games, -1)
+        skip += card_slots
+        field_rows = len(FIELD_ROWS)
+        observations[:, skip:skip + field_rows] = self.row_score[games, BOTTOM_PLAYER, :field_rows]
+        observations[:, skip + field_rows:skip + 2 * field_rows] = self.row_score[games, TOP_PLAYER, :field_rows]
+        observations[:, -3] = self.round_number[games]
+        observations[:, -2] = self.rounds_won[games, BOTTOM_PLAYER]
+        observations[:, -1] = self.rounds_won[games, TOP_PLAYER]
+        self.observations[games] = observations
+
+    def _get_rewards(self) -> np.ndarray:
+        """Calculates the rewards of the bottom player in all games, see Game_Controller.get_reward."""
+        rounds_won = self.rounds_won.astype(np.float32)
+        rewards = np.where(
+            rounds_won[:, BOTTOM_PLAYER] > 0,
+            WIN_REWARD * (rounds_won[:, BOTTOM_PLAYER] - rounds_won[:, TOP_PLAYER]),
+            0
+        )
+        rewards += self.row_score[:, BOTTOM_PLAYER, :len(FIELD_ROWS)].sum(axis=1)
+        row_lead = self.current_rows_won[:, BOTTOM_PLAYER].astype(np.int16) - self.current_rows_won[:, TOP_PLAYER]
+        pass_reward = np.select([row_lead == 1, row_lead > 1], [WIN_REWARD, WIN_REWARD / 2], -WIN_REWARD * 2)
+        rewards += np.where(self.passed[:, TOP_PLAYER], pass_reward, 0)
+        return rewards.astype(np.float32)
+
+    def close(self) -> None:
+        """Nothing to clean up, all games live in this process."""
+
+    def get_attr(self, attr_name: str, indices=None) -> list:
+        """
+        Returns an attribute for each game. Per game arrays are indexed,
+        all other attributes are shared by the games.
+        """
+        value = getattr(self, attr_name)
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[index] for index in self._get_indices(indices)]
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name: str, value, indices=None) -> None:
+        """Sets a per game array attribute for the given games."""
+        array = getattr(self, attr_name)
+        if not (isinstance(array, np.ndarray) and array.shape[:1] == (self.num_envs,)):
+            raise AttributeError(f"{attr_name} is not a per game attribute")
+        for index in self._get_indices(indices):
+            array[index] = value
+
+    def has_attr(self, attr_name: str) -> bool:
+        return hasattr(self, attr_name)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list:
+        # the maskable algorithms of sb3_contrib get the masks with env_method("action_masks")
+        if method_name == "action_masks":
+            return list(self.action_masks()[self._get_indices(indices)])
+        raise NotImplementedError("The games of a VecGameController are not separate env objects")
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> list[bool]:
+        return [False for _ in self._get_indices(indices)]
+
+
+# Example usage
+if __name__ == '__main__':
+    from src.game_controller import Game_Controller
+
+    # guard: seeded games are the same as in a seeded Game_Controller, the coin flip included
+    for seed in range(10):
+        controller = Game_Controller(True)
+        vec_controller = VecGameController(1)
+        observation, _ = controller.reset(seed=seed)
+        vec_controller.seed(seed)
+        vec_observations = vec_controller.reset()
+        assert vec_controller.coin_flip[0] == controller.coin_flip, seed
+        assert np.array_equal(vec_observations[0], observation), seed
+        actions = np.random.default_rng(seed).integers(0, 12, 200)
+        for step, action in enumerate(actions.tolist()):
+            observation, reward, terminated, truncated, _ = controller.step(action)
+            vec_observations, rewards, dones, infos = vec_controller.step(np.array([action]))
+            assert dones[0] == (terminated or truncated) and rewards[0] == reward, (seed, step)
+            if dones[0]:
+                assert np.array_equal(infos[0]["terminal_observation"], observation), (seed, step)
+                observation, _ = controller.reset()
+            assert np.array_equal(vec_observations[0], observation), (seed, step)
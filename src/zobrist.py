@@ -0,0 +1,233 @@
+"""Module that provides the ZobristHash, an incrementally updated 64-bit hash of a board position
+
+The hash is the XOR of one random 64-bit key per fact of the position: every card in a hand,
+deck or row (as multisets, the n-th copy of a card in a zone has its own key), the passed
+flags, the round number and the rounds won. Moving a card XORs two keys, so every change of
+the board updates the hash in constant time. Boards with the same position have the same hash,
+independent of the backend and of the process.
+"""
+# local imports
+from src.row import Row
+from src.cards import Card
+from src.board_observer import BoardObserver
+
+MASK = (1 << 64) - 1
+# zones of the cards of a player, the rows follow the hand and the deck
+HAND = 0
+DECK = 1
+ROW_ZONES = {row: 2 + index for index, row in enumerate((Row.FRONT, Row.WISE, Row.SUPPORT, Row.EFFECTS))}
+# kinds of keys
+_CARD_KEY = 0
+_PASSED_KEY = 1
+_ROUND_KEY = 2
+_ROUNDS_WON_KEY = 3
+
+# keys by their parts, computed when they are needed for the first time
+_keys = {}
+
+
+def _splitmix64(value: int) -> int:
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+def zobrist_key(*parts: int) -> int:
+    """
+    Returns the key of a fact, the same in every process.
+
+    Args:
+        parts (int): kind of the key and its numbers, e.g. (_CARD_KEY, player, zone, card id, copy)
+
+    Returns:
+        int: 64-bit key
+    """
+    key = _keys.get(parts)
+    if key is None:
+        key = 0
+        for part in parts:
+            key = _splitmix64(key ^ part)
+        _keys[parts] = key
+    return key
+
+
+class ZobristHash(BoardObserver):
+    """Hash of the position of a board, kept up to date as observer of the board.
+
+    Use board.get_hash(), it creates the hash when it is needed for the first time.
+    """
+    # the undone changes of board.pop are XORed out again, like the changes themselves
+    follows_undo = True
+
+    def __init__(self, board):
+        """
+        Computes the hash of the board and registers at it.
+
+        Args:
+            board (Board | ArrayBoard): board that is hashed
+        """
+        self.board = board
+        board.add_observer(self)
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Computes the hash from the whole board again"""
+        self.value = 0
+        self.passed = [False, False]
+        # copies of every card per zone: counts[player][zone][card id]
+        self.counts = [[{} for _ in range(2 + len(ROW_ZONES))] for _ in range(2)]
+        # part of the hash from the cards of every zone, so a zone can be cleared at once
+        self.zone_hashes = [[0] * (2 + len(ROW_ZONES)) for _ in range(2)]
+        for bottom_player in (False, True):
+            player = int(bottom_player)
+            self._set_zone(player, HAND, self.board.get_hand(bottom_player))
+            self._set_zone(player, DECK, self.board.get_deck(bottom_player))
+            for row, cards in self.board.get_half_board(bottom_player).items():
+                self._set_zone(player, ROW_ZONES[row], cards)
+            if self.board.has_passed(bottom_player):
+                self.round_passed(bottom_player)
+        self.round_hash = self._round_hash()
+        self.value ^= self.round_hash
+
+    def _round_hash(self) -> int:
+        return (zobrist_key(_ROUND_KEY, self.board.round_number)
+                ^ zobrist_key(_ROUNDS_WON_KEY, 0, self.board.get_rounds_won(False))
+                ^ zobrist_key(_ROUNDS_WON_KEY, 1, self.board.get_rounds_won(True)))
+
+    def _add(self, player: int, zone: int, card_id: int) -> None:
+        counts = self.counts[player][zone]
+        copy = counts.get(card_id, 0)
+        counts[card_id] = copy + 1
+        key = zobrist_key(_CARD_KEY, player, zone, card_id, copy)
+        self.zone_hashes[player][zone] ^= key
+        self.value ^= key
+
+    def _remove(self, player: int, zone: int, card_id: int) -> None:
+        counts = self.counts[player][zone]
+        copy = counts[card_id] - 1
+        counts[card_id] = copy
+        key = zobrist_key(_CARD_KEY, player, zone, card_id, copy)
+        self.zone_hashes[player][zone] ^= key
+        self.value ^= key
+
+    def _clear_zone(self, player: int, zone: int) -> None:
+        self.value ^= self.zone_hashes[player][zone]
+        self.zone_hashes[player][zone] = 0
+        self.counts[player][zone] = {}
+
+    def _set_zone(self, player: int, zone: int, cards: list[Card]) -> None:
+        self._clear_zone(player, zone)
+        for card in cards:
+            self._add(player, zone, card.card_id)
+
+    def board_restored(self) -> None:
+        self.refresh()
+
+    def board_reset(self) -> None:
+        self.refresh()
+
+    def deck_set(self, bottom_player: bool) -> None:
+        self._set_zone(int(bottom_player), DECK, self.board.get_deck(bottom_player))
+
+    def hand_set(self, bottom_player: bool) -> None:
+        self._set_zone(int(bottom_player), HAND, self.board.get_hand(bottom_player))
+
+    def cards_drawn(self, bottom_player: bool, cards: list[Card]) -> None:
+        player = int(bottom_player)
+        for card in cards:
+            self._remove(player, DECK, card.card_id)
+            self._add(player, HAND, card.card_id)
+
+    def card_played(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        player = int(bottom_player)
+        self._remove(player, HAND, card.card_id)
+        if row is not None:
+            self._add(player, ROW_ZONES[row], card.card_id)
+
+    def round_passed(self, bottom_player: bool) -> None:
+        player = int(bottom_player)
+        if not self.passed[player]:
+            self.passed[player] = True
+            self.value ^= zobrist_key(_PASSED_KEY, player)
+
+    def cards_undrawn(self, bottom_player: bool, cards: list[Card]) -> None:
+        player = int(bottom_player)
+        for card in cards:
+            self._remove(player, HAND, card.card_id)
+            self._add(player, DECK, card.card_id)
+
+    def card_unplayed(self, bottom_player: bool, card_index: int, card: Card, row: Row | None) -> None:
+        player = int(bottom_player)
+        if row is not None:
+            self._remove(player, ROW_ZONES[row], card.card_id)
+        self._add(player, HAND, card.card_id)
+
+    def round_unpassed(self, bottom_player: bool) -> None:
+        player = int(bottom_player)
+        if self.passed[player]:
+            self.passed[player] = False
+            self.value ^= zobrist_key(_PASSED_KEY, player)
+
+    def round_ended(self) -> None:
+        for player in (0, 1):
+            # the rows go to the graveyard, which is not part of the position
+            for zone in ROW_ZONES.values():
+                self._clear_zone(player, zone)
+            if self.passed[player]:
+                self.passed[player] = False
+                self.value ^= zobrist_key(_PASSED_KEY, player)
+        round_hash = self._round_hash()
+        self.value ^= self.round_hash ^ round_hash
+        self.round_hash = round_hash
+
+
+# Example usage
+if __name__ == '__main__':
+    import numpy as np
+    from src.board import Board
+    from src.array_board import ArrayBoard
+    from src.deck_sampler import sample_decks
+
+    def fresh_hash(board) -> int:
+        zobrist = ZobristHash(board)
+        board.remove_observer(zobrist)
+        return zobrist.value
+
+    rng = np.random.default_rng(0)
+    for game in range(50):
+        boards = [Board("top", "bottom"), ArrayBoard("top", "bottom")]
+        decks = sample_decks(rng, 2)
+        for board in boards:
+            board.get_hash()
+            for bottom_player, deck in zip((True, False), decks):
+                board.set_deck_ids(bottom_player, deck)
+                board.draw_cards_to_hand(bottom_player, 10)
+        bottom_player = True
+        while not boards[0].game_ended():
+            hand_size = len(boards[0].get_hand(bottom_player))
+            choice = int(rng.integers(hand_size + 1)) if hand_size and rng.random() > 0.1 else 0
+            for board in boards:
+                if choice:
+                    card = board.get_hand(bottom_player)[choice - 1]
+                    board.play_card(bottom_player, choice - 1, Row.FRONT if card.type == Row.ANY else card.type)
+                else:
+                    board.pass_round(bottom_player)
+                if board.has_passed(True) and board.has_passed(False):
+                    board.end_round()
+                    board.draw_cards_to_hand(True)
+                    board.draw_cards_to_hand(False)
+            # both backends agree and the incremental hash is the hash of the position
+            assert boards[0].get_hash() == boards[1].get_hash() == fresh_hash(boards[0]), game
+            if not boards[0].has_passed(not bottom_player):
+                bottom_player = not bottom_player
+    # the same position reached with another move order has the same hash
+    boards = [Board("top", "bottom"), Board("top", "bottom")]
+    for board, card_ids in zip(boards, ((1, 7), (7, 1))):
+        board.set_deck_ids(True, np.array([1, 7, 13, 2]))
+        board.draw_cards_to_hand(True, 4)
+        for card_id in card_ids:
+            index = [card.card_id for card in board.get_hand(True)].index(card_id)
+            board.play_card(True, index, board.get_hand(True)[index].type)
+    assert boards[0].get_hash() == boards[1].get_hash()
+    assert boards[0].get_hash() != Board("top", "bottom").get_hash()